@@ -1,13 +1,27 @@
 # -*- coding: utf-8 -*-
 """
 audio.py contains functions used by the cli module to record audio
-contents using Google Cloud Text to Speech.
+contents using a text to speech backend (Google Cloud Text to Speech by
+default, see the `tts` module).
 """
 import os
+import re
 from pathlib import Path
 from rich.console import Console
-from typing import List, Dict, Union, Any
-from google.cloud import texttospeech
+from typing import Callable, List, Dict, Union, Any, Optional
+from goodbot import audio_index, mp3
+from goodbot.cache import ArtifactCache, cache_key
+from goodbot.tts import TTSBackend, get_backend
+
+# Google TTS refuses requests with more than 5000 bytes of input.
+MAX_INPUT_BYTES: int = 5000
+# Narration is sent in chunks of about this size, so that long texts
+# are synthesized by many requests at the same time.
+CHUNK_BYTES: int = 1000
+# Silence added between paragraphs, in seconds.
+DEFAULT_PAUSE: float = 0.5
+
+SENTENCE_END = re.compile(r"(?<=[.!?;:])\s+")
 
 
 def fetch_audio_instructions(read_path: Path) -> List[Path]:
@@ -82,16 +96,232 @@ def fetch_project_audio_instructions(project_path: Union[Path, str]) -> List[Pat
     return all_audio_instructions
 
 
+def _group(segments: List[str], limit: int, separator: str = " ") -> List[str]:
+    chunks: List[str] = []
+    for segment in segments:
+        candidate: str = f"{chunks[-1]}{separator}{segment}" if chunks else segment
+        if chunks and len(candidate.encode("utf-8")) <= limit:
+            chunks[-1] = candidate
+        else:
+            chunks.append(segment)
+    return chunks
+
+
+def _split_plain(text: str, limit: int) -> List[str]:
+    segments: List[str] = []
+    for sentence in SENTENCE_END.split(text.strip()):
+        if len(sentence.encode("utf-8")) > limit:
+            # A sentence that is too long is split between words.
+            segments += _group(sentence.split(), limit)
+        elif sentence:
+            segments.append(sentence)
+    return segments
+
+
+def _split_ssml(ssml: str) -> List[str]:
+    inner: str = re.sub(r"^\s*<speak[^>]*>|</speak>\s*$", "", ssml)
+    segments: List[str] = [""]
+    depth: int = 0
+
+    for token in re.split(r"(<[^>]+>)", inner):
+        if not token:
+            continue
+        if depth == 0 and not token.startswith("<"):
+            # Splitting text between tags at the end of sentences.
+            sentences: List[str] = SENTENCE_END.split(token)
+            segments[-1] += sentences[0]
+            segments += sentences[1:]
+            continue
+        if token.startswith("<break") and depth == 0:
+            # Breaks end the previous segment.
+            if not segments[-1].strip() and len(segments) > 1:
+                segments.pop()
+            segments[-1] += token
+            segments.append("")
+            continue
+        segments[-1] += token
+        if token.startswith("</"):
+            depth -= 1
+            # The end of a top level paragraph or sentence.
+            if depth == 0 and token in ("</p>", "</s>"):
+                segments.append("")
+        elif token.startswith("<") and not token.endswith("/>"):
+            depth += 1
+
+    return [segment.strip() for segment in segments if segment.strip()]
+
+
+def split_narration(text: str, limit: int = CHUNK_BYTES) -> List[List[str]]:
+    """
+    split_narration splits the contents of a `read` file into chunks
+    that can be synthesized independently.
+
+    Paragraphs are separated by empty lines. Each paragraph is split at
+    the end of its sentences and sentences are grouped in chunks of at
+    most `limit` bytes. If the text is SSML (it starts with `<speak>`),
+    it is only split at the end of top level sentences, paragraphs and
+    breaks, and each chunk is wrapped in its own `<speak>` element.
+
+    Args:
+        text (str): The text to read.
+        limit (int): The maximum size of a chunk, in bytes. A single
+        SSML sentence can't be split and may be larger.
+    Returns:
+        List[List[str]]: The chunks of each paragraph.
+    """
+    if text.lstrip().startswith("<speak"):
+        chunks: List[str] = _group(_split_ssml(text), limit - len("<speak></speak>"))
+        return [[f"<speak>{chunk}</speak>" for chunk in chunks]] if chunks else []
+
+    paragraphs: List[List[str]] = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        chunks = _group(_split_plain(" ".join(paragraph.split()), limit), limit)
+        if chunks:
+            paragraphs.append(chunks)
+    return paragraphs
+
+
+def audio_key(
+    script: Path,
+    lang: str,
+    lang_name: str,
+    pause: float = DEFAULT_PAUSE,
+    backend: Optional[TTSBackend] = None,
+) -> str:
+    """
+    audio_key computes the cache key of an audio recording.
+
+    Args:
+        script (Path): A path towards the audio instructions file.
+        lang (str): The language code of the recording.
+        lang_name (str): The language name of the recording.
+        pause (float): The silence between paragraphs, in seconds.
+        backend (Optional[TTSBackend]): The backend that records the
+        file. Defaults to Google TTS.
+    Returns:
+        str: The key used by `cache.ArtifactCache`.
+    """
+    backend = backend or get_backend()
+    return cache_key(
+        "audio",
+        [script],
+        {
+            "lang": lang,
+            "lang_name": lang_name,
+            "backend": backend.name,
+            "version": backend.version(),
+            "pause": pause,
+            "chunk_bytes": CHUNK_BYTES,
+        },
+    )
+
+
+def record_audio_file(
+    script: Path,
+    project_path: Path,
+    lang: str = "en-US",
+    lang_name: str = "en-US-Standard-C",
+    cache: Optional[ArtifactCache] = None,
+    pause: float = DEFAULT_PAUSE,
+    backend: Optional[TTSBackend] = None,
+) -> Path:
+    """
+    record_audio_file records a single `read` file using a text to
+    speech backend.
+
+    The recording is saved in the `audio` directory of the scene that
+    contains `script`, under the same name with an `.mp3` extension.
+
+    The text is split by `split_narration()` and the chunks are
+    synthesized at the same time. The resulting mp3 files are joined
+    without re-encoding, with `pause` seconds of silence between
+    paragraphs.
+
+    The duration, sample rate and codec of the recording are saved in
+    the project's audio index (see the `audio_index` module).
+
+    If a cache is provided, the recording is only synthesized if no
+    recording of the same text, with the same voice, was already saved
+    in the cache.
+
+    Args:
+        script (Path): A path towards the audio instructions file to
+        read.
+        project_path (Path): A path towards the project that contains
+        `script`.
+        lang (str): The language code for the audio recording.
+        Defaults to "en-US".
+        lang_name (str): The language name for the audio recording.
+        Defaults to "en-US-Standard-C".
+        cache (Optional[ArtifactCache]): Where recordings are looked
+        up and saved. Defaults to None.
+        pause (float): The silence between paragraphs, in seconds.
+        Defaults to `DEFAULT_PAUSE`.
+        backend (Optional[TTSBackend]): The text to speech backend.
+        Defaults to Google TTS.
+    Returns:
+        Path: The path towards the new audio recording.
+    """
+    save_path: Path = project_path / script.parent.parent / Path("audio")
+    write_path: Path = (save_path / script.stem).with_suffix(".mp3")
+    tts_backend: TTSBackend = backend or get_backend()
+
+    if cache:
+        key: str = audio_key(script, lang, lang_name, pause, tts_backend)
+        cached: Path = cache.cached(
+            key,
+            write_path,
+            lambda: record_audio_file(
+                script, project_path, lang, lang_name, None, pause, tts_backend
+            ),
+        )
+        # Indexing files that were copied from the cache.
+        audio_index.lookup(cached)
+        return cached
+
+    with open(script, "r") as stream:
+        paragraphs: List[List[str]] = split_narration(stream.read(), CHUNK_BYTES)
+
+    chunks: List[str] = []
+    pauses: List[float] = []
+    for paragraph in paragraphs:
+        chunks += paragraph
+        pauses += [0.0] * (len(paragraph) - 1) + [pause]
+    if pauses:
+        # No silence after the last paragraph.
+        pauses[-1] = 0.0
+
+    recordings: List[bytes] = tts_backend.batch_synthesize(chunks, lang, lang_name)
+
+    if write_path.exists():
+        os.remove(write_path)
+
+    data: bytes = (
+        recordings[0] if len(recordings) == 1 else mp3.concatenate(recordings, pauses)
+    )
+    with open(write_path, "wb") as out:
+        out.write(data)
+
+    audio_index.add(write_path, data)
+
+    return write_path
+
+
 def record_audio(
-    project_path: Path, lang: str = "en-US", lang_name: str = "en-US-Standard-C"
+    project_path: Path,
+    lang: str = "en-US",
+    lang_name: str = "en-US-Standard-C",
+    cache: Optional[ArtifactCache] = None,
+    pause: float = DEFAULT_PAUSE,
+    backend: Optional[TTSBackend] = None,
+    selected: Optional[Callable[[Path], bool]] = None,
 ) -> List[Path]:
     """
-    record_audio records audio by reading the `read` files using Google
-    TTS.
+    record_audio records audio by reading the `read` files using a text
+    to speech backend.
 
-    It records audio for a whole Good Bot project.
-
-    See: https://cloud.google.com/text-to-speech
+    It records audio for a whole Good Bot project. Each file is recorded
+    using `record_audio_file()`.
 
     Args:
         project_path (Path): A path towards a project for which
@@ -102,50 +332,42 @@ def record_audio(
         lang_name (str): The language name for the audio recordings.
         Can also be found on Google TTS's website. Defaults to
         "en-US-Standard-C".
+        cache (Optional[ArtifactCache]): Where recordings are looked
+        up and saved. See `record_audio_file()`. Defaults to None.
+        pause (float): The silence between paragraphs, in seconds.
+        Defaults to `DEFAULT_PAUSE`.
+        backend (Optional[TTSBackend]): The text to speech backend.
+        Defaults to Google TTS.
+        selected (Optional[Callable[[Path], bool]]): If provided, only
+        the `read` files for which it returns `True` are recorded. See
+        `utils.selector()`.
     Returns:
         List[Path]: A list of paths towards each audio recording
         created.
     """
     all_audio_scripts: List[Path] = fetch_project_audio_instructions(project_path)
+    if selected:
+        all_audio_scripts = [path for path in all_audio_scripts if selected(path)]
     all_audio_recordings: List[Path] = []
     console: Console = Console()
+    tts_backend: TTSBackend = backend or get_backend()
+
+    texts: List[str] = []
+    for script in all_audio_scripts:
+        with open(script, "r") as stream:
+            texts.append(stream.read())
+    cost: float = tts_backend.estimate_cost(texts, lang_name)
+    if cost:
+        console.log(f"Estimated {tts_backend.name} TTS cost: ${cost:.4f}.")
 
     with console.status("[bold green]Recording audio...") as status:
 
         for script in all_audio_scripts:
-            #
-            save_path: Path = project_path / script.parent.parent / Path("audio")
-            with open(script, "r") as stream:
-                # Assuming everything to read is on one line
-                to_read = " ".join(stream.readlines())
-
-            client = texttospeech.TextToSpeechClient()
-
-            synthesis_input = texttospeech.SynthesisInput(text=to_read)
-
-            voice = texttospeech.VoiceSelectionParams(
-                language_code=lang,
-                name=lang_name,
-                ssml_gender=texttospeech.SsmlVoiceGender.NEUTRAL,
+            all_audio_recordings.append(
+                record_audio_file(
+                    script, project_path, lang, lang_name, cache, pause, tts_backend
+                )
             )
-
-            audio_config = texttospeech.AudioConfig(
-                audio_encoding=texttospeech.AudioEncoding.MP3
-            )
-
-            response = client.synthesize_speech(
-                input=synthesis_input, voice=voice, audio_config=audio_config
-            )
-
-            file_name = script.stem
-            write_path = (save_path / file_name).with_suffix(".mp3")
-
-            if write_path.exists():
-                os.remove(write_path)
-
-            with open(write_path, "wb") as out:
-                out.write(response.audio_content)
-            all_audio_recordings.append(save_path)
             console.log(f"Audio contents in file {script} have been recorded.")
 
     return all_audio_recordings
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+audio_index.py contains functions used to keep an index of the audio
+files of a project.
+
+The `audio` module adds an entry to the index each time it writes a
+file, using the frames it just synthesized. The `render` module reads
+the duration of each file from the index to pad clips, instead of
+probing every file with an external program.
+
+The index is a JSON file saved at the root of the project. Entries are
+keyed by the path of the audio file relative to the project and also
+contain the file's size and modification time. An entry that does not
+match its file anymore (a file replaced by hand, for example) is
+computed again from the file.
+"""
+import os
+import json
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from goodbot import mp3
+
+INDEX_NAME: str = "audio_index.json"
+
+# The `build` command writes audio files from many threads.
+_lock = threading.Lock()
+
+
+def index_path(project_path: Path) -> Path:
+    """Finds where the index of a project is saved."""
+    return project_path / INDEX_NAME
+
+
+def project_of(audio_path: Path) -> Path:
+    """Finds the project of an audio file.
+
+    Audio files are saved under `[project]/[scene]/audio/`.
+    """
+    return audio_path.resolve().parent.parent.parent
+
+
+def audio_info(data: bytes) -> Dict[str, Any]:
+    """Describes the contents of an mp3 file.
+
+    Args:
+        data (bytes): The contents of the file.
+
+    Raises:
+        ValueError: If the file contains no mp3 frames.
+
+    Returns:
+        Dict[str, Any]: The `duration` (in seconds), `sample_rate`,
+            `channels`, `codec` and `frames` of the file.
+    """
+    duration: float = 0.0
+    frames: int = 0
+    first: Optional[mp3.FrameHeader] = None
+    for _, header in mp3.iter_frames(data):
+        first = first or header
+        duration += header.duration
+        frames += 1
+
+    if first is None:
+        raise ValueError("The file does not contain mp3 frames.")
+
+    return {
+        "duration": round(duration, 6),
+        "sample_rate": first.sample_rate,
+        "channels": 1 if first.mono else 2,
+        "codec": "mp3",
+        "frames": frames,
+    }
+
+
+def read_index(project_path: Path) -> Dict[str, Dict[str, Any]]:
+    """Reads the index of a project.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: The entry of each audio file, keyed
+            by their path relative to the project. Empty if the project
+            has no index.
+    """
+    try:
+        with open(index_path(project_path), "r") as stream:
+            return json.load(stream)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_index(project_path: Path, index: Dict[str, Dict[str, Any]]) -> None:
+    descriptor, temporary = tempfile.mkstemp(dir=project_path, prefix=f".{INDEX_NAME}.")
+    with os.fdopen(descriptor, "w") as stream:
+        json.dump(index, stream, indent=2, sort_keys=True)
+    os.replace(temporary, index_path(project_path))
+
+
+def _key(project_path: Path, audio_path: Path) -> str:
+    return audio_path.resolve().relative_to(project_path.resolve()).as_posix()
+
+
+def _matches(entry: Dict[str, Any], stat: os.stat_result) -> bool:
+    return (
+        entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns
+    )
+
+
+def add(
+    audio_path: Path, data: Optional[bytes] = None, project_path: Optional[Path] = None
+) -> Dict[str, Any]:
+    """Adds an audio file to the index of its project.
+
+    Args:
+        audio_path (Path): The audio file, once it is written.
+        data (Optional[bytes]): The contents of the file, if they are
+            already in memory.
+        project_path (Optional[Path]): The project of the file. Found
+            using `project_of()` by default.
+
+    Returns:
+        Dict[str, Any]: The new entry. See `audio_info()`.
+    """
+    project_path = project_path or project_of(audio_path)
+    if data is None:
+        with open(audio_path, "rb") as stream:
+            data = stream.read()
+
+    entry: Dict[str, Any] = audio_info(data)
+    stat: os.stat_result = os.stat(audio_path)
+    entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+
+    with _lock:
+        index: Dict[str, Dict[str, Any]] = read_index(project_path)
+        index[_key(project_path, audio_path)] = entry
+        _write_index(project_path, index)
+
+    return entry
+
+
+def lookup(audio_path: Path, project_path: Optional[Path] = None) -> Dict[str, Any]:
+    """Finds the entry of an audio file.
+
+    Files that are not in the index, or that changed since they were
+    indexed, are added to the index first.
+
+    Args:
+        audio_path (Path): The audio file.
+        project_path (Optional[Path]): The project of the file. Found
+            using `project_of()` by default.
+
+    Returns:
+        Dict[str, Any]: The entry of the file. See `audio_info()`.
+    """
+    project_path = project_path or project_of(audio_path)
+    entry: Optional[Dict[str, Any]] = read_index(project_path).get(
+        _key(project_path, audio_path)
+    )
+    if entry and _matches(entry, os.stat(audio_path)):
+        return entry
+    return add(audio_path, project_path=project_path)
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+av_encoder.py contains functions used to render clips in-process with
+PyAV, instead of running `ffmpeg`.
+
+PyAV binds the libraries `ffmpeg` is built on. Gifs and audio files are
+decoded, and clips are encoded (H.264 and AAC) and muxed, without
+starting a process or writing intermediate files. Frames are NumPy
+arrays, so frames drawn in Python (like `compositor.Compositor.frame`)
+can be encoded as they are.
+
+Clips are rendered like `render.render()` does with `ffmpeg`: the first
+frame of the gif is dropped, frames are sampled at a constant frame
+rate, the last frame is held and the audio padded with silence until
+the end of the clip.
+
+PyAV is only required when it is selected with `--encoder-backend pyav`.
+"""
+from fractions import Fraction
+from itertools import chain
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+
+# `ffmpeg` writes clips at this frame rate by default.
+FRAME_RATE: int = 25
+# AAC encodes audio by frames of this many samples.
+AUDIO_FRAME_SIZE: int = 1024
+
+
+def load_av() -> Any:
+    """Imports PyAV.
+
+    Raises:
+        RuntimeError: If PyAV is not installed.
+    """
+    try:
+        import av
+    except ImportError as err:
+        raise RuntimeError(
+            "The pyav encoder backend requires PyAV. Install it with `pip install av`."
+        ) from err
+    return av
+
+
+def gif_frames(
+    gif_path: Path, skip_frames: int = 0
+) -> Iterator[Tuple[float, np.ndarray]]:
+    """Decodes the frames of a gif.
+
+    Args:
+        gif_path (Path): The gif.
+        skip_frames (int): How many frames, from the start of the gif,
+            are left out. The next frame is shown at time `0`.
+
+    Yields:
+        Tuple[float, np.ndarray]: When the frame is shown, in seconds,
+            and its pixels, `height` by `width` by 3 (RGB).
+    """
+    av = load_av()
+    start: Optional[float] = None
+    with av.open(str(gif_path)) as container:
+        for index, frame in enumerate(container.decode(video=0)):
+            if index < skip_frames:
+                continue
+            if start is None:
+                start = frame.time
+            yield frame.time - start, frame.to_ndarray(format="rgb24")
+
+
+def sample(
+    frames: Iterable[Tuple[float, np.ndarray]], frame_rate: int, duration: float
+) -> Iterator[np.ndarray]:
+    """Converts timed frames to a constant frame rate.
+
+    Each output frame is the last frame shown at or before its time.
+    The last frame is held until `duration`.
+    """
+    count: int = max(1, round(duration * frame_rate))
+    frames = iter(frames)
+    shown: Optional[Tuple[float, np.ndarray]] = next(frames, None)
+    if shown is None:
+        return
+    upcoming: Optional[Tuple[float, np.ndarray]] = next(frames, None)
+    for index in range(count):
+        time: float = index / frame_rate
+        while upcoming is not None and upcoming[0] <= time + 1e-6:
+            shown, upcoming = upcoming, next(frames, None)
+        yield shown[1]
+
+
+def _audio_format(av: Any, audio_path: Path, layout: Optional[str]) -> Tuple[int, str]:
+    with av.open(str(audio_path)) as container:
+        stream = container.streams.audio[0]
+        return stream.rate, layout or stream.layout.name
+
+
+def audio_chunks(
+    audio_path: Path, rate: int, layout: str, total: int
+) -> Iterator[np.ndarray]:
+    """Decodes an audio file in chunks of `AUDIO_FRAME_SIZE` samples.
+
+    Only a chunk and a decoded frame are kept in memory, whatever the
+    length of the file.
+
+    Args:
+        audio_path (Path): The audio file.
+        rate (int): The sample rate of the file.
+        layout (str): The channels of the chunks, like `mono`.
+        total (int): How many samples are yielded. The audio is padded
+            with silence, or cut, to this length.
+
+    Yields:
+        np.ndarray: Planar float samples, `channels` by at most
+            `AUDIO_FRAME_SIZE`. Only the last chunk can be shorter.
+    """
+    av = load_av()
+    channels: int = len(av.AudioLayout(layout).channels)
+    pending: np.ndarray = np.zeros((channels, 0), dtype=np.float32)
+    sent: int = 0
+    with av.open(str(audio_path)) as container:
+        stream = container.streams.audio[0]
+        resampler = av.AudioResampler(format="fltp", layout=layout, rate=rate)
+        frames: Iterator[Any] = chain(container.decode(stream), [None])
+        for frame in frames:
+            for resampled in resampler.resample(frame):
+                pending = np.concatenate([pending, resampled.to_ndarray()], axis=1)
+                while pending.shape[1] >= AUDIO_FRAME_SIZE and sent < total:
+                    size: int = min(AUDIO_FRAME_SIZE, total - sent)
+                    yield pending[:, :size]
+                    pending = pending[:, AUDIO_FRAME_SIZE:]
+                    sent += size
+            if sent >= total:
+                return
+    pending = pending[:, : total - sent]
+    while sent < total:
+        size = min(AUDIO_FRAME_SIZE, total - sent)
+        chunk: np.ndarray = np.zeros((channels, size), dtype=np.float32)
+        used: int = min(size, pending.shape[1])
+        chunk[:, :used] = pending[:, :used]
+        pending = pending[:, used:]
+        sent += size
+        yield chunk
+
+
+def write_clip(
+    frames: Iterable[Tuple[float, np.ndarray]],
+    output_path: Path,
+    duration: float,
+    audio_path: Optional[Path] = None,
+    frame_rate: int = FRAME_RATE,
+    scale: float = 1.0,
+    preset: Optional[str] = None,
+    audio_bitrate: Optional[int] = None,
+    audio_layout: Optional[str] = None,
+    palette: Optional[np.ndarray] = None,
+    threads: Optional[int] = None,
+    lookahead: Optional[int] = None,
+) -> Path:
+    """Encodes a clip.
+
+    Args:
+        frames (Iterable[Tuple[float, np.ndarray]]): When each frame is
+            shown, in seconds, and its pixels (RGB, like `gif_frames()`).
+        output_path (Path): Where to save the clip (mp4).
+        duration (float): The duration of the clip, in seconds.
+        audio_path (Optional[Path]): The clip's audio. It is padded
+            with silence, or cut, to last `duration`.
+        frame_rate (int): The frame rate of the clip.
+        scale (float): How much the frames are scaled. The size of the
+            clip is rounded down to even numbers.
+        preset (Optional[str]): The preset of the H.264 encoder.
+        audio_bitrate (Optional[int]): The bitrate of the audio, in bits
+            per second. The encoder's default if `None`.
+        audio_layout (Optional[str]): The channels of the audio, like
+            `mono`. The audio file's if `None`.
+        palette (Optional[np.ndarray]): If provided, frames are palette
+            indices (`height` by `width`) into this array of RGB colors,
+            like `compositor.Compositor.frame` and `terminal.PALETTE`.
+        threads (Optional[int]): How many threads the video encoder
+            uses. Every core if `None`.
+        lookahead (Optional[int]): How many frames the video encoder
+            looks ahead. The preset's default if `None`.
+
+    Returns:
+        Path: `output_path`.
+    """
+    av = load_av()
+    pictures: Iterator[np.ndarray] = sample(frames, frame_rate, duration)
+    first: Optional[np.ndarray] = next(pictures, None)
+    if first is None:
+        raise ValueError(f"There is no frame to encode in {output_path}.")
+    colors: Optional[np.ndarray] = (
+        None if palette is None else np.asarray(palette, dtype=np.uint8)
+    )
+
+    with av.open(
+        str(output_path), "w", format="mp4", options={"movflags": "faststart"}
+    ) as container:
+        video = container.add_stream("libx264", rate=frame_rate)
+        height, width = first.shape[:2]
+        video.width = int(width * scale) // 2 * 2
+        video.height = int(height * scale) // 2 * 2
+        video.pix_fmt = "yuv420p"
+        options: Dict[str, str] = {}
+        if preset:
+            options["preset"] = preset
+        if lookahead is not None:
+            options["rc-lookahead"] = f"{lookahead}"
+        video.options = options
+        if threads:
+            video.thread_count = threads
+
+        audio: Any = None
+        chunks: Iterator[np.ndarray] = iter([])
+        rate: int = 1
+        if audio_path:
+            rate, layout = _audio_format(av, audio_path, audio_layout)
+            audio = container.add_stream("aac", rate=rate, layout=layout)
+            if audio_bitrate:
+                audio.bit_rate = audio_bitrate
+            chunks = audio_chunks(audio_path, rate, layout, round(duration * rate))
+        samples: int = 0
+
+        def mux_audio(until: float) -> None:
+            # Audio is muxed as the video progresses, so that neither
+            # waits in memory for the other.
+            nonlocal samples
+            while samples < until * rate:
+                chunk: Optional[np.ndarray] = next(chunks, None)
+                if chunk is None:
+                    return
+                # The last frame can be shorter.
+                frame = av.AudioFrame.from_ndarray(
+                    np.ascontiguousarray(chunk, dtype=np.float32),
+                    format="fltp",
+                    layout=layout,
+                )
+                frame.sample_rate = rate
+                frame.pts = samples
+                frame.time_base = Fraction(1, rate)
+                container.mux(audio.encode(frame))
+                samples += chunk.shape[1]
+
+        for index, picture in enumerate(chain([first], pictures)):
+            if colors is not None:
+                picture = colors[picture]
+            frame = av.VideoFrame.from_ndarray(picture, format="rgb24").reformat(
+                video.width, video.height, format="yuv420p"
+            )
+            frame.pts = index
+            frame.time_base = Fraction(1, frame_rate)
+            container.mux(video.encode(frame))
+            mux_audio((index + 1) / frame_rate)
+        container.mux(video.encode(None))
+
+        if audio is not None:
+            mux_audio(float("inf"))
+            container.mux(audio.encode(None))
+
+    return output_path
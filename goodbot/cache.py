@@ -0,0 +1,550 @@
+# -*- coding: utf-8 -*-
+"""
+cache.py contains a content-addressed store for the artifacts created by
+`goodbot` (asciicasts, audio recordings and rendered clips).
+
+Artifacts are identified by a key computed from everything that was
+used to create them: the contents of their input files, the version of
+the tools that created them and the options that were used. See
+`cache_key()`.
+
+An `ArtifactCache` always uses a `LocalBackend`, a sharded directory on
+the current machine. It can also use a remote backend shared by many
+machines, like `S3Backend`, which works with any S3-compatible API.
+
+The cache is configured with these environment variables:
+
+* `GOODBOT_CACHE_DIR`: The local directory. Defaults to
+  `~/.cache/goodbot/artifacts`.
+* `GOODBOT_CACHE_MAX_SIZE`: The maximum size of the local directory, in
+  bytes. `K`, `M` and `G` suffixes are allowed.
+* `GOODBOT_CACHE_MAX_AGE`: How long an unused artifact is kept, in days.
+* `GOODBOT_CACHE_S3_URL`: An `s3://[bucket]/[prefix]` URL. Enables the
+  remote backend.
+* `GOODBOT_CACHE_S3_ENDPOINT`: The endpoint of the S3-compatible API.
+  Defaults to `https://s3.amazonaws.com`.
+* `AWS_ACCESS_KEY_ID`, `AWS_SECRET_ACCESS_KEY` and `AWS_REGION`: The
+  credentials used by the remote backend.
+"""
+import os
+import hmac
+import json
+import stat
+import time
+import errno
+import fcntl
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+import http.client
+import urllib.parse
+import urllib.request
+import urllib.error
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from rich.console import Console
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Union
+
+DEFAULT_CACHE_DIR: Path = Path(
+    os.environ.get(
+        "GOODBOT_CACHE_DIR", Path.home() / ".cache" / "goodbot" / "artifacts"
+    )
+)
+
+# `FICLONE` ioctl request, see `man ioctl_ficlone`.
+FICLONE: int = 0x40049409
+
+SIZE_SUFFIXES: Dict[str, int] = {"K": 1024, "M": 1024**2, "G": 1024**3}
+
+# Errors raised when a remote cache can't be reached or stops answering.
+# `urllib.error.URLError`, timeouts and connection errors are `OSError`s.
+REMOTE_ERRORS = (OSError, http.client.HTTPException)
+
+
+def file_digest(file_path: Path) -> str:
+    """Computes the sha256 digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as stream:
+        for block in iter(lambda: stream.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def tool_version(program: str, flag: str = "-version") -> str:
+    """Finds the version of an external program.
+
+    Uses the first line printed by `[program] [flag]`.
+
+    Args:
+        program (str): The name of the program.
+        flag (str): The option that prints the version. Defaults to
+            `-version`, which works for `ffmpeg`.
+
+    Returns:
+        str: The version string, or an empty string if the program is
+            not installed.
+    """
+    try:
+        output = subprocess.run(
+            [program, flag], capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+    return (output.stdout or output.stderr).split("\n")[0].strip()
+
+
+def cache_key(
+    kind: str, files: List[Union[Path, None]], options: Optional[Dict[str, Any]] = None
+) -> str:
+    """Computes the key of an artifact.
+
+    Args:
+        kind (str): The kind of artifact (`clip`, `audio`...).
+        files (List[Union[Path, None]]): The input files. Their contents
+            are hashed, their names are not. `None` values are allowed
+            for missing optional inputs.
+        options (Optional[Dict[str, Any]]): Anything else that changes
+            the artifact: tool versions, settings... Must be JSON
+            serializable.
+
+    Returns:
+        str: A hexadecimal sha256 digest.
+    """
+    canonical: str = json.dumps(
+        {
+            "kind": kind,
+            "files": [file_digest(path) if path else None for path in files],
+            "options": options or {},
+        },
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def link_artifact(source: Path, destination: Path) -> Path:
+    """Makes `destination` a copy of `source` without copying data if possible.
+
+    Tries a reflink (copy on write) and falls back to a regular copy.
+    Either way, `destination` is a file of its own: writing to it never
+    changes `source`. It is writable by its owner, even if `source` is
+    read-only. An existing `destination` is replaced.
+
+    Args:
+        source (Path): The file to copy.
+        destination (Path): Where to create the copy.
+
+    Returns:
+        Path: The path towards the copy. This is the same value as the
+            `destination` argument.
+    """
+    destination.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(
+        dir=destination.parent, prefix=f".{destination.name}."
+    )
+    os.close(descriptor)
+    temporary_path: Path = Path(temporary)
+
+    try:
+        try:
+            with open(source, "rb") as src, open(temporary_path, "wb") as dst:
+                fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError as err:
+            if err.errno == errno.ENOENT:
+                raise
+            shutil.copyfile(source, temporary_path)
+        os.chmod(temporary_path, stat.S_IMODE(os.stat(source).st_mode) | stat.S_IWUSR)
+        os.replace(temporary_path, destination)
+    finally:
+        if temporary_path.exists():
+            os.remove(temporary_path)
+
+    return destination
+
+
+def parse_size(size: Union[str, int, None]) -> Optional[int]:
+    """Converts sizes like `"512M"` or `"10G"` to an amount of bytes."""
+    if size is None or size == "":
+        return None
+    if isinstance(size, int):
+        return size
+    size = size.strip().upper().rstrip("B")
+    if size and size[-1] in SIZE_SUFFIXES:
+        return int(float(size[:-1]) * SIZE_SUFFIXES[size[-1]])
+    return int(size)
+
+
+class LocalBackend:
+    """A sharded directory of artifacts on the current machine.
+
+    An artifact with key `abcdef...` is saved under `ab/cd/abcdef...`.
+    Artifacts are written to a temporary file and renamed, so that many
+    processes can safely write the same key at the same time. They are
+    read-only. Projects receive copies of them (see `link_artifact()`),
+    never links, so a project's file can be changed or removed without
+    changing the cache. The last use of an artifact is saved in a marker
+    file (see `marker_for()`), so that using it does not change it.
+
+    Attributes:
+        path (Path): The root of the directory.
+        max_size (Optional[int]): The maximum size of the directory, in
+            bytes. See `evict()`.
+        max_age (Optional[float]): How long an artifact is kept after
+            its last use, in seconds. See `evict()`.
+    """
+
+    def __init__(
+        self,
+        path: Path = DEFAULT_CACHE_DIR,
+        max_size: Optional[int] = None,
+        max_age: Optional[float] = None,
+    ) -> None:
+        self.path = Path(path)
+        self.max_size = max_size
+        self.max_age = max_age
+
+    def path_for(self, key: str) -> Path:
+        """Finds where the artifact with `key` is saved."""
+        return self.path / key[:2] / key[2:4] / key
+
+    def marker_for(self, key: str) -> Path:
+        """Finds the file whose time is the last use of an artifact."""
+        return self.path_for(key).with_name(f".{key}.used")
+
+    def get(self, key: str, destination: Path) -> bool:
+        """Copies the artifact with `key` to `destination`.
+
+        Returns:
+            bool: Whether or not the artifact was found.
+        """
+        stored: Path = self.path_for(key)
+        try:
+            link_artifact(stored, destination)
+        except FileNotFoundError:
+            return False
+        # Marking the artifact as used, for eviction.
+        self.marker_for(key).touch()
+        return True
+
+    def put(self, key: str, source: Path) -> Path:
+        """Saves `source` as the artifact with `key`.
+
+        Returns:
+            Path: Where the artifact is saved.
+        """
+        stored: Path = self.path_for(key)
+        link_artifact(source, stored)
+        os.utime(stored)
+        os.chmod(stored, 0o444)
+        return stored
+
+    def evict(self) -> List[Path]:
+        """Removes artifacts that exceed the limits of the directory.
+
+        Artifacts that were not used for more than `max_age` are removed
+        first. Then, the least recently used artifacts are removed until
+        the directory is smaller than `max_size`. An artifact was last
+        used when its marker was touched, or when it was saved.
+
+        Returns:
+            List[Path]: The paths of the removed artifacts.
+        """
+        if not self.path.exists():
+            return []
+
+        entries: List[os.stat_result] = []
+        paths: List[Path] = []
+        for path in self.path.glob("*/*/*"):
+            if path.name.startswith("."):
+                continue
+            try:
+                entries.append(path.stat())
+                paths.append(path)
+            except FileNotFoundError:
+                continue
+
+        used: List[float] = []
+        for path, entry in zip(paths, entries):
+            try:
+                used.append(self.marker_for(path.name).stat().st_mtime)
+            except FileNotFoundError:
+                used.append(entry.st_mtime)
+
+        order: List[int] = sorted(range(len(paths)), key=lambda i: used[i])
+        total: int = sum(entry.st_size for entry in entries)
+        now: float = time.time()
+        removed: List[Path] = []
+
+        for index in order:
+            too_old: bool = (
+                self.max_age is not None and now - used[index] > self.max_age
+            )
+            too_big: bool = self.max_size is not None and total > self.max_size
+            if not (too_old or too_big):
+                continue
+            for removed_path in (paths[index], self.marker_for(paths[index].name)):
+                try:
+                    os.remove(removed_path)
+                except FileNotFoundError:
+                    pass
+            total -= entries[index].st_size
+            removed.append(paths[index])
+
+        return removed
+
+
+class S3Backend:
+    """Artifacts saved in a bucket of an S3-compatible API.
+
+    Requests are signed using AWS Signature Version 4 and use path-style
+    URLs (`[endpoint]/[bucket]/[prefix][key]`), which are supported by
+    most S3-compatible servers.
+
+    The remote cache is optional: when it can't be reached, a download
+    is a miss and an upload is skipped, so that the render goes on.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        bucket: str,
+        access_key: str,
+        secret_key: str,
+        region: str = "us-east-1",
+        prefix: str = "",
+        timeout: float = 60.0,
+    ) -> None:
+        self.endpoint = endpoint.rstrip("/")
+        self.bucket = bucket
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.prefix = prefix
+        self.timeout = timeout
+
+    def _request(
+        self,
+        method: str,
+        key: str,
+        body: Optional[BinaryIO] = None,
+        body_path: Optional[Path] = None,
+    ) -> urllib.request.Request:
+        url: urllib.parse.SplitResult = urllib.parse.urlsplit(self.endpoint)
+        path: str = urllib.parse.quote(
+            f"{url.path}/{self.bucket}/{self.prefix}{key}", safe="/~"
+        )
+        payload_hash: str = (
+            file_digest(body_path) if body_path else hashlib.sha256(b"").hexdigest()
+        )
+        now: datetime = datetime.now(timezone.utc)
+        amz_date: str = now.strftime("%Y%m%dT%H%M%SZ")
+        date: str = now.strftime("%Y%m%d")
+
+        headers: Dict[str, str] = {
+            "host": url.netloc,
+            "x-amz-content-sha256": payload_hash,
+            "x-amz-date": amz_date,
+        }
+        signed_headers: str = ";".join(sorted(headers))
+        canonical_request: str = "\n".join(
+            [
+                method,
+                path,
+                "",
+                "".join(f"{name}:{headers[name]}\n" for name in sorted(headers)),
+                signed_headers,
+                payload_hash,
+            ]
+        )
+        scope: str = f"{date}/{self.region}/s3/aws4_request"
+        string_to_sign: str = "\n".join(
+            [
+                "AWS4-HMAC-SHA256",
+                amz_date,
+                scope,
+                hashlib.sha256(canonical_request.encode("utf-8")).hexdigest(),
+            ]
+        )
+        signing_key: bytes = f"AWS4{self.secret_key}".encode("utf-8")
+        for part in (date, self.region, "s3", "aws4_request"):
+            signing_key = hmac.new(
+                signing_key, part.encode("utf-8"), hashlib.sha256
+            ).digest()
+        signature: str = hmac.new(
+            signing_key, string_to_sign.encode("utf-8"), hashlib.sha256
+        ).hexdigest()
+        headers["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self.access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        del headers["host"]
+        if body_path:
+            # The body is streamed from the file, not sent in chunks.
+            headers["content-length"] = str(body_path.stat().st_size)
+
+        return urllib.request.Request(
+            f"{url.scheme}://{url.netloc}{path}",
+            data=body,
+            headers=headers,
+            method=method,
+        )
+
+    def get(self, key: str, destination: Path) -> bool:
+        """Downloads the artifact with `key` to `destination`.
+
+        Returns:
+            bool: Whether or not the artifact was found.
+        """
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(
+            dir=destination.parent, prefix=f".{destination.name}."
+        )
+        try:
+            with os.fdopen(descriptor, "wb") as out:
+                with urllib.request.urlopen(
+                    self._request("GET", key), timeout=self.timeout
+                ) as response:
+                    shutil.copyfileobj(response, out)
+            os.replace(temporary, destination)
+        except REMOTE_ERRORS as err:
+            # Missing artifacts are expected, anything else is logged.
+            if not (isinstance(err, urllib.error.HTTPError) and err.code in (403, 404)):
+                console: Console = Console()
+                console.log(f"Could not download {key} from the remote cache ({err}).")
+            return False
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        return True
+
+    def put(self, key: str, source: Path) -> None:
+        """Uploads `source` as the artifact with `key`."""
+        try:
+            with open(source, "rb") as stream:
+                with urllib.request.urlopen(
+                    self._request("PUT", key, stream, source), timeout=self.timeout
+                ):
+                    pass
+        except REMOTE_ERRORS as err:
+            console: Console = Console()
+            console.log(f"Could not upload {key} to the remote cache ({err}).")
+
+    @classmethod
+    def from_env(cls) -> Optional["S3Backend"]:
+        """Creates a backend from the environment, if one is configured."""
+        url: str = os.environ.get("GOODBOT_CACHE_S3_URL", "")
+        if not url:
+            return None
+        parsed: urllib.parse.SplitResult = urllib.parse.urlsplit(url)
+        if parsed.scheme != "s3" or not parsed.netloc:
+            raise ValueError(f"{url} is not a valid s3://[bucket]/[prefix] URL.")
+        prefix: str = parsed.path.lstrip("/")
+        if prefix and not prefix.endswith("/"):
+            prefix += "/"
+        return cls(
+            os.environ.get("GOODBOT_CACHE_S3_ENDPOINT", "https://s3.amazonaws.com"),
+            parsed.netloc,
+            os.environ.get("AWS_ACCESS_KEY_ID", ""),
+            os.environ.get("AWS_SECRET_ACCESS_KEY", ""),
+            os.environ.get("AWS_REGION", "us-east-1"),
+            prefix,
+        )
+
+
+class ArtifactCache:
+    """A local cache of artifacts, optionally backed by a remote one.
+
+    Attributes:
+        local (LocalBackend): The cache on the current machine.
+        remote (Optional[S3Backend]): The cache shared by many machines.
+        stats (Dict[str, int]): How many lookups were `local` hits,
+            `remote` hits and `misses`.
+    """
+
+    def __init__(
+        self, local: Optional[LocalBackend] = None, remote: Optional[S3Backend] = None
+    ) -> None:
+        self.local = local or LocalBackend()
+        self.remote = remote
+        self.stats: Dict[str, int] = {"local": 0, "remote": 0, "misses": 0}
+        # The `build` command looks artifacts up from many threads.
+        self._lock = threading.Lock()
+
+    def _count(self, outcome: str) -> None:
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def fetch(self, key: str, destination: Path) -> bool:
+        """Copies the artifact with `key` to `destination`.
+
+        Remote hits are saved in the local cache too.
+
+        Returns:
+            bool: Whether or not the artifact was found.
+        """
+        if self.local.get(key, destination):
+            self._count("local")
+            return True
+        if self.remote and self.remote.get(key, destination):
+            self.local.put(key, destination)
+            self.local.get(key, destination)
+            self._count("remote")
+            return True
+        self._count("misses")
+        return False
+
+    def store(self, key: str, source: Path) -> None:
+        """Saves `source` as the artifact with `key`, locally and remotely."""
+        self.local.put(key, source)
+        if self.remote:
+            self.remote.put(key, source)
+
+    def cached(self, key: str, destination: Path, create: Callable[[], Path]) -> Path:
+        """Fetches an artifact, or creates it and saves it.
+
+        Args:
+            key (str): The key of the artifact. See `cache_key()`.
+            destination (Path): Where the artifact is expected.
+            create (Callable[[], Path]): Creates the artifact at
+                `destination` and returns its path.
+
+        Returns:
+            Path: The path towards the artifact.
+        """
+        if self.fetch(key, destination):
+            return destination
+        created: Path = create()
+        if created.exists():
+            self.store(key, created)
+        return created
+
+    def evict(self) -> List[Path]:
+        """Applies the limits of the local cache. See `LocalBackend.evict()`."""
+        return self.local.evict()
+
+    def report(self) -> str:
+        """Describes how many artifacts were found in the cache."""
+        lookups: int = sum(self.stats.values())
+        if not lookups:
+            return "The cache was not used."
+        return (
+            f"Cache: {self.stats['local']} local hits, {self.stats['remote']} "
+            f"remote hits and {self.stats['misses']} misses."
+        )
+
+    @classmethod
+    def from_env(cls) -> "ArtifactCache":
+        """Creates a cache configured by environment variables."""
+        max_age: Optional[str] = os.environ.get("GOODBOT_CACHE_MAX_AGE")
+        return cls(
+            LocalBackend(
+                DEFAULT_CACHE_DIR,
+                parse_size(os.environ.get("GOODBOT_CACHE_MAX_SIZE")),
+                float(max_age) * 24 * 3600 if max_age else None,
+            ),
+            S3Backend.from_env(),
+        )
@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+"""
+cast_index.py contains functions used to seek within asciicasts.
+
+Asciicasts (v2) are newline-delimited JSON: finding what is on the
+screen at a given time means reading every event before it. An index of
+the time and byte offset of each event is built by scanning the file
+once, without decoding the events. Reading the events before a given
+time then only decodes the lines before it.
+
+Recordings also get a sidecar index, saved next to them by
+`write_index()`. It contains the same offsets and a keyframe every
+`KEYFRAME_INTERVAL` seconds: the state of the terminal's screen at that
+time. `seek()` finds the last keyframe before a given time with a
+binary search, restores its screen and only replays the events after
+it. A sidecar whose asciicast changed since it was written is ignored.
+
+See: https://github.com/asciinema/asciinema/blob/develop/doc/asciicast-v2.md
+"""
+import os
+import json
+import math
+import tempfile
+from bisect import bisect_right
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from goodbot.terminal import Screen
+
+# Time between two keyframes of a sidecar index, in seconds.
+KEYFRAME_INTERVAL: float = 5.0
+INDEX_VERSION: int = 1
+
+
+class Keyframe(NamedTuple):
+    """The state of the screen at some point of a recording.
+
+    Attributes:
+        time (float): The time of the last event replayed, in seconds.
+        event (int): How many events were replayed.
+        state (Dict[str, Any]): See `terminal.Screen.state()`.
+    """
+
+    time: float
+    event: int
+    state: Dict[str, Any]
+
+
+class CastIndex(NamedTuple):
+    """Where each event of an asciicast is.
+
+    Attributes:
+        header (Dict[str, Any]): The header of the asciicast.
+        times (List[float]): The time of each event, in seconds.
+        offsets (List[int]): Where each event's line starts, in bytes.
+        size (int): Where the last event's line ends, in bytes.
+        keyframes (Tuple[Keyframe, ...]): Keyframes, in order. Only
+            sidecar indexes have keyframes.
+    """
+
+    header: Dict[str, Any]
+    times: List[float]
+    offsets: List[int]
+    size: int
+    keyframes: Tuple[Keyframe, ...] = ()
+
+    @property
+    def duration(self) -> float:
+        """The time of the last event, in seconds."""
+        return self.times[-1] if self.times else 0.0
+
+
+def index_path_for(cast_path: Path) -> Path:
+    """Finds where the sidecar index of an asciicast is saved.
+
+    Returns:
+        Path: Follows this scheme:
+            [asciicasts-directory]/[asciicast-name].index.json
+    """
+    return cast_path.parent / f"{cast_path.stem}.index.json"
+
+
+def build_index(cast_path: Path) -> CastIndex:
+    """Scans an asciicast for the time and offset of each event.
+
+    Only the time of each event is decoded. The index has no keyframes.
+    """
+    times: List[float] = []
+    offsets: List[int] = []
+    with open(cast_path, "rb") as stream:
+        header: Dict[str, Any] = json.loads(stream.readline())
+        offset: int = stream.tell()
+        for line in stream:
+            if line.strip():
+                # Events look like `[1.234, "o", "..."]`.
+                times.append(float(line[line.index(b"[") + 1 : line.index(b",")]))
+                offsets.append(offset)
+            offset += len(line)
+    return CastIndex(header, times, offsets, offset)
+
+
+def read_events(
+    cast_path: Path, index: CastIndex, start: int = 0, stop: Optional[int] = None
+) -> List[List[Any]]:
+    """Reads a range of events of an asciicast, and only those.
+
+    Args:
+        cast_path (Path): The asciicast.
+        index (CastIndex): The asciicast's index.
+        start (int): The first event to read.
+        stop (Optional[int]): The event after the last one to read.
+            Defaults to the end of the asciicast.
+
+    Returns:
+        List[List[Any]]: The events.
+    """
+    count: int = len(index.offsets)
+    stop = count if stop is None else min(stop, count)
+    if start >= stop:
+        return []
+    end: int = index.offsets[stop] if stop < count else index.size
+    with open(cast_path, "rb") as stream:
+        stream.seek(index.offsets[start])
+        data: bytes = stream.read(end - index.offsets[start])
+    return [json.loads(line) for line in data.splitlines() if line.strip()]
+
+
+def events_until(
+    cast_path: Path, time: float, index: Optional[CastIndex] = None
+) -> List[List[Any]]:
+    """Reads the events of an asciicast up to a given time.
+
+    Args:
+        cast_path (Path): The asciicast.
+        time (float): The time of the last event to read, in seconds.
+        index (Optional[CastIndex]): The asciicast's index. Built if it
+            is not provided.
+
+    Returns:
+        List[List[Any]]: Every event that happened at or before `time`.
+    """
+    index = index or build_index(cast_path)
+    return read_events(cast_path, index, 0, bisect_right(index.times, time))
+
+
+def build_keyframes(
+    cast_path: Path, index: CastIndex, interval: float = KEYFRAME_INTERVAL
+) -> List[Keyframe]:
+    """Replays an asciicast, saving the screen every `interval` seconds."""
+    screen: Screen = Screen(index.header["width"], index.header["height"])
+    keyframes: List[Keyframe] = []
+    next_time: float = interval
+    for count, event in enumerate(read_events(cast_path, index), start=1):
+        if event[1] == "o":
+            screen.feed(event[2])
+        if event[0] >= next_time:
+            keyframes.append(Keyframe(event[0], count, screen.state()))
+            next_time = event[0] + interval
+    return keyframes
+
+
+def _stamp(cast_path: Path) -> Dict[str, int]:
+    stat: os.stat_result = os.stat(cast_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def write_index(cast_path: Path, interval: float = KEYFRAME_INTERVAL) -> Path:
+    """Writes the sidecar index of an asciicast, replacing it atomically.
+
+    Args:
+        cast_path (Path): The asciicast.
+        interval (float): The time between two keyframes, in seconds.
+
+    Returns:
+        Path: The path towards the sidecar index.
+    """
+    index: CastIndex = build_index(cast_path)
+    keyframes: List[Keyframe] = build_keyframes(cast_path, index, interval)
+    index_path: Path = index_path_for(cast_path)
+
+    descriptor, temporary = tempfile.mkstemp(
+        dir=index_path.parent, prefix=f".{index_path.name}."
+    )
+    with os.fdopen(descriptor, "w") as out:
+        json.dump(
+            {
+                "version": INDEX_VERSION,
+                "asciicast": _stamp(cast_path),
+                "interval": interval,
+                "header": index.header,
+                "times": index.times,
+                "offsets": index.offsets,
+                "size": index.size,
+                "keyframes": [list(keyframe) for keyframe in keyframes],
+            },
+            out,
+        )
+    os.replace(temporary, index_path)
+    return index_path
+
+
+def index_recording(cast_path: Path) -> Optional[Path]:
+    """Writes the sidecar index of a new recording.
+
+    Returns:
+        Optional[Path]: The path towards the sidecar index. `None` if
+            there is no recording, or if it is incomplete.
+    """
+    if not cast_path.exists():
+        return None
+    try:
+        return write_index(cast_path)
+    except ValueError:
+        # An interrupted recording can end with a partial line. It can
+        # still be read from the start.
+        return None
+
+
+def load_index(cast_path: Path) -> CastIndex:
+    """Finds the index of an asciicast.
+
+    Returns:
+        CastIndex: The sidecar index if it is up to date. Otherwise, an
+            index without keyframes, built by scanning the asciicast.
+    """
+    try:
+        with open(index_path_for(cast_path), "r") as stream:
+            data: Dict[str, Any] = json.load(stream)
+    except (OSError, ValueError):
+        return build_index(cast_path)
+    if data.get("version") != INDEX_VERSION or data.get("asciicast") != _stamp(
+        cast_path
+    ):
+        return build_index(cast_path)
+    return CastIndex(
+        data["header"],
+        data["times"],
+        data["offsets"],
+        data["size"],
+        tuple(Keyframe(*keyframe) for keyframe in data["keyframes"]),
+    )
+
+
+def seek(cast_path: Path, time: float, index: Optional[CastIndex] = None) -> Screen:
+    """Finds the screen of an asciicast at a given time.
+
+    Replaying starts from the last keyframe before `time`, if any.
+
+    Args:
+        cast_path (Path): The asciicast.
+        time (float): The time, in seconds since the start of the
+            recording.
+        index (Optional[CastIndex]): The asciicast's index. Defaults to
+            `load_index()`.
+
+    Returns:
+        Screen: The screen once every event up to `time` is replayed.
+    """
+    index = index or load_index(cast_path)
+    # Keyframes are sorted by time, then by event, and never compared
+    # further than that.
+    position: int = bisect_right(index.keyframes, (time, math.inf)) - 1
+    if position >= 0:
+        keyframe: Keyframe = index.keyframes[position]
+        screen: Screen = Screen.from_state(keyframe.state)
+        start: int = keyframe.event
+    else:
+        screen = Screen(index.header["width"], index.header["height"])
+        start = 0
+
+    stop: int = bisect_right(index.times, time)
+    for event in read_events(cast_path, index, start, stop):
+        if event[1] == "o":
+            screen.feed(event[2])
+    return screen
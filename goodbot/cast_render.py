@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+cast_render.py contains functions used to convert asciicasts to gifs
+in-process, without `asciicast2gif`.
+
+Each asciicast is replayed by a `terminal.Screen`. Events that happen
+less than `MIN_DELAY` hundredths of a second apart are shown in the same
+frame. Frames are drawn by a `compositor.Compositor`, which only redraws
+the cells that changed, and only the region that changed is encoded by
+a `gif.GifWriter`. Every frame uses the terminal's palette, so encoding
+never quantizes colors.
+
+Like the gifs made by `asciicast2gif`, the first frame is the empty
+screen shown before the first event. `render.render()` drops it.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Tuple
+
+from goodbot import compositor, gif, glyphs, render, timing, workdir
+from goodbot.terminal import PALETTE, Screen
+
+# Shortest delay between two frames, in hundredths of a second. Most
+# decoders show frames with a shorter delay for a tenth of a second.
+MIN_DELAY: int = 2
+
+
+@lru_cache(maxsize=None)
+def glyph_cache(font_path: Optional[str], size: int) -> glyphs.GlyphCache:
+    """Finds the glyph cache of a font, shared by every cast of a process."""
+    return glyphs.GlyphCache(font_path, size)
+
+
+@lru_cache(maxsize=None)
+def glyph_atlas(font_path: Optional[str], size: int) -> compositor.GlyphAtlas:
+    """Finds the glyph atlas of a font, shared by every cast of a process."""
+    return compositor.GlyphAtlas(glyph_cache(font_path, size))
+
+
+def frame_events(
+    events: List[List[Any]], idle_time_limit: Optional[float] = None
+) -> List[Tuple[int, List[str]]]:
+    """Groups the output of a recording in frames.
+
+    Args:
+        events (List[List[Any]]): The events of an asciicast.
+        idle_time_limit (Optional[float]): The longest pause between two
+            events, in seconds. Longer pauses are shortened.
+
+    Returns:
+        List[Tuple[int, List[str]]]: The time at which each frame is
+            shown, in hundredths of a second, and the output printed
+            right before it.
+    """
+    frames: List[Tuple[int, List[str]]] = [(0, [])]
+    previous: float = 0.0
+    time: float = 0.0
+    for event in events:
+        if event[1] != "o":
+            continue
+        gap: float = event[0] - previous
+        previous = event[0]
+        if idle_time_limit:
+            gap = min(gap, idle_time_limit)
+        time += gap
+
+        start: int = round(time * 100)
+        # The first frame stays empty, even when output comes right away.
+        if len(frames) > 1 and start - frames[-1][0] < MIN_DELAY:
+            frames[-1][1].append(event[2])
+        else:
+            frames.append((start, [event[2]]))
+    return frames
+
+
+def gif_path_for(cast_path: Path) -> Path:
+    """Finds where the gif of an asciicast is saved.
+
+    Returns:
+        Path: Follows this scheme:
+            [project-path]/[scene-name]/gifs/[asciicast-name].gif
+    """
+    return cast_path.parent.parent / "gifs" / f"{cast_path.stem}.gif"
+
+
+def render_cast(
+    cast_path: Path,
+    output_path: Optional[Path] = None,
+    font_path: Optional[str] = None,
+    font_size: int = glyphs.DEFAULT_SIZE,
+) -> Path:
+    """Converts an asciicast to a gif.
+
+    Args:
+        cast_path (Path): The asciicast to convert.
+        output_path (Optional[Path]): Where to save the gif. Defaults
+            to `gif_path_for()`.
+        font_path (Optional[str]): The font used to draw the text. See
+            `glyphs.load_font()`.
+        font_size (int): The size of the font, in pixels.
+
+    Returns:
+        Path: The path towards the gif.
+    """
+    output_path = output_path or gif_path_for(cast_path)
+    header, events = timing.read_asciicast(cast_path)
+    screen: Screen = Screen(header["width"], header["height"])
+    canvas: compositor.Compositor = compositor.Compositor(
+        screen, glyph_atlas(font_path, font_size)
+    )
+    frames: List[Tuple[int, List[str]]] = frame_events(
+        events, header.get("idle_time_limit")
+    )
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with workdir.scratch("goodbot-gif-") as scratch_path:
+        rendered_path: Path = scratch_path / output_path.name
+        with open(rendered_path, "wb") as stream:
+            writer: gif.GifWriter = gif.GifWriter(
+                stream, canvas.width, canvas.height, PALETTE
+            )
+            for index, (start, output) in enumerate(frames):
+                for data in output:
+                    screen.feed(data)
+                if index + 1 < len(frames):
+                    delay: int = frames[index + 1][0] - start
+                else:
+                    delay = MIN_DELAY
+                rectangle: Optional[compositor.Rectangle] = canvas.update()
+                if rectangle is None:
+                    writer.extend(delay)
+                else:
+                    writer.add_region(rectangle, canvas.region(rectangle), delay)
+            writer.close()
+        workdir.move_into(rendered_path, output_path)
+
+    return output_path
+
+
+def render_project(
+    project_path: Path,
+    jobs: Optional[int] = None,
+    font_path: Optional[str] = None,
+    font_size: int = glyphs.DEFAULT_SIZE,
+    selected: Optional[Callable[[Path], bool]] = None,
+) -> List[Path]:
+    """Converts every asciicast of a project to a gif.
+
+    Asciicasts are converted in parallel, one per process.
+
+    Args:
+        project_path (Path): The path towards the project.
+        jobs (Optional[int]): How many asciicasts are converted at the
+            same time. Defaults to the amount of processors.
+        font_path (Optional[str]): See `render_cast()`.
+        font_size (int): See `render_cast()`.
+        selected (Optional[Callable[[Path], bool]]): If provided, only
+            the asciicasts it returns `True` for are converted. See
+            `utils.selector()`.
+
+    Returns:
+        List[Path]: The path towards each gif.
+    """
+    casts: List[Path] = sorted(render.fetch_project_asciicasts(project_path))
+    if selected:
+        casts = [cast for cast in casts if selected(cast)]
+    if not casts:
+        return []
+    # Loading the font before starting the processes, so that a missing
+    # font or dependency is reported once.
+    glyph_cache(font_path, font_size)
+
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as executor:
+        futures = [
+            executor.submit(render_cast, cast, None, font_path, font_size)
+            for cast in casts
+        ]
+        return [future.result() for future in futures]
@@ -3,7 +3,23 @@
 
 import pathlib
 import click
-from goodbot import funcmodule, render, audio, shell_commands, utils, recording
+from typing import Callable, Optional, Set, Tuple
+from goodbot import (
+    funcmodule,
+    render,
+    audio,
+    shell_commands,
+    utils,
+    recording,
+    pipeline,
+    workdir,
+    cast_render,
+    glyphs,
+    thumbnails as thumbnail_module,
+    watch as watch_module,
+)
+from goodbot.cache import ArtifactCache, LocalBackend, parse_size
+from goodbot.tts import BACKENDS, get_backend
 
 PROJECT_ROOT: pathlib.Path = pathlib.Path(".")
 
@@ -23,7 +39,14 @@ PROJECT_ROOT: pathlib.Path = pathlib.Path(".")
     is_flag=True,
     help="Override the automatic environment selection.",
 )
-def app(docker, no_docker):
+@click.option(
+    "--work-dir",
+    type=click.Path(file_okay=False),
+    envvar="GOODBOT_WORK_DIR",
+    default=None,
+    help="Where intermediate files are written. Defaults to /dev/shm.",
+)
+def app(docker, no_docker, work_dir):
     """Automating the recording of documentation videos."""
     # Allowing users to redefine this param. This is especially useful
     # if someone's dev environment is in a container (Gitpod for example).
@@ -37,6 +60,52 @@ def app(docker, no_docker):
     elif no_docker:
         PROJECT_ROOT = pathlib.Path(".")
 
+    if work_dir:
+        workdir.set_work_dir(pathlib.Path(work_dir))
+
+
+def select(
+    project_path: pathlib.Path, scenes: Tuple[str, ...], elements: Tuple[str, ...]
+) -> Optional[Callable[[pathlib.Path], bool]]:
+    """Checks the `--scene` and `--element` options of a command.
+
+    Returns:
+        Optional[Callable[[pathlib.Path], bool]]: See `utils.selector()`.
+    """
+    for scene in scenes:
+        name: str = scene if scene.startswith("scene_") else f"scene_{scene}"
+        if not (project_path / name).is_dir():
+            raise click.BadParameter(
+                f"{project_path} has no {name}.", param_hint="--scene"
+            )
+    for element in elements:
+        if element.strip("/").count("/") != 1:
+            raise click.BadParameter(
+                f"{element} should look like scene_3/commands_2.",
+                param_hint="--element",
+            )
+        if not (project_path / element.strip("/").split("/")[0]).is_dir():
+            raise click.BadParameter(
+                f"{project_path} has no {element.split('/')[0]}.",
+                param_hint="--element",
+            )
+    try:
+        return utils.selector(scenes, elements)
+    # An element without an id, like scene_3/commands.
+    except ValueError as error:
+        raise click.BadParameter(f"{error}", param_hint="--element")
+
+
+def echo_changes(changed: Set[str], removed: Set[str]) -> None:
+    """Lists the elements added, changed or removed by
+    `funcmodule.update_project()`."""
+    for element in sorted(changed):
+        click.echo(f"Updated {element}.")
+    for element in sorted(removed):
+        click.echo(f"Removed {element}.")
+    if not changed and not removed:
+        click.echo("No element changed.")
+
 
 @click.command()
 @click.argument("config", type=str)
@@ -57,7 +126,13 @@ def echo_config(config: str) -> None:
 @click.command()
 @click.argument("config", type=str)
 @click.option("--project-path", "-p", type=str, default="")
-def setup(config: str, project_path: str) -> None:
+@click.option(
+    "--update",
+    is_flag=True,
+    default=False,
+    help="Update an existing project in place, keeping its unchanged recordings.",
+)
+def setup(config: str, project_path: str, update: bool) -> None:
     """
     Sets up a directory that contains everything needed to record a
     video using `good-bot`.
@@ -65,6 +140,9 @@ def setup(config: str, project_path: str) -> None:
     `setup` uses your configuration file to create a directory with
     recording instructions that `good-bot` understands.
 
+    With `--update`, only the elements that changed since the project
+    was set up are written. Their recordings and the files of the
+    elements that were removed are deleted, everything else is kept.
     """
 
     if not project_path:
@@ -76,6 +154,15 @@ def setup(config: str, project_path: str) -> None:
     file_name = pathlib.Path(config)
     # Creating directories
     parsed = funcmodule.config_parser(PROJECT_ROOT / file_name)
+
+    if update:
+        changed, removed = funcmodule.update_project(
+            parsed, PROJECT_ROOT / pathlib.Path(project_path)
+        )
+        echo_changes(changed, removed)
+        click.echo(f"Your project has been updated at: {project_path}")
+        return
+
     conf_info = funcmodule.config_info(parsed)
     to_create = funcmodule.create_dirs_list(conf_info)
 
@@ -94,11 +181,67 @@ def setup(config: str, project_path: str) -> None:
 @click.option("-d", "debug", default=False, show_default=True, type=bool)
 @click.option("-l", "--language", type=str, default="en-US")
 @click.option("-n", "--language-name", type=str, default="en-US-Standard-C")
+@click.option(
+    "--warm-sessions",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Amount of recording sessions to start ahead of time. 0 disables the pool.",
+)
+@click.option(
+    "--cache",
+    "--dedup",
+    "cache",
+    is_flag=True,
+    default=False,
+    help="Reuse recordings and audio from the artifact cache.",
+)
+@click.option(
+    "--pause",
+    type=float,
+    default=audio.DEFAULT_PAUSE,
+    show_default=True,
+    help="Seconds of silence between the paragraphs of a narration.",
+)
+@click.option(
+    "--tts-backend",
+    type=click.Choice(list(BACKENDS)),
+    default="google",
+    show_default=True,
+    help="Text to speech engine used to record narration.",
+)
+@click.option(
+    "--fit",
+    is_flag=True,
+    default=False,
+    help="Stretch or compress idle time in recordings to match their narration.",
+)
+@click.option(
+    "--scene",
+    "scenes",
+    type=str,
+    multiple=True,
+    help="Only process this scene, like 3 or scene_3. Can be repeated.",
+)
+@click.option(
+    "--element",
+    "elements",
+    type=str,
+    multiple=True,
+    help="Only process this element, like scene_3/commands_2. Can be repeated.",
+)
 def record(
     projectpath: str,
     language: str,
     language_name: str,
     debug: bool,
+    warm_sessions: int,
+    cache: bool,
+    pause: float,
+    tts_backend: str,
+    fit: bool,
+    scenes: Tuple[str, ...],
+    elements: Tuple[str, ...],
     docker: bool = False,
     no_docker: bool = False,
 ) -> None:
@@ -108,9 +251,13 @@ def record(
 
     If you want to create audio content, make sure that your
     `GOOGLE_APPLICATION_CREDENTIALS` environment variable has been
-    set to the path towards your API key.
+    set to the path towards your API key, or use `--tts-backend espeak`
+    to record audio offline.
+
+    Use `--scene` and `--element` to only record part of the project.
     """
     dir_path = pathlib.Path(projectpath)
+    selected = select(PROJECT_ROOT / dir_path, scenes, elements)
 
     click.echo(f"Using project : {projectpath}")
     all_scenes = utils.list_scenes(PROJECT_ROOT / dir_path)
@@ -120,34 +267,442 @@ def record(
     for scene in all_scenes:
         click.echo(f"- {scene.name}")
 
-    recording.record_project(PROJECT_ROOT / dir_path, docker, no_docker)
+    artifact_cache = ArtifactCache.from_env() if cache else None
+
+    recording.record_project(
+        PROJECT_ROOT / dir_path,
+        docker,
+        no_docker,
+        warm_sessions,
+        artifact_cache,
+        language,
+        language_name,
+        pause,
+        get_backend(tts_backend),
+        fit,
+        selected,
+    )
+
+    if artifact_cache:
+        artifact_cache.evict()
 
 
 @click.command()
 @click.option("-d", "debug", default=False, show_default=True, type=bool)
 @click.argument("projectpath", type=str)
-def render_video(projectpath: str, debug: bool) -> None:
+@click.option(
+    "--cache",
+    "--dedup",
+    "cache",
+    is_flag=True,
+    default=False,
+    help="Reuse clips already rendered from identical gifs and audio.",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    default=False,
+    help="Only render the clips that a previous run did not complete.",
+)
+@click.option(
+    "--scene",
+    "scenes",
+    type=str,
+    multiple=True,
+    help="Only process this scene, like 3 or scene_3. Can be repeated.",
+)
+@click.option(
+    "--element",
+    "elements",
+    type=str,
+    multiple=True,
+    help="Only process this element, like scene_3/commands_2. Can be repeated.",
+)
+@click.option(
+    "--draft",
+    is_flag=True,
+    default=False,
+    help="Render a quick, low resolution preview to final/draft.mp4.",
+)
+@click.option(
+    "--encoder-backend",
+    type=click.Choice(list(render.ENCODER_BACKENDS)),
+    default="ffmpeg",
+    show_default=True,
+    help="Encode clips with ffmpeg processes or in-process with PyAV.",
+)
+@click.option(
+    "--cpu-budget",
+    type=int,
+    default=None,
+    help="How many cores the encoders can use. Defaults to every core.",
+)
+@click.option(
+    "--memory-limit",
+    type=int,
+    default=None,
+    help="How much memory the encoders can use, in MB. Unbounded by default.",
+)
+def render_video(
+    projectpath: str,
+    debug: bool,
+    cache: bool,
+    resume: bool,
+    scenes: Tuple[str, ...],
+    elements: Tuple[str, ...],
+    draft: bool,
+    encoder_backend: str,
+    cpu_budget: Optional[int],
+    memory_limit: Optional[int],
+) -> None:
     """
     Renders a project using pre-recorded gifs and mp3 files.
 
     Should be used by Good Bot's CLI since the gifs are rendered
     using an exernal program.
+
+    Use `--scene` and `--element` to only render part of the project.
+    The final video is then made with the clips of every other scene
+    that were rendered before.
+
+    With `--draft`, clips are rendered at a lower resolution and frame
+    rate, as fast as possible, and saved apart from the other clips.
+    They are joined in `final/draft.mp4`.
+
+    Clips are encoded side by side or one after the other, depending on
+    their size, without using more than `--cpu-budget` cores. With
+    `--memory-limit`, fewer clips are encoded at the same time, and with
+    less lookahead, so that the encoders stay under the limit.
     """
     project_path = pathlib.Path(projectpath)
+    artifact_cache = ArtifactCache.from_env() if cache else None
+    selected = select(PROJECT_ROOT / project_path, scenes, elements)
+
+    render.render_all(
+        PROJECT_ROOT / project_path,
+        artifact_cache,
+        resume,
+        selected,
+        draft,
+        encoder_backend,
+        cpu_budget,
+        memory_limit * 1024**2 if memory_limit else None,
+    )
 
-    render.render_all(PROJECT_ROOT / project_path)
+    if artifact_cache:
+        click.echo(artifact_cache.report())
+        artifact_cache.evict()
 
-    final_project = render.render_final(PROJECT_ROOT / project_path, debug)
+    final_project = render.render_final(PROJECT_ROOT / project_path, debug, draft)
 
     click.echo(
         f"Your video has been saved under {project_path / final_project.parent / final_project.name}."
     )
 
 
+@click.command()
+@click.argument("projectpath", type=str)
+@click.option("-d", "debug", default=False, show_default=True, type=bool)
+@click.option("-l", "--language", type=str, default="en-US")
+@click.option("-n", "--language-name", type=str, default="en-US-Standard-C")
+@click.option(
+    "-j",
+    "--jobs",
+    type=int,
+    default=pipeline.DEFAULT_RESOURCE_LIMITS["cpu"],
+    show_default=True,
+    help="How many gifs and clips can be rendered at the same time.",
+)
+@click.option(
+    "--tts-jobs",
+    type=int,
+    default=pipeline.DEFAULT_RESOURCE_LIMITS["network"],
+    show_default=True,
+    help="How many text to speech requests can be sent at the same time.",
+)
+@click.option(
+    "--cache",
+    is_flag=True,
+    default=False,
+    help="Reuse recordings, audio and clips from the artifact cache.",
+)
+@click.option(
+    "--tts-backend",
+    type=click.Choice(list(BACKENDS)),
+    default="google",
+    show_default=True,
+    help="Text to speech engine used to record narration.",
+)
+@click.option(
+    "--fit",
+    is_flag=True,
+    default=False,
+    help="Stretch or compress idle time in recordings to match their narration.",
+)
+@click.option(
+    "--resume",
+    is_flag=True,
+    default=False,
+    help="Keep the scenes and clips that a previous run completed.",
+)
+@click.option(
+    "--encoder-backend",
+    type=click.Choice(list(render.ENCODER_BACKENDS)),
+    default="ffmpeg",
+    show_default=True,
+    help="Encode clips with ffmpeg processes or in-process with PyAV.",
+)
+def build(
+    projectpath: str,
+    debug: bool,
+    language: str,
+    language_name: str,
+    jobs: int,
+    tts_jobs: int,
+    cache: bool,
+    tts_backend: str,
+    fit: bool,
+    resume: bool,
+    encoder_backend: str,
+    docker: bool = False,
+    no_docker: bool = False,
+) -> None:
+    """
+    Records and renders a project in a single command.
+
+    Each recording, audio file and clip is a step of a task graph. A
+    clip is rendered as soon as its own recording and audio exist,
+    while the rest of the project is still being recorded.
+    """
+    project_path = pathlib.Path(projectpath)
+    artifact_cache = ArtifactCache.from_env() if cache else None
+
+    final_project = pipeline.build_project(
+        PROJECT_ROOT / project_path,
+        language,
+        language_name,
+        docker,
+        no_docker,
+        debug,
+        {"cpu": jobs, "network": tts_jobs},
+        artifact_cache,
+        get_backend(tts_backend),
+        fit,
+        resume,
+        encoder_backend,
+    )
+
+    if artifact_cache:
+        artifact_cache.evict()
+
+    click.echo(f"Your video has been saved under {final_project}.")
+
+
+@click.command()
+@click.argument("projectpath", type=str)
+@click.option(
+    "-j",
+    "--jobs",
+    type=int,
+    default=None,
+    help="How many asciicasts are converted at the same time.",
+)
+@click.option("--font", type=str, default=None, help="Path towards a monospace font.")
+@click.option(
+    "--font-size", type=int, default=glyphs.DEFAULT_SIZE, show_default=True
+)
+def render_gifs(projectpath: str, jobs: int, font: str, font_size: int) -> None:
+    """
+    Converts the asciicasts of a project to gifs, without `asciicast2gif`.
+    """
+    project_path = pathlib.Path(projectpath)
+
+    gifs = cast_render.render_project(PROJECT_ROOT / project_path, jobs, font, font_size)
+
+    click.echo(f"Converted {len(gifs)} asciicasts to gifs.")
+
+
+@click.command()
+@click.argument("projectpath", type=str)
+@click.option(
+    "--at",
+    type=float,
+    default=None,
+    help="Seconds since the start of each recording, or before its end if "
+    "negative. Defaults to the end.",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=int,
+    default=None,
+    help="How many asciicasts are processed at the same time.",
+)
+@click.option("--font", type=str, default=None, help="Path towards a monospace font.")
+@click.option(
+    "--font-size", type=int, default=glyphs.DEFAULT_SIZE, show_default=True
+)
+def thumbnails(
+    projectpath: str, at: float, jobs: int, font: str, font_size: int
+) -> None:
+    """
+    Saves a png of each asciicast of a project, without rendering it.
+    """
+    project_path = pathlib.Path(projectpath)
+
+    images = thumbnail_module.thumbnail_project(
+        PROJECT_ROOT / project_path, at, jobs, font, font_size
+    )
+
+    click.echo(f"Saved {len(images)} thumbnails.")
+
+
+@click.command()
+@click.argument("config", type=str)
+@click.option("--project-path", "-p", type=str, required=True)
+@click.option("-d", "debug", default=False, show_default=True, type=bool)
+@click.option("-l", "--language", type=str, default="en-US")
+@click.option("-n", "--language-name", type=str, default="en-US-Standard-C")
+@click.option(
+    "--cache",
+    is_flag=True,
+    default=False,
+    help="Reuse recordings, audio and clips from the artifact cache.",
+)
+@click.option(
+    "--tts-backend",
+    type=click.Choice(list(BACKENDS)),
+    default="google",
+    show_default=True,
+    help="Text to speech engine used to record narration.",
+)
+@click.option(
+    "--fit",
+    is_flag=True,
+    default=False,
+    help="Stretch or compress idle time in recordings to match their narration.",
+)
+@click.option(
+    "--poll",
+    is_flag=True,
+    default=False,
+    help="Check the configuration file periodically instead of using inotify.",
+)
+@click.option(
+    "--draft",
+    is_flag=True,
+    default=False,
+    help="Render quick, low resolution previews to final/draft.mp4.",
+)
+@click.option(
+    "--encoder-backend",
+    type=click.Choice(list(render.ENCODER_BACKENDS)),
+    default="ffmpeg",
+    show_default=True,
+    help="Encode clips with ffmpeg processes or in-process with PyAV.",
+)
+def watch(
+    config: str,
+    project_path: str,
+    debug: bool,
+    language: str,
+    language_name: str,
+    cache: bool,
+    tts_backend: str,
+    fit: bool,
+    poll: bool,
+    draft: bool,
+    encoder_backend: str,
+    docker: bool = False,
+    no_docker: bool = False,
+) -> None:
+    """
+    Keeps a project up to date with its configuration file.
+
+    Each time the configuration file is saved, only the elements that
+    changed are written to the project, recorded and rendered. The
+    final video is then made again. The project is created if it does
+    not exist, and is never removed.
+    """
+    path = PROJECT_ROOT / pathlib.Path(project_path)
+    artifact_cache = ArtifactCache.from_env() if cache else None
+
+    for parsed in watch_module.watch_config(
+        PROJECT_ROOT / pathlib.Path(config), not poll
+    ):
+        changed, removed = funcmodule.update_project(parsed, path)
+        echo_changes(changed, removed)
+        if not changed and not removed:
+            continue
+        try:
+            final_project = watch_module.rebuild(
+                path,
+                utils.selector(elements=changed),
+                lambda selected: recording.record_project(
+                    path,
+                    docker,
+                    no_docker,
+                    0,
+                    artifact_cache,
+                    language,
+                    language_name,
+                    audio.DEFAULT_PAUSE,
+                    get_backend(tts_backend),
+                    fit,
+                    selected,
+                ),
+                artifact_cache,
+                draft,
+                encoder_backend,
+                debug,
+            )
+        # The project is updated again on the next change.
+        except Exception as error:
+            click.echo(f"Could not update {project_path}: {error}")
+            continue
+        click.echo(f"Your video has been saved under {final_project}.")
+
+
+@click.command()
+@click.option(
+    "--max-size",
+    type=str,
+    default=None,
+    help="Maximum size of the cache, like 500M or 10G.",
+)
+@click.option(
+    "--max-age",
+    type=float,
+    default=None,
+    help="Remove artifacts unused for this many days.",
+)
+def prune_cache(max_size: str, max_age: float) -> None:
+    """
+    Removes artifacts from the local artifact cache.
+
+    Without options, the limits set by the `GOODBOT_CACHE_MAX_SIZE`
+    and `GOODBOT_CACHE_MAX_AGE` environment variables are used.
+    """
+    local: LocalBackend = ArtifactCache.from_env().local
+    if max_size is not None:
+        local.max_size = parse_size(max_size)
+    if max_age is not None:
+        local.max_age = max_age * 24 * 3600
+
+    removed = local.evict()
+
+    click.echo(f"Removed {len(removed)} artifacts from {local.path}.")
+
+
 app.add_command(setup)
 app.add_command(echo_config)
 app.add_command(record)
 app.add_command(render_video)
+app.add_command(build)
+app.add_command(render_gifs)
+app.add_command(thumbnails)
+app.add_command(watch)
+app.add_command(prune_cache)
 
 
 def main():
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+compositor.py contains the frame compositor used to draw a terminal's
+screen.
+
+A `Compositor` keeps the last frame it drew in a persistent buffer of
+palette indices. When the screen changes, the rows that the
+`terminal.Screen` marked as dirty are compared with what was drawn, as
+arrays, and only the cells that differ are copied from the
+`GlyphAtlas`. The cost of a frame therefore depends on how much of the
+screen changed, not on the size of the image.
+"""
+
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from goodbot.glyphs import GlyphCache
+from goodbot.terminal import CELL, Cell, Screen
+
+# The left, top, width and height of a region of a frame, in pixels.
+Rectangle = Tuple[int, int, int, int]
+
+
+class GlyphAtlas:
+    """The tiles used to draw cells, one per character, colors and style.
+
+    Args:
+        cache (GlyphCache): Where the masks of the glyphs come from.
+    """
+
+    def __init__(self, cache: GlyphCache) -> None:
+        self.cache = cache
+        self.width: int = cache.width
+        self.height: int = cache.height
+        self._masks: Dict[Tuple[str, int], np.ndarray] = {}
+        self._tiles: Dict[Cell, np.ndarray] = {}
+
+    def mask(self, char: str, attributes: int = 0) -> np.ndarray:
+        """Finds the mask of a glyph.
+
+        Returns:
+            np.ndarray: `height` by `width` booleans, `True` where the
+                glyph is drawn.
+        """
+        key: Tuple[str, int] = (char, attributes)
+        mask: Optional[np.ndarray] = self._masks.get(key)
+        if mask is None:
+            rows: bytes = b"".join(self.cache.mask(char, attributes))
+            mask = (
+                np.frombuffer(rows, dtype=np.uint8)
+                .reshape(self.height, self.width)
+                .astype(bool)
+            )
+            self._masks[key] = mask
+        return mask
+
+    def tile(self, cell: Cell) -> np.ndarray:
+        """Draws a cell.
+
+        Args:
+            cell (Cell): The character, foreground, background and
+                attributes of the cell, as returned by
+                `terminal.Screen.display_cell()`.
+
+        Returns:
+            np.ndarray: `height` by `width` palette indices.
+        """
+        tile: Optional[np.ndarray] = self._tiles.get(cell)
+        if tile is None:
+            char, fg, bg, attributes = cell
+            tile = np.where(
+                self.mask(char, attributes), np.uint8(fg), np.uint8(bg)
+            ).astype(np.uint8)
+            self._tiles[cell] = tile
+        return tile
+
+
+class Compositor:
+    """Draws a screen into a persistent frame, one changed cell at a time.
+
+    Args:
+        screen (Screen): The screen to draw.
+        atlas (GlyphAtlas): The tiles used to draw the cells.
+
+    Attributes:
+        frame (np.ndarray): The last frame drawn, one palette index per
+            pixel.
+    """
+
+    def __init__(self, screen: Screen, atlas: GlyphAtlas) -> None:
+        self.screen = screen
+        self.atlas = atlas
+        self.width: int = screen.columns * atlas.width
+        self.height: int = screen.rows * atlas.height
+        self.frame: np.ndarray = np.zeros((self.height, self.width), dtype=np.uint8)
+        # What was drawn in each cell. No character has this code point,
+        # so every cell is drawn the first time.
+        self._drawn: np.ndarray = np.zeros((screen.rows, screen.columns), dtype=CELL)
+        self._drawn["char"] = 0xFFFFFFFF
+        self._cursor: Optional[Tuple[int, int]] = None
+        # Everything is drawn the first time.
+        screen.dirty.update(range(screen.rows))
+
+    def update(self) -> Optional[Rectangle]:
+        """Draws what changed on the screen since the last update.
+
+        Returns:
+            Optional[Rectangle]: The region of the frame that changed.
+                `None` if nothing did.
+        """
+        screen: Screen = self.screen
+        rows: Set[int] = set(screen.dirty)
+        screen.dirty.clear()
+        cursor: Optional[Tuple[int, int]] = (
+            screen.cursor if screen.cursor_visible else None
+        )
+        if cursor != self._cursor:
+            rows.update(position[0] for position in (cursor, self._cursor) if position)
+            self._cursor = cursor
+
+        if not rows:
+            return None
+        dirty: List[int] = sorted(rows)
+        cells: np.ndarray = screen.display_rows(dirty)
+        changed: np.ndarray = cells != self._drawn[dirty]
+        if not changed.any():
+            return None
+        self._drawn[dirty] = cells
+
+        width, height = self.atlas.width, self.atlas.height
+        for index, column in zip(*np.nonzero(changed)):
+            char, fg, bg, attributes = cells[index, column].item()
+            y, x = dirty[index] * height, column * width
+            self.frame[y : y + height, x : x + width] = self.atlas.tile(
+                (chr(char), fg, bg, attributes)
+            )
+
+        changed_rows: np.ndarray = np.nonzero(changed.any(axis=1))[0]
+        changed_columns: np.ndarray = np.nonzero(changed.any(axis=0))[0]
+        top, bottom = dirty[changed_rows[0]], dirty[changed_rows[-1]]
+        left, right = int(changed_columns[0]), int(changed_columns[-1])
+        return (
+            left * width,
+            top * height,
+            (right - left + 1) * width,
+            (bottom - top + 1) * height,
+        )
+
+    def region(self, rectangle: Rectangle) -> bytes:
+        """Copies a region of the frame.
+
+        Returns:
+            bytes: One palette index per pixel, row by row.
+        """
+        left, top, width, height = rectangle
+        return self.frame[top : top + height, left : left + width].tobytes()
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""
+dedup.py contains functions used to record identical command blocks only
+once.
+
+Tutorials often repeat the same blocks (`pip install ...`, `git clone
+...`) in many scenes and projects. Each block is identified by a hash of
+its canonical runner instructions (commands, expect and the recording
+environment). The first recording of a block is kept in a
+`cache.ArtifactCache` shared by every project and later occurrences
+reuse it.
+
+**Recording side effects are skipped for reused blocks.** If a later
+block depends on something done by a reused one (a cloned repository,
+for example), record the project without deduplication or with the
+runner's `--docker` option.
+"""
+import json
+import hashlib
+import yaml
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+from goodbot.cache import ArtifactCache
+
+
+def instructions_key(
+    instructions_file: Path, environment: Optional[Dict[str, Any]] = None
+) -> str:
+    """Computes the canonical hash of a runner instructions file.
+
+    The instructions are parsed, so that two files that only differ by
+    their formatting share the same hash.
+
+    Args:
+        instructions_file (Path): The runner instructions file.
+        environment (Optional[Dict[str, Any]]): Anything else that
+            changes the recording, like the runner's docker options.
+
+    Returns:
+        str: A hexadecimal sha256 digest.
+    """
+    with open(instructions_file, "r") as stream:
+        instructions: Any = yaml.safe_load(stream)
+
+    canonical: str = json.dumps(
+        {"instructions": instructions, "environment": environment or {}},
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class DedupStore:
+    """Records identical blocks once, using an artifact cache.
+
+    Attributes:
+        cache (ArtifactCache): Where recordings are saved.
+        stats (Dict[str, Dict[str, int]]): How many `recordings` were
+            `created` and how many were `reused`.
+    """
+
+    def __init__(self, cache: Optional[ArtifactCache] = None) -> None:
+        self.cache = cache or ArtifactCache.from_env()
+        self.stats: Dict[str, Dict[str, int]] = {
+            "recordings": {"created": 0, "reused": 0},
+        }
+
+    def record(
+        self,
+        instructions_file: Path,
+        record: Callable[[Path], Path],
+        environment: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[Path, bool]:
+        """Records an instructions file, unless it was already recorded.
+
+        Args:
+            instructions_file (Path): The runner instructions file.
+            record (Callable[[Path], Path]): The function that records
+                the file and returns the path towards the asciicast.
+                Usually `shell_commands.record_command()`.
+            environment (Optional[Dict[str, Any]]): See
+                `instructions_key()`.
+
+        Returns:
+            Tuple[Path, bool]: The path towards the asciicast and whether
+                or not it was reused.
+        """
+        destination: Path = (
+            instructions_file.parent.parent / "asciicasts" / instructions_file.name
+        ).with_suffix(".cast")
+        key: str = instructions_key(instructions_file, environment)
+
+        if self.cache.fetch(key, destination):
+            self.stats["recordings"]["reused"] += 1
+            return destination, True
+
+        created: Path = record(instructions_file)
+        if created.exists():
+            self.cache.store(key, created)
+        self.stats["recordings"]["created"] += 1
+        return created, False
+
+    def report(self) -> str:
+        """Describes how many artifacts were deduplicated."""
+        lines = []
+        for kind, counts in self.stats.items():
+            total: int = counts["created"] + counts["reused"]
+            if total:
+                lines.append(f"Deduplicated {counts['reused']} of {total} {kind}.")
+        return "\n".join(lines) or "Nothing was deduplicated."
@@ -11,7 +11,7 @@ from rich.console import Console
 from typing import List, Union
 from ezvi.funcmodule import check_ezvi_config
 
-from goodbot import utils
+from goodbot import cast_index, utils, workdir
 
 
 def is_editor_instructions(editor_script_path: Path) -> bool:
@@ -120,9 +120,22 @@ def record_editor(instruction_file: Path, debug: bool = False) -> Path:
     if save_path.exists():
         os.remove(save_path)
 
-    subprocess.run(
-        ["asciinema", "rec", "-c", f"ezvi yaml {instruction_file}", str(save_path)],
-        capture_output=not debug,
-    )
+    # Like `shell_commands.record_commands()`, the recording is moved to
+    # the project once complete.
+    with workdir.scratch("goodbot-rec-") as scratch_path:
+        recording_path: Path = scratch_path / save_path.name
+        subprocess.run(
+            [
+                "asciinema",
+                "rec",
+                "-c",
+                f"ezvi yaml {instruction_file}",
+                str(recording_path),
+            ],
+            capture_output=not debug,
+        )
+        if recording_path.exists():
+            workdir.move_into(recording_path, save_path)
+    cast_index.index_recording(save_path)
 
     return save_path
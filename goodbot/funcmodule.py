@@ -12,7 +12,7 @@ import shutil
 import click
 import yaml
 from rich.console import Console
-from typing import List, Dict, Union, Any, KeysView
+from typing import List, Dict, Union, Any, Iterator, KeysView, Optional, Set, Tuple
 
 Path = pathlib.Path
 
@@ -351,29 +351,23 @@ def write_yaml_instructions(
     return file_path
 
 
-def split_config(parsed: Dict[int, List[dict]], project_path: Path) -> Path:
-    """Splits the main `yaml` script file in many smaller scripts.
-
-    The subscripts are then written in directories that correspond
-    to their categories. For example, commands to send to the `runner`
-    program will be written in the `commands` directory, while the
-    text files sent to the text to speech program will be written in
-    the `read` directory.
+def config_instructions(
+    parsed: Dict[int, List[dict]],
+) -> Iterator[Tuple[int, str, int, Any]]:
+    """Lists the instructions of every element of a configuration file.
 
     Args:
         parsed (Dict[int, List[dict]]): The parsed configuration file.
             This should be created by the `config_parser()` function.
-        project_path (Path): The path towards the project directory.
-            This value is returned by `create_dirs`.
 
-    Returns:
-        Path: The path towards the project.
+    Yields:
+        Tuple[int, str, int, Any]: The scene number, the type of the
+            element, its index in the scene (starting at 0) and its
+            instructions, as written by `write_yaml_instructions()`.
     """
     # This should probably be grouped
     for scene_number, scene_contents in parsed.items():
 
-        scene_path: Path = project_path / Path(f"scene_{scene_number}")
-
         for index, scene_item in enumerate(scene_contents):
 
             scene_item_keys: KeysView[Any] = scene_item.keys()
@@ -381,7 +375,7 @@ def split_config(parsed: Dict[int, List[dict]], project_path: Path) -> Path:
             # Reading text
             if "read" in scene_item_keys:
                 to_read: str = scene_item["read"]
-                write_yaml_instructions(to_read, scene_path, "read", index)
+                yield scene_number, "read", index, to_read
 
             # Typing commands
             if "commands" in scene_item_keys:
@@ -390,7 +384,7 @@ def split_config(parsed: Dict[int, List[dict]], project_path: Path) -> Path:
                         "commands": scene_item["commands"],
                         "expect": scene_item["expect"],
                     }
-                    write_yaml_instructions(commands, scene_path, "commands", index)
+                    yield scene_number, "commands", index, commands
 
                 except KeyError as error:
                     print(f"Missing key: {error.args[0]}")
@@ -400,11 +394,145 @@ def split_config(parsed: Dict[int, List[dict]], project_path: Path) -> Path:
             # Editing text files
             if "edit" in scene_item_keys:
                 to_edit: List[dict] = scene_item["edit"]
-                write_yaml_instructions(to_edit, scene_path, "edit", index)
+                yield scene_number, "edit", index, to_edit
+
+
+def split_config(parsed: Dict[int, List[dict]], project_path: Path) -> Path:
+    """Splits the main `yaml` script file in many smaller scripts.
+
+    The subscripts are then written in directories that correspond
+    to their categories. For example, commands to send to the `runner`
+    program will be written in the `commands` directory, while the
+    text files sent to the text to speech program will be written in
+    the `read` directory.
+
+    Args:
+        parsed (Dict[int, List[dict]]): The parsed configuration file.
+            This should be created by the `config_parser()` function.
+        project_path (Path): The path towards the project directory.
+            This value is returned by `create_dirs`.
+
+    Returns:
+        Path: The path towards the project.
+    """
+    for scene_number, content_type, index, instructions in config_instructions(parsed):
+        scene_path: Path = project_path / Path(f"scene_{scene_number}")
+        write_yaml_instructions(instructions, scene_path, content_type, index)
 
     return project_path
 
 
+########################################################################
+#                         Updating projects                            #
+########################################################################
+
+
+def expected_files(parsed: Dict[int, List[dict]]) -> Dict[str, str]:
+    """Lists the instruction files of a project, as `split_config()`
+    writes them.
+
+    Args:
+        parsed (Dict[int, List[dict]]): The parsed configuration file.
+
+    Returns:
+        Dict[str, str]: The contents of each instruction file, by
+            element, like `scene_3/commands_2`.
+    """
+    return {
+        f"scene_{scene_number}/{content_type}_{index + 1}": yaml.safe_dump(instructions)
+        for scene_number, content_type, index, instructions in (
+            config_instructions(parsed)
+        )
+    }
+
+
+def project_files(project_path: Path) -> Dict[str, Path]:
+    """Lists the instruction files of a project, by element."""
+    found: Dict[str, Path] = {}
+    for content_type in ALLOWED_CONTENT_TYPES:
+        for path in project_path.glob(f"scene_*/{content_type}/*.yaml"):
+            found[f"{path.parent.parent.name}/{path.stem}"] = path
+    return found
+
+
+def remove_element(project_path: Path, element: str) -> List[Path]:
+    """Removes every file of an element from a project.
+
+    Args:
+        project_path (Path): The path towards the project.
+        element (str): The element, like `scene_3/commands_2`.
+
+    Returns:
+        List[Path]: The files that were removed.
+    """
+    scene, name = element.split("/")
+    removed: List[Path] = []
+    for path in (project_path / scene).glob(f"*/{name}.*"):
+        if path.is_file():
+            path.unlink()
+            removed.append(path)
+    return removed
+
+
+def update_project(
+    parsed: Dict[int, List[dict]], project_path: Path
+) -> Tuple[Set[str], Set[str]]:
+    """Writes the instruction files of the elements that changed.
+
+    The project is compared with the configuration file: instruction
+    files are only written for the elements that were added or whose
+    instructions changed. The files of those elements (recordings,
+    gifs, audio, clips...) are removed, since they are outdated, as
+    well as every file of the elements that are no longer in the
+    configuration. Every other file is left as it is.
+
+    Unlike `create_dirs()`, this never removes the project: missing
+    directories are created.
+
+    Args:
+        parsed (Dict[int, List[dict]]): The parsed configuration file.
+        project_path (Path): The path towards the project. Created if
+            it does not exist.
+
+    Returns:
+        Tuple[Set[str], Set[str]]: The elements that were added or
+            changed and the elements that were removed, like
+            `scene_3/commands_2`.
+    """
+    for item in create_dirs_list(config_info(parsed)):
+        for scene, directories in item.items():
+            for directory in directories:
+                (project_path / scene / directory).mkdir(parents=True, exist_ok=True)
+
+    expected: Dict[str, str] = expected_files(parsed)
+    existing: Dict[str, Path] = project_files(project_path)
+
+    removed: Set[str] = existing.keys() - expected.keys()
+    for element in removed:
+        remove_element(project_path, element)
+
+    changed: Set[str] = set()
+    for element, contents in expected.items():
+        path: Optional[Path] = existing.get(element)
+        if path and path.read_text() == contents:
+            continue
+        if path:
+            # Its recording, audio and clip were made from the old
+            # instructions.
+            remove_element(project_path, element)
+        scene, name = element.split("/")
+        content_type, _, number = name.rpartition("_")
+        write_yaml_instructions(
+            yaml.safe_load(contents),
+            project_path / scene,
+            content_type,
+            int(number) - 1,
+        )
+        changed.add(element)
+
+    return changed, removed
+
+
 if __name__ == "__main__":
     conf_path = Path("./examples/basics/config.yaml")
     parsed_config = config_parser(conf_path)
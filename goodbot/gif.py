@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+gif.py contains a streaming gif encoder for frames that share a single
+palette.
+
+Frames are given as palette indices, one byte per pixel. Since every
+frame uses the same global color table, no quantization is done: each
+frame only goes through the LZW compression. Only the rectangle that
+changed since the previous frame is written, and the rest of the image
+is kept by the decoder.
+
+See: https://www.w3.org/Graphics/GIF/spec-gif89a.txt
+"""
+
+from typing import BinaryIO, List, Optional, Sequence, Tuple
+
+# Codes are never longer than 12 bits.
+MAX_CODES: int = 4096
+
+
+def lzw_encode(data: bytes, min_code_size: int = 8) -> bytes:
+    """Compresses image data using the gif flavor of LZW.
+
+    Args:
+        data (bytes): Palette indices, one per pixel.
+        min_code_size (int): The amount of bits of a palette index.
+
+    Returns:
+        bytes: The compressed data, not yet split in sub-blocks.
+    """
+    clear: int = 1 << min_code_size
+    end: int = clear + 1
+    output: bytearray = bytearray()
+    buffer: int = 0
+    bits: int = 0
+
+    code_size: int = min_code_size + 1
+    next_code: int = end + 1
+    table: dict = {}
+
+    def emit(code: int) -> None:
+        nonlocal buffer, bits
+        buffer |= code << bits
+        bits += code_size
+        while bits >= 8:
+            output.append(buffer & 0xFF)
+            buffer >>= 8
+            bits -= 8
+
+    emit(clear)
+    prefix: int = -1
+    for value in data:
+        if prefix < 0:
+            prefix = value
+            continue
+        key: int = (prefix << 8) | value
+        code: Optional[int] = table.get(key)
+        if code is not None:
+            prefix = code
+            continue
+        emit(prefix)
+        if next_code < MAX_CODES:
+            table[key] = next_code
+            next_code += 1
+            # The decoder's table is one code behind the encoder's.
+            if next_code > 1 << code_size and code_size < 12:
+                code_size += 1
+        else:
+            emit(clear)
+            table.clear()
+            code_size = min_code_size + 1
+            next_code = end + 1
+        prefix = value
+
+    if prefix >= 0:
+        emit(prefix)
+    emit(end)
+    if bits:
+        output.append(buffer & 0xFF)
+    return bytes(output)
+
+
+def sub_blocks(data: bytes) -> bytes:
+    """Splits data in sub-blocks of at most 255 bytes."""
+    blocks: List[bytes] = []
+    for start in range(0, len(data), 255):
+        chunk: bytes = data[start : start + 255]
+        blocks.append(bytes([len(chunk)]) + chunk)
+    blocks.append(b"\x00")
+    return b"".join(blocks)
+
+
+def changed_rectangle(
+    previous: Optional[bytes], current: bytes, width: int, height: int
+) -> Optional[Tuple[int, int, int, int]]:
+    """Finds the rectangle that contains every pixel that changed.
+
+    Returns:
+        Optional[Tuple[int, int, int, int]]: The left, top, width and
+            height of the rectangle. `None` if the frames are identical.
+    """
+    if previous is None:
+        return 0, 0, width, height
+
+    rows: List[int] = [
+        y
+        for y in range(height)
+        if previous[y * width : (y + 1) * width] != current[y * width : (y + 1) * width]
+    ]
+    if not rows:
+        return None
+    top, bottom = rows[0], rows[-1]
+
+    left, right = width, 0
+    for y in rows:
+        before: bytes = previous[y * width : (y + 1) * width]
+        after: bytes = current[y * width : (y + 1) * width]
+        start: int = 0
+        while before[start] == after[start]:
+            start += 1
+        stop: int = width - 1
+        while before[stop] == after[stop]:
+            stop -= 1
+        left, right = min(left, start), max(right, stop)
+
+    return left, top, right - left + 1, bottom - top + 1
+
+
+class GifWriter:
+    """Writes an animated gif, one frame at a time.
+
+    Args:
+        stream (BinaryIO): Where the gif is written.
+        width (int): The width of every frame, in pixels.
+        height (int): The height of every frame, in pixels.
+        palette (Sequence[Tuple[int, int, int]]): The 256 colors shared
+            by every frame.
+        loop (bool): Whether or not the animation repeats.
+    """
+
+    def __init__(
+        self,
+        stream: BinaryIO,
+        width: int,
+        height: int,
+        palette: Sequence[Tuple[int, int, int]],
+        loop: bool = True,
+    ) -> None:
+        if len(palette) != 256:
+            raise ValueError("The palette must contain 256 colors.")
+        self.stream = stream
+        self.width = width
+        self.height = height
+        self.frames: int = 0
+        self._previous: Optional[bytes] = None
+        self._pending_delay: int = 0
+        self._descriptor: bytes = b""
+
+        stream.write(b"GIF89a")
+        # Global color table of 256 colors (2 ** (7 + 1)), 8 bits per color.
+        stream.write(
+            width.to_bytes(2, "little")
+            + height.to_bytes(2, "little")
+            + bytes([0xF7, 0, 0])
+        )
+        stream.write(bytes(channel for color in palette for channel in color))
+        if loop:
+            stream.write(b"\x21\xff\x0bNETSCAPE2.0\x03\x01\x00\x00\x00")
+
+    def add_frame(self, pixels: bytes, delay: int) -> None:
+        """Adds a frame to the animation.
+
+        If the frame is identical to the previous one, the previous
+        frame is shown longer instead.
+
+        Args:
+            pixels (bytes): `width * height` palette indices.
+            delay (int): How long the frame is shown, in hundredths of
+                a second.
+        """
+        pixels = bytes(pixels)
+        rectangle: Optional[Tuple[int, int, int, int]] = changed_rectangle(
+            self._previous, pixels, self.width, self.height
+        )
+        self._previous = pixels
+        if rectangle is None:
+            self.extend(delay)
+            return
+
+        left, top, width, height = rectangle
+        if (left, top, width, height) == (0, 0, self.width, self.height):
+            region: bytes = pixels
+        else:
+            region = b"".join(
+                pixels[
+                    (top + y) * self.width
+                    + left : (top + y) * self.width
+                    + left
+                    + width
+                ]
+                for y in range(height)
+            )
+        self.add_region(rectangle, region, delay)
+
+    def add_region(
+        self, rectangle: Tuple[int, int, int, int], pixels: bytes, delay: int
+    ) -> None:
+        """Adds a frame that only changes a region of the previous one.
+
+        The first frame must cover the whole image.
+
+        Args:
+            rectangle (Tuple[int, int, int, int]): The left, top, width
+                and height of the region.
+            pixels (bytes): The palette indices of the region, row by
+                row.
+            delay (int): How long the frame is shown, in hundredths of
+                a second.
+        """
+        self._flush()
+        left, top, width, height = rectangle
+        self._descriptor = (
+            b"\x2c"
+            + left.to_bytes(2, "little")
+            + top.to_bytes(2, "little")
+            + width.to_bytes(2, "little")
+            + height.to_bytes(2, "little")
+            + b"\x00"
+            # LZW minimum code size, then the image data.
+            + b"\x08"
+            + sub_blocks(lzw_encode(pixels))
+        )
+        self._pending_delay = delay
+        self.frames += 1
+
+    def extend(self, delay: int) -> None:
+        """Shows the previous frame longer, since nothing changed."""
+        self._pending_delay += delay
+
+    def _flush(self) -> None:
+        """Writes the previous frame, now that its delay is known."""
+        if not self._descriptor:
+            return
+        # Graphic control extension: the frame is kept under the next one.
+        self.stream.write(
+            b"\x21\xf9\x04\x04"
+            + min(self._pending_delay, 0xFFFF).to_bytes(2, "little")
+            + b"\x00\x00"
+        )
+        self.stream.write(self._descriptor)
+
+    def close(self) -> None:
+        """Writes the last frame and the end of the gif."""
+        self._flush()
+        self._descriptor = b""
+        self.stream.write(b"\x3b")
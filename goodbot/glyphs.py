@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""
+glyphs.py contains the glyph cache used to draw terminal cells.
+
+Each character is rasterized once per font, size and attributes (bold,
+underline) into a mask: one byte per pixel, `1` where the glyph is drawn
+and `0` elsewhere. Masks have no anti-aliasing, so a cell only uses two
+colors of the palette. See `compositor.GlyphAtlas`.
+
+Glyphs are rasterized with Pillow, which is only required by the
+`render-gifs` command.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+from goodbot.terminal import BOLD, UNDERLINE
+
+# Fonts tried, in order, when no font is provided.
+DEFAULT_FONTS: Tuple[str, ...] = (
+    "DejaVuSansMono.ttf",
+    "/usr/share/fonts/truetype/dejavu/DejaVuSansMono.ttf",
+    "LiberationMono-Regular.ttf",
+    "/usr/share/fonts/truetype/liberation/LiberationMono-Regular.ttf",
+    "Menlo.ttc",
+    "consola.ttf",
+)
+DEFAULT_SIZE: int = 16
+
+# A glyph's mask, row by row.
+Mask = Tuple[bytes, ...]
+
+
+def load_font(path: Optional[str] = None, size: int = DEFAULT_SIZE) -> Any:
+    """Loads a monospace font.
+
+    Args:
+        path (Optional[str]): The font file. The first of
+            `DEFAULT_FONTS` that can be loaded is used by default, and
+            Pillow's built-in font if none can.
+        size (int): The size of the font, in pixels.
+
+    Raises:
+        RuntimeError: If Pillow is not installed.
+
+    Returns:
+        Any: A Pillow font.
+    """
+    try:
+        from PIL import ImageFont
+    except ImportError as err:
+        raise RuntimeError(
+            "Rendering gifs requires Pillow. Install it with `pip install pillow`."
+        ) from err
+
+    if path:
+        return ImageFont.truetype(path, size)
+    for candidate in DEFAULT_FONTS:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+class GlyphCache:
+    """Rasterizes and caches the glyphs of a font.
+
+    Attributes:
+        font_path (Optional[str]): The font file. See `load_font()`.
+        size (int): The size of the font, in pixels.
+        width (int): The width of a cell, in pixels.
+        height (int): The height of a cell, in pixels.
+    """
+
+    def __init__(
+        self, font_path: Optional[str] = None, size: int = DEFAULT_SIZE
+    ) -> None:
+        self.font_path = font_path
+        self.size = size
+        self.font: Any = load_font(font_path, size)
+        ascent, descent = self.font.getmetrics()
+        self.baseline: int = ascent
+        self.width: int = max(1, round(self.font.getlength("M")))
+        self.height: int = ascent + descent
+        self._masks: Dict[Tuple[str, int], Mask] = {}
+
+    def mask(self, char: str, attributes: int = 0) -> Mask:
+        """Finds the mask of a character.
+
+        Args:
+            char (str): The character.
+            attributes (int): `terminal.BOLD` and `terminal.UNDERLINE`.
+                Other attributes are ignored.
+
+        Returns:
+            Mask: `height` rows of `width` bytes.
+        """
+        key: Tuple[str, int] = (char, attributes & (BOLD | UNDERLINE))
+        if key not in self._masks:
+            self._masks[key] = self._rasterize(*key)
+        return self._masks[key]
+
+    def _rasterize(self, char: str, attributes: int) -> Mask:
+        from PIL import Image, ImageDraw
+
+        image = Image.new("L", (self.width, self.height), 0)
+        if char.strip():
+            ImageDraw.Draw(image).text((0, 0), char, font=self.font, fill=255)
+        pixels: bytes = image.tobytes()
+        rows: List[bytearray] = [
+            bytearray(
+                1 if value >= 128 else 0
+                for value in pixels[y * self.width : (y + 1) * self.width]
+            )
+            for y in range(self.height)
+        ]
+        if attributes & BOLD:
+            # Drawing each glyph a second time, one pixel to the right.
+            for row in rows:
+                row[1:] = bytes(a | b for a, b in zip(row[1:], row[:-1]))
+        if attributes & UNDERLINE:
+            underline: int = min(self.height - 1, self.baseline + 1)
+            rows[underline] = bytearray([1] * self.width)
+        return tuple(bytes(row) for row in rows)
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+journal.py contains functions used to keep track of the clips of a
+project that were completely rendered.
+
+`render.render()` writes each clip in the work directory and renames it
+once it is complete, then adds it to the project's journal. If a render
+is interrupted, the next run with `--resume` skips every clip that is
+in the journal and that still matches its files, and only renders the
+missing ones.
+
+The journal is a JSON file saved at the root of the project. Entries
+are keyed by the path of the clip's gif relative to the project and
+contain the size and modification time of the gif, the size and digest
+of the audio file, and the size of the clip. An entry whose files
+changed since it was written is not considered complete.
+
+Audio files and clips can be copied from the artifact cache, which
+gives them the time of the copy instead of the time they were created,
+so they are never stamped with it.
+"""
+import os
+import json
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+from goodbot.cache import file_digest
+
+JOURNAL_NAME: str = "render_journal.json"
+
+# The `build` command renders clips from many threads.
+_lock = threading.Lock()
+
+
+def journal_path(project_path: Path) -> Path:
+    """Finds where the journal of a project is saved."""
+    return project_path / JOURNAL_NAME
+
+
+def project_of(gif_path: Path) -> Path:
+    """Finds the project of a gif.
+
+    Gifs are saved under `[project]/[scene]/gifs/`.
+    """
+    return gif_path.resolve().parent.parent.parent
+
+
+def read_journal(project_path: Path) -> Dict[str, Dict[str, Any]]:
+    """Reads the journal of a project.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: The entry of each rendered clip,
+            keyed by the path of its gif relative to the project. Empty
+            if nothing was rendered yet.
+    """
+    try:
+        with open(journal_path(project_path), "r") as stream:
+            return json.load(stream)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_journal(project_path: Path, journal: Dict[str, Dict[str, Any]]) -> None:
+    descriptor, temporary = tempfile.mkstemp(
+        dir=project_path, prefix=f".{JOURNAL_NAME}."
+    )
+    with os.fdopen(descriptor, "w") as stream:
+        json.dump(journal, stream, indent=2, sort_keys=True)
+    os.replace(temporary, journal_path(project_path))
+
+
+def _relative(project_path: Path, path: Path) -> str:
+    return path.resolve().relative_to(project_path.resolve()).as_posix()
+
+
+def _stamp(path: Optional[Path]) -> Optional[Dict[str, int]]:
+    if path is None or not path.exists():
+        return None
+    stat: os.stat_result = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _content_stamp(path: Optional[Path]) -> Optional[Dict[str, Any]]:
+    if path is None or not path.exists():
+        return None
+    return {"size": path.stat().st_size, "digest": file_digest(path)}
+
+
+def _describe(
+    project_path: Path,
+    gif_and_audio: Tuple[Path, Union[Path, None]],
+    video_path: Path,
+) -> Dict[str, Any]:
+    gif_path, audio_path = gif_and_audio
+    return {
+        "video": _relative(project_path, video_path),
+        "audio": _relative(project_path, audio_path) if audio_path else None,
+        "stamps": {
+            "gif": _stamp(gif_path),
+            "audio": _content_stamp(audio_path),
+        },
+        "video_size": video_path.stat().st_size if video_path.exists() else None,
+    }
+
+
+def record(
+    gif_and_audio: Tuple[Path, Union[Path, None]],
+    video_path: Path,
+    project_path: Optional[Path] = None,
+) -> Dict[str, Any]:
+    """Adds a clip to the journal of its project, once it is complete.
+
+    Args:
+        gif_and_audio (Tuple[Path, Union[Path, None]]): The inputs of
+            the clip, as returned by `render.corresponding_audio()`.
+        video_path (Path): The rendered clip.
+        project_path (Optional[Path]): The project of the clip. Found
+            using `project_of()` by default.
+
+    Returns:
+        Dict[str, Any]: The new entry.
+    """
+    project_path = project_path or project_of(gif_and_audio[0])
+    entry: Dict[str, Any] = _describe(project_path, gif_and_audio, video_path)
+
+    with _lock:
+        journal: Dict[str, Dict[str, Any]] = read_journal(project_path)
+        journal[_relative(project_path, gif_and_audio[0])] = entry
+        _write_journal(project_path, journal)
+
+    return entry
+
+
+def is_complete(
+    gif_and_audio: Tuple[Path, Union[Path, None]],
+    video_path: Path,
+    project_path: Optional[Path] = None,
+) -> bool:
+    """Checks if a clip was completely rendered from its current inputs.
+
+    Args:
+        gif_and_audio (Tuple[Path, Union[Path, None]]): The inputs of
+            the clip.
+        video_path (Path): Where the clip is saved.
+        project_path (Optional[Path]): The project of the clip. Found
+            using `project_of()` by default.
+
+    Returns:
+        bool: Whether or not the journal contains the clip and its
+            files did not change since it was rendered.
+    """
+    if not video_path.exists() or not gif_and_audio[0].exists():
+        return False
+    project_path = project_path or project_of(gif_and_audio[0])
+    entry: Optional[Dict[str, Any]] = read_journal(project_path).get(
+        _relative(project_path, gif_and_audio[0])
+    )
+    return entry == _describe(project_path, gif_and_audio, video_path)
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+mp3.py contains functions used to read and join MPEG audio layer III
+streams without decoding them.
+
+An mp3 file is a sequence of independent frames, each starting with a
+4 bytes header. Text to speech services return one file per request.
+`concatenate()` joins those files by copying their frames, after
+removing the tags (ID3) and the Xing/Info frame that only describe a
+single file. Pauses are made of silent frames: frames whose side
+information declares no audio data at all.
+
+Joins are not gapless. Each file keeps the encoder delay at its start
+and the padding of its last frame, so every join adds a short silence,
+usually a few tens of milliseconds. Removing it exactly would require
+decoding and re-encoding the audio, since frames can't be cut: the
+silence is left between files, which end at sentences.
+
+See: ISO/IEC 11172-3 and ISO/IEC 13818-3.
+"""
+from typing import Iterator, List, NamedTuple, Optional, Tuple
+
+# Bitrates of layer III frames, in kbit/s, indexed by the header's
+# bitrate index. MPEG 2 and 2.5 share the same table.
+BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+SAMPLE_RATES = {
+    1: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    2.5: (11025, 12000, 8000),
+}
+
+# The header's version bits.
+VERSIONS = {0b00: 2.5, 0b10: 2, 0b11: 1}
+
+
+class FrameHeader(NamedTuple):
+    """The information contained in the header of a layer III frame."""
+
+    version: float
+    bitrate: int
+    sample_rate: int
+    padding: bool
+    protected: bool
+    mono: bool
+    length: int
+    samples: int
+
+    @property
+    def side_info_length(self) -> int:
+        """Length of the side information that follows the header."""
+        if self.version == 1:
+            return 17 if self.mono else 32
+        return 9 if self.mono else 17
+
+    @property
+    def duration(self) -> float:
+        """Duration of the frame, in seconds."""
+        return self.samples / self.sample_rate
+
+
+def parse_header(data: bytes, offset: int) -> Optional[FrameHeader]:
+    """Parses the frame header found at `offset`.
+
+    Args:
+        data (bytes): The contents of an mp3 file.
+        offset (int): Where the header is expected.
+
+    Returns:
+        Optional[FrameHeader]: The header, or `None` if there is no
+            valid layer III header at `offset`.
+    """
+    if offset + 4 > len(data):
+        return None
+    header: int = int.from_bytes(data[offset : offset + 4], "big")
+    if header >> 21 != 0x7FF:
+        return None
+
+    version: Optional[float] = VERSIONS.get((header >> 19) & 0b11)
+    layer: int = (header >> 17) & 0b11
+    bitrate_index: int = (header >> 12) & 0b1111
+    sample_rate_index: int = (header >> 10) & 0b11
+    if version is None or layer != 0b01:
+        return None
+    if bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    bitrate: int = BITRATES[1 if version == 1 else 2][bitrate_index] * 1000
+    sample_rate: int = SAMPLE_RATES[version][sample_rate_index]
+    padding: bool = bool((header >> 9) & 1)
+    samples: int = 1152 if version == 1 else 576
+
+    return FrameHeader(
+        version=version,
+        bitrate=bitrate,
+        sample_rate=sample_rate,
+        padding=padding,
+        protected=not (header >> 16) & 1,
+        mono=(header >> 6) & 0b11 == 0b11,
+        length=samples // 8 * bitrate // sample_rate + padding,
+        samples=samples,
+    )
+
+
+def audio_bounds(data: bytes) -> Tuple[int, int]:
+    """Finds where the frames of a file start and end, without its tags.
+
+    ID3v2 tags are removed from the start of the file and ID3v1 tags
+    from its end.
+
+    Returns:
+        Tuple[int, int]: The start and end offsets of the frames.
+    """
+    start: int = 0
+    while data[start : start + 3] == b"ID3" and start + 10 <= len(data):
+        # The tag size is a "syncsafe" integer: 7 bits per byte.
+        size: int = 0
+        for byte in data[start + 6 : start + 10]:
+            size = (size << 7) | (byte & 0x7F)
+        footer: int = 10 if data[start + 5] & 0x10 else 0
+        start += 10 + size + footer
+
+    end: int = len(data)
+    if end - start >= 128 and data[end - 128 : end - 125] == b"TAG":
+        end -= 128
+
+    return start, end
+
+
+def is_info_frame(data: bytes, offset: int, header: FrameHeader) -> bool:
+    """Checks if a frame is a Xing, Info or VBRI frame.
+
+    These frames contain no audio. They describe the whole file (amount
+    of frames, encoder delay...), so they are wrong once files are
+    joined.
+    """
+    tag_offset: int = offset + 4 + (2 if header.protected else 0)
+    tag_offset += header.side_info_length
+    if data[tag_offset : tag_offset + 4] in (b"Xing", b"Info"):
+        return True
+    return data[offset + 36 : offset + 40] == b"VBRI"
+
+
+def iter_frames(data: bytes) -> Iterator[Tuple[int, FrameHeader]]:
+    """Finds every audio frame of an mp3 file.
+
+    Bytes that are not part of a frame are skipped. The Xing/Info frame
+    is not yielded.
+
+    Args:
+        data (bytes): The contents of an mp3 file.
+
+    Yields:
+        Tuple[int, FrameHeader]: The offset and the header of a frame.
+    """
+    offset, end = audio_bounds(data)
+    first: bool = True
+
+    while offset + 4 <= end:
+        header: Optional[FrameHeader] = parse_header(data, offset)
+        if header is None or offset + header.length > end:
+            offset += 1
+            continue
+        if not (first and is_info_frame(data, offset, header)):
+            yield offset, header
+        first = False
+        offset += header.length
+
+
+def duration(data: bytes) -> float:
+    """Computes the duration of an mp3 file from its frames, in seconds."""
+    return sum(header.duration for _, header in iter_frames(data))
+
+
+def silence(template: FrameHeader, seconds: float) -> bytes:
+    """Creates silent frames that can be joined with a stream.
+
+    Args:
+        template (FrameHeader): A frame of the stream. The silent frames
+            use the same version, bitrate, sample rate and channels.
+        seconds (float): The duration of the silence. It is rounded to
+            a whole amount of frames.
+
+    Returns:
+        bytes: The silent frames.
+    """
+    frames: int = round(seconds * template.sample_rate / template.samples)
+    if frames <= 0:
+        return b""
+
+    version_bits: int = {1: 0b11, 2: 0b10, 2.5: 0b00}[template.version]
+    bitrate_index: int = BITRATES[1 if template.version == 1 else 2].index(
+        template.bitrate // 1000
+    )
+    sample_rate_index: int = SAMPLE_RATES[template.version].index(template.sample_rate)
+    header: int = (
+        (0x7FF << 21)
+        | (version_bits << 19)
+        | (0b01 << 17)
+        # No CRC.
+        | (1 << 16)
+        | (bitrate_index << 12)
+        | (sample_rate_index << 10)
+        | ((0b11 if template.mono else 0b00) << 6)
+    )
+    length: int = template.samples // 8 * template.bitrate // template.sample_rate
+    # Side information filled with zeros: no main data, no audio.
+    frame: bytes = header.to_bytes(4, "big") + bytes(length - 4)
+    return frame * frames
+
+
+def concatenate(files: List[bytes], pauses: Optional[List[float]] = None) -> bytes:
+    """Joins mp3 files by copying their frames.
+
+    The encoder delay and padding of each file are kept (see the module
+    documentation).
+
+    Args:
+        files (List[bytes]): The contents of each file, in order.
+        pauses (Optional[List[float]]): The duration of the silence to
+            add after each file, in seconds. Defaults to no silence.
+
+    Raises:
+        ValueError: If the files don't share the same sample rate and
+            channels, or if a file contains no frames.
+
+    Returns:
+        bytes: The contents of the joined file.
+    """
+    pauses = pauses or [0.0] * len(files)
+    output: List[bytes] = []
+    reference: Optional[FrameHeader] = None
+
+    for index, data in enumerate(files):
+        frames: List[Tuple[int, FrameHeader]] = list(iter_frames(data))
+        if not frames:
+            raise ValueError(f"File {index} does not contain mp3 frames.")
+
+        first: FrameHeader = frames[0][1]
+        if reference is None:
+            reference = first
+        elif (first.version, first.sample_rate, first.mono) != (
+            reference.version,
+            reference.sample_rate,
+            reference.mono,
+        ):
+            raise ValueError(f"File {index} has a different sample rate or channels.")
+
+        start, end = frames[0][0], frames[-1][0] + frames[-1][1].length
+        output.append(data[start:end])
+        if index < len(pauses) and pauses[index]:
+            output.append(silence(first, pauses[index]))
+
+    return b"".join(output)
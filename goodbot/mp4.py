@@ -0,0 +1,652 @@
+# -*- coding: utf-8 -*-
+"""
+mp4.py contains an in-process concatenator for `mp4` files.
+
+Clips rendered by the `render` module all share the same codecs and
+settings. Joining them does not require any decoding: the sample data
+of each clip is copied as-is from a memory-mapped source file and only
+the sample tables of the `moov` box are rewritten.
+
+Tracks are matched by handler type (`vide`, `soun`, ...). A clip that
+does not have a track of some type (a clip without narration, for
+example) is represented in that track by an empty edit, so that audio
+and video stay in sync for the rest of the video.
+
+If the clips can't be joined that way (different codecs, fragmented
+files, unknown tables...), `concatenate()` raises a `ValueError` and
+the caller should fall back to `ffmpeg`.
+
+See: ISO/IEC 14496-12 (ISO base media file format).
+"""
+import mmap
+import struct
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+CONTAINER_BOXES: Tuple[bytes, ...] = (b"moov", b"trak", b"mdia", b"minf", b"stbl")
+
+# Tables that are rebuilt for the output. Other boxes are copied from
+# the first clip that contains the track.
+SAMPLE_TABLES: Tuple[bytes, ...] = (
+    b"stsd",
+    b"stts",
+    b"ctts",
+    b"cslg",
+    b"stss",
+    b"stsc",
+    b"stsz",
+    b"stco",
+    b"co64",
+    b"sdtp",
+    b"sgpd",
+    b"sbgp",
+)
+
+# Amount of bytes copied at once from the source files.
+COPY_BLOCK_SIZE: int = 16 * 1024 * 1024
+
+
+class Box:
+    """A box of an `mp4` file.
+
+    Container boxes are parsed into `children`. Other boxes keep their
+    contents in `payload`.
+    """
+
+    def __init__(
+        self,
+        box_type: bytes,
+        payload: bytes = b"",
+        children: Optional[List["Box"]] = None,
+    ) -> None:
+        self.type = box_type
+        self.payload = payload
+        self.children = children
+
+    def find(self, box_type: bytes) -> Optional["Box"]:
+        """Returns the first child of type `box_type`, if there is one."""
+        for child in self.children or []:
+            if child.type == box_type:
+                return child
+        return None
+
+    def require(self, box_type: bytes) -> "Box":
+        """Returns the first child of type `box_type`.
+
+        Raises:
+            ValueError: If there is no such child.
+        """
+        child: Optional[Box] = self.find(box_type)
+        if child is None:
+            raise ValueError(f"Missing {box_type!r} box in {self.type!r}.")
+        return child
+
+    def find_all(self, box_type: bytes) -> List["Box"]:
+        """Returns every child of type `box_type`."""
+        return [child for child in self.children or [] if child.type == box_type]
+
+    def to_bytes(self) -> bytes:
+        """Serializes the box, including its header."""
+        if self.children is not None:
+            payload = b"".join(child.to_bytes() for child in self.children)
+        else:
+            payload = self.payload
+        return box_header(self.type, len(payload)) + payload
+
+
+def box_header(box_type: bytes, payload_size: int) -> bytes:
+    """Creates the header of a box that contains `payload_size` bytes."""
+    if payload_size + 8 <= 0xFFFFFFFF:
+        return struct.pack(">I4s", payload_size + 8, box_type)
+    return struct.pack(">I4sQ", 1, box_type, payload_size + 16)
+
+
+def iter_boxes(data, start: int, end: int) -> List[Tuple[bytes, int, int]]:
+    """Lists the boxes found between `start` and `end` in `data`.
+
+    Args:
+        data: A bytes-like object (`bytes`, `mmap`...) to read from.
+        start (int): Where the first box starts.
+        end (int): Where the last box ends.
+
+    Raises:
+        ValueError: If a box is truncated.
+
+    Returns:
+        List[Tuple[bytes, int, int]]: The type, payload start and end
+            of each box.
+    """
+    boxes: List[Tuple[bytes, int, int]] = []
+    position: int = start
+
+    while position + 8 <= end:
+        size, box_type = struct.unpack(">I4s", data[position : position + 8])
+        header: int = 8
+        if size == 1:
+            (size,) = struct.unpack(">Q", data[position + 8 : position + 16])
+            header = 16
+        elif size == 0:
+            size = end - position
+        if size < header or position + size > end:
+            raise ValueError(f"Truncated {box_type!r} box at offset {position}.")
+        boxes.append((box_type, position + header, position + size))
+        position += size
+
+    return boxes
+
+
+def parse_box(box_type: bytes, data, start: int, end: int) -> Box:
+    """Parses a box and, if it is a container, its children."""
+    if box_type not in CONTAINER_BOXES:
+        return Box(box_type, bytes(data[start:end]))
+    return Box(
+        box_type,
+        children=[
+            parse_box(child_type, data, child_start, child_end)
+            for child_type, child_start, child_end in iter_boxes(data, start, end)
+        ],
+    )
+
+
+def _uints(payload: bytes, offset: int, count: int, width: int = 4) -> List[int]:
+    code: str = "I" if width == 4 else "Q"
+    return list(
+        struct.unpack(f">{count}{code}", payload[offset : offset + count * width])
+    )
+
+
+def _pack_uints(values: List[int], width: int = 4) -> bytes:
+    return struct.pack(f">{len(values)}{'I' if width == 4 else 'Q'}", *values)
+
+
+def _full_box(version: int, flags: int = 0) -> bytes:
+    return struct.pack(">I", (version << 24) | flags)
+
+
+def _times(payload: bytes) -> Tuple[int, int]:
+    """Reads the timescale and duration of a `mvhd` or `mdhd` box."""
+    if payload[0] == 1:
+        return struct.unpack(">IQ", payload[20:32])
+    return struct.unpack(">II", payload[12:20])
+
+
+def _with_duration(box_type: bytes, payload: bytes, duration: int) -> Box:
+    """Copies a `mvhd`, `mdhd` or `tkhd` box with a new duration."""
+    if box_type == b"tkhd":
+        offset = 28 if payload[0] == 1 else 20
+    else:
+        offset = 24 if payload[0] == 1 else 16
+    if payload[0] == 1:
+        packed = struct.pack(">Q", duration)
+    elif duration <= 0xFFFFFFFF:
+        packed = struct.pack(">I", duration)
+    else:
+        raise ValueError(f"The duration of the {box_type!r} box overflows.")
+    return Box(box_type, payload[:offset] + packed + payload[offset + len(packed) :])
+
+
+class _Track:
+    """The sample tables of a single track of a clip."""
+
+    def __init__(self, trak: Box) -> None:
+        mdia: Box = trak.require(b"mdia")
+        stbl: Box = mdia.require(b"minf").require(b"stbl")
+        tkhd: Box = trak.require(b"tkhd")
+        mdhd: Box = mdia.require(b"mdhd")
+        hdlr: Box = mdia.require(b"hdlr")
+
+        self.trak: Box = trak
+        self.handler: bytes = hdlr.payload[8:12]
+        self.timescale, self.media_duration = _times(mdhd.payload)
+        tkhd_payload: bytes = tkhd.payload
+        if tkhd_payload[0] == 1:
+            (self.duration,) = struct.unpack(">Q", tkhd_payload[28:36])
+        else:
+            (self.duration,) = struct.unpack(">I", tkhd_payload[20:24])
+
+        for child in stbl.children or []:
+            if child.type not in SAMPLE_TABLES:
+                raise ValueError(f"Unsupported sample table {child.type!r}.")
+
+        self.stsd: bytes = stbl.require(b"stsd").payload
+        self.stts: List[Tuple[int, int]] = self._pairs(stbl.require(b"stts").payload)
+        self.stsc: List[int] = self._table(stbl.require(b"stsc").payload, 3)
+
+        stsz: bytes = stbl.require(b"stsz").payload
+        sample_size, self.sample_count = struct.unpack(">II", stsz[4:12])
+        self.sample_sizes: List[int] = (
+            _uints(stsz, 12, self.sample_count)
+            if sample_size == 0
+            else [sample_size] * self.sample_count
+        )
+
+        if stbl.find(b"co64"):
+            co64: bytes = stbl.require(b"co64").payload
+            self.chunk_offsets = _uints(co64, 8, struct.unpack(">I", co64[4:8])[0], 8)
+        else:
+            stco: bytes = stbl.require(b"stco").payload
+            self.chunk_offsets = _uints(stco, 8, struct.unpack(">I", stco[4:8])[0])
+
+        ctts: Optional[Box] = stbl.find(b"ctts")
+        self.ctts: Optional[List[Tuple[int, int]]] = None
+        if ctts:
+            self.ctts = self._pairs(ctts.payload, signed=ctts.payload[0] == 1)
+
+        stss: Optional[Box] = stbl.find(b"stss")
+        self.stss: Optional[List[int]] = None
+        if stss:
+            self.stss = _uints(
+                stss.payload, 8, struct.unpack(">I", stss.payload[4:8])[0]
+            )
+
+        sdtp: Optional[Box] = stbl.find(b"sdtp")
+        self.sdtp: Optional[bytes] = sdtp.payload[4:] if sdtp else None
+        sgpd: Optional[Box] = stbl.find(b"sgpd")
+        self.sgpd: Optional[bytes] = sgpd.payload if sgpd else None
+        self.sbgp_header: Optional[bytes] = None
+        self.sbgp: List[Tuple[int, int]] = []
+        sbgp: Optional[Box] = stbl.find(b"sbgp")
+        if sbgp:
+            header_size: int = 12 if sbgp.payload[0] == 1 else 8
+            self.sbgp_header = sbgp.payload[:header_size]
+            self.sbgp = self._pairs(sbgp.payload[header_size - 4 :])
+
+        edts: Optional[Box] = trak.find(b"edts")
+        self.edits: List[Tuple[int, int, bytes]] = (
+            self._edits(edts.payload) if edts else []
+        )
+        if not self.edits:
+            self.edits = [(self.duration, 0, struct.pack(">hh", 1, 0))]
+
+    @staticmethod
+    def _table(payload: bytes, width: int) -> List[int]:
+        (count,) = struct.unpack(">I", payload[4:8])
+        return _uints(payload, 8, count * width)
+
+    @staticmethod
+    def _pairs(payload: bytes, signed: bool = False) -> List[Tuple[int, int]]:
+        (count,) = struct.unpack(">I", payload[4:8])
+        flat: List[int] = _uints(payload, 8, count * 2)
+        second: List[int] = flat[1::2]
+        if signed:
+            second = [
+                value - (1 << 32) if value >= (1 << 31) else value for value in second
+            ]
+        return list(zip(flat[0::2], second))
+
+    @staticmethod
+    def _edits(edts_payload: bytes) -> List[Tuple[int, int, bytes]]:
+        edits: List[Tuple[int, int, bytes]] = []
+        for box_type, start, end in iter_boxes(edts_payload, 0, len(edts_payload)):
+            if box_type != b"elst":
+                continue
+            payload: bytes = edts_payload[start:end]
+            (count,) = struct.unpack(">I", payload[4:8])
+            entry: str = ">Qq4s" if payload[0] == 1 else ">Ii4s"
+            size: int = struct.calcsize(entry)
+            for index in range(count):
+                edits.append(
+                    struct.unpack(
+                        entry, payload[8 + index * size : 8 + (index + 1) * size]
+                    )
+                )
+        return edits
+
+
+class _Movie:
+    """A memory-mapped clip and its tracks."""
+
+    def __init__(self, path: Path, stack: ExitStack) -> None:
+        stream = stack.enter_context(open(path, "rb"))
+        self.path: Path = path
+        self.data = stack.enter_context(
+            mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        )
+        self.ftyp: Optional[bytes] = None
+        self.mdat_ranges: List[Tuple[int, int]] = []
+        moov: Optional[Box] = None
+
+        for box_type, start, end in iter_boxes(self.data, 0, len(self.data)):
+            if box_type == b"ftyp":
+                self.ftyp = bytes(self.data[start:end])
+            elif box_type == b"moov":
+                moov = parse_box(box_type, self.data, start, end)
+            elif box_type == b"mdat":
+                self.mdat_ranges.append((start, end))
+            elif box_type in (b"moof", b"mfra", b"sidx"):
+                raise ValueError(f"{path} is a fragmented mp4 file.")
+
+        if moov is None or moov.find(b"mvhd") is None:
+            raise ValueError(f"{path} does not contain a movie box.")
+        if moov.find(b"mvex"):
+            raise ValueError(f"{path} is a fragmented mp4 file.")
+
+        self.moov: Box = moov
+        self.timescale, self.duration = _times(moov.require(b"mvhd").payload)
+        self.tracks: Dict[bytes, _Track] = {}
+
+        for trak in moov.find_all(b"trak"):
+            track = _Track(trak)
+            if track.handler in self.tracks:
+                raise ValueError(f"{path} contains many {track.handler!r} tracks.")
+            self.tracks[track.handler] = track
+
+    def translate(self, offset: int, bases: List[int]) -> int:
+        """Finds where a chunk offset of this clip ends up in the output."""
+        for (start, end), base in zip(self.mdat_ranges, bases):
+            if start <= offset < end:
+                return base + offset - start
+        raise ValueError(f"A chunk of {self.path} is outside of its mdat box.")
+
+
+def _merge_runs(pairs: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for count, value in pairs:
+        if merged and merged[-1][1] == value:
+            merged[-1] = (merged[-1][0] + count, value)
+        elif count:
+            merged.append((count, value))
+    return merged
+
+
+def _pairs_box(box_type: bytes, version: int, pairs: List[Tuple[int, int]]) -> Box:
+    flat: List[int] = []
+    for count, value in pairs:
+        flat.append(count)
+        flat.append(value & 0xFFFFFFFF)
+    return Box(
+        box_type, _full_box(version) + struct.pack(">I", len(pairs)) + _pack_uints(flat)
+    )
+
+
+def _merge_edits(
+    edits: List[Tuple[int, int, bytes]], movie_timescale: int, media_timescale: int
+) -> List[Tuple[int, int, bytes]]:
+    """Merges edits that play contiguous media at the same rate."""
+    merged: List[Tuple[int, int, bytes]] = []
+    for segment, media_time, rate in edits:
+        if merged:
+            last_segment, last_time, last_rate = merged[-1]
+            contiguous: bool = (
+                last_time != -1
+                and media_time != -1
+                and last_rate == rate
+                and last_time * movie_timescale + last_segment * media_timescale
+                == media_time * movie_timescale
+            )
+            if contiguous or (last_time == -1 and media_time == -1):
+                merged[-1] = (last_segment + segment, last_time, rate)
+                continue
+        if segment:
+            merged.append((segment, media_time, rate))
+    return merged
+
+
+def _build_track(
+    handler: bytes,
+    movies: List[_Movie],
+    chunk_bases: List[List[int]],
+    use_co64: bool,
+) -> Box:
+    """Creates the `trak` box of `handler` from the tracks of every clip."""
+    present: List[_Track] = [
+        movie.tracks[handler] for movie in movies if handler in movie.tracks
+    ]
+    template: _Track = present[0]
+
+    for other in present:
+        if other.stsd != template.stsd or other.timescale != template.timescale:
+            raise ValueError(f"The {handler!r} tracks use different settings.")
+        if (other.sgpd, other.sbgp_header) != (template.sgpd, template.sbgp_header):
+            raise ValueError(f"The {handler!r} tracks use different sample groups.")
+        if (other.sdtp is None) != (template.sdtp is None):
+            raise ValueError(f"Only some {handler!r} tracks have dependency tables.")
+
+    stts: List[Tuple[int, int]] = []
+    ctts: List[Tuple[int, int]] = []
+    stss: List[int] = []
+    stsc: List[int] = []
+    sizes: List[int] = []
+    offsets: List[int] = []
+    sdtp: List[bytes] = []
+    sbgp: List[Tuple[int, int]] = []
+    edits: List[Tuple[int, int, bytes]] = []
+    has_ctts: bool = any(track.ctts is not None for track in present)
+    has_stss: bool = any(track.stss is not None for track in present)
+    ctts_version: int = 0
+    samples: int = 0
+    chunks: int = 0
+    media_duration: int = 0
+
+    for index, movie in enumerate(movies):
+        track: Optional[_Track] = movie.tracks.get(handler)
+        played: int = 0
+
+        if track is not None:
+            stts += track.stts
+            if track.ctts is not None:
+                ctts += track.ctts
+                ctts_version |= int(any(value < 0 for _, value in track.ctts))
+            elif has_ctts:
+                ctts.append((track.sample_count, 0))
+            if track.stss is not None:
+                stss += [sample + samples for sample in track.stss]
+            elif has_stss:
+                stss += range(samples + 1, samples + track.sample_count + 1)
+            for first_chunk, per_chunk, description in zip(
+                track.stsc[0::3], track.stsc[1::3], track.stsc[2::3]
+            ):
+                stsc += [first_chunk + chunks, per_chunk, description]
+            sizes += track.sample_sizes
+            offsets += [
+                movie.translate(offset, chunk_bases[index])
+                for offset in track.chunk_offsets
+            ]
+            if track.sdtp is not None:
+                sdtp.append(track.sdtp)
+            if track.sbgp_header is not None:
+                grouped: int = sum(count for count, _ in track.sbgp)
+                sbgp += track.sbgp + [(track.sample_count - grouped, 0)]
+
+            for segment, media_time, rate in track.edits:
+                if media_time != -1:
+                    media_time += media_duration
+                edits.append((segment, media_time, rate))
+                played += segment
+
+            samples += track.sample_count
+            chunks += len(track.chunk_offsets)
+            media_duration += track.media_duration
+
+        # Empty edit so that the next clip starts in sync with the
+        # other tracks.
+        if index < len(movies) - 1 and movie.duration > played:
+            edits.append((movie.duration - played, -1, struct.pack(">hh", 1, 0)))
+
+    edits = _merge_edits(edits, movies[0].timescale, template.timescale)
+    track_duration: int = sum(segment for segment, _, _ in edits)
+
+    stbl_children: List[Box] = [
+        Box(b"stsd", template.stsd),
+        _pairs_box(b"stts", 0, _merge_runs(stts)),
+    ]
+    if has_ctts:
+        stbl_children.append(_pairs_box(b"ctts", ctts_version, _merge_runs(ctts)))
+    if has_stss:
+        stbl_children.append(
+            Box(
+                b"stss", _full_box(0) + struct.pack(">I", len(stss)) + _pack_uints(stss)
+            )
+        )
+    if template.sdtp is not None:
+        stbl_children.append(Box(b"sdtp", _full_box(0) + b"".join(sdtp)))
+    stbl_children.append(
+        Box(
+            b"stsc",
+            _full_box(0) + struct.pack(">I", len(stsc) // 3) + _pack_uints(stsc),
+        )
+    )
+    if sizes and all(size == sizes[0] for size in sizes):
+        stsz: bytes = struct.pack(">II", sizes[0], len(sizes))
+    else:
+        stsz = struct.pack(">II", 0, len(sizes)) + _pack_uints(sizes)
+    stbl_children.append(Box(b"stsz", _full_box(0) + stsz))
+    stbl_children.append(
+        Box(
+            b"co64" if use_co64 else b"stco",
+            _full_box(0)
+            + struct.pack(">I", len(offsets))
+            + _pack_uints(offsets, 8 if use_co64 else 4),
+        )
+    )
+    if template.sgpd is not None:
+        stbl_children.append(Box(b"sgpd", template.sgpd))
+    if template.sbgp_header is not None:
+        sbgp_box: Box = _pairs_box(b"sbgp", 0, _merge_runs(sbgp))
+        stbl_children.append(Box(b"sbgp", template.sbgp_header + sbgp_box.payload[4:]))
+
+    large: bool = any(
+        segment > 0xFFFFFFFF or media_time > 0x7FFFFFFF
+        for segment, media_time, _ in edits
+    )
+    elst: bytes = _full_box(int(large)) + struct.pack(">I", len(edits))
+    for segment, media_time, rate in edits:
+        elst += struct.pack(">Qq4s" if large else ">Ii4s", segment, media_time, rate)
+
+    def rebuild(box: Box) -> Box:
+        if box.type == b"stbl":
+            return Box(b"stbl", children=stbl_children)
+        if box.type == b"tkhd":
+            return _with_duration(b"tkhd", box.payload, track_duration)
+        if box.type == b"mdhd":
+            return _with_duration(b"mdhd", box.payload, media_duration)
+        if box.type == b"edts":
+            return Box(b"edts", children=[Box(b"elst", elst)])
+        if box.children is None:
+            return box
+        return Box(box.type, children=[rebuild(child) for child in box.children])
+
+    trak: Box = rebuild(template.trak)
+    if trak.find(b"edts") is None:
+        # Right after the `tkhd` box.
+        children: List[Box] = trak.children or []
+        children.insert(1, Box(b"edts", children=[Box(b"elst", elst)]))
+    return trak
+
+
+def _build_moov(
+    movies: List[_Movie], chunk_bases: List[List[int]], use_co64: bool
+) -> Box:
+    handlers: List[bytes] = []
+    for movie in movies:
+        for handler in movie.tracks:
+            if handler not in handlers:
+                handlers.append(handler)
+
+    traks: Dict[bytes, Box] = {
+        handler: _build_track(handler, movies, chunk_bases, use_co64)
+        for handler in handlers
+    }
+    duration: int = 0
+    for trak in traks.values():
+        tkhd: bytes = trak.require(b"tkhd").payload
+        if tkhd[0] == 1:
+            duration = max(duration, struct.unpack(">Q", tkhd[28:36])[0])
+        else:
+            duration = max(duration, struct.unpack(">I", tkhd[20:24])[0])
+
+    # The first clip that has every track is used as a template.
+    template: _Movie = max(movies, key=lambda movie: len(movie.tracks))
+    children: List[Box] = []
+    for child in template.moov.children or []:
+        if child.type == b"mvhd":
+            children.append(_with_duration(b"mvhd", child.payload, duration))
+        elif child.type == b"trak":
+            for track in template.tracks.values():
+                if track.trak is child:
+                    children.append(traks.pop(track.handler))
+        else:
+            children.append(child)
+    # Tracks that are not in the template.
+    children += traks.values()
+
+    return Box(b"moov", children=children)
+
+
+def concatenate(video_paths: List[Path], output_path: Path) -> Path:
+    """Joins `mp4` clips without decoding them.
+
+    The output file contains an `ftyp` box, the rewritten `moov` box and
+    a single `mdat` box, in this order, so that it can be played while
+    it is streamed.
+
+    Args:
+        video_paths (List[Path]): The clips to join, in order.
+        output_path (Path): Where to save the joined video.
+
+    Raises:
+        ValueError: If the clips can't be joined without re-encoding.
+
+    Returns:
+        Path: The path towards the joined video. This is the same value
+            as the `output_path` argument.
+    """
+    if not video_paths:
+        raise ValueError("There are no videos to concatenate.")
+
+    with ExitStack() as stack:
+        try:
+            movies: List[_Movie] = [_Movie(Path(path), stack) for path in video_paths]
+        except (struct.error, EOFError, IndexError) as err:
+            # Boxes that are shorter than their tables.
+            raise ValueError(f"A clip is truncated or malformed ({err}).") from err
+
+        for movie in movies:
+            if movie.timescale != movies[0].timescale:
+                raise ValueError("The videos use different timescales.")
+
+        ftyp: bytes = movies[0].ftyp or b""
+        ftyp_box: bytes = box_header(b"ftyp", len(ftyp)) + ftyp if ftyp else b""
+        payload_size: int = sum(
+            end - start for movie in movies for start, end in movie.mdat_ranges
+        )
+        mdat_header: bytes = box_header(b"mdat", payload_size)
+
+        def bases(mdat_start: int) -> List[List[int]]:
+            all_bases: List[List[int]] = []
+            position: int = mdat_start
+            for movie in movies:
+                movie_bases: List[int] = []
+                for start, end in movie.mdat_ranges:
+                    movie_bases.append(position)
+                    position += end - start
+                all_bases.append(movie_bases)
+            return all_bases
+
+        # The size of the `moov` box does not depend on the offsets, only
+        # on whether they are written on 32 or 64 bits.
+        use_co64: bool = False
+        moov_size: int = len(_build_moov(movies, bases(0), use_co64).to_bytes())
+        mdat_start: int = len(ftyp_box) + moov_size + len(mdat_header)
+        if mdat_start + payload_size > 0xFFFFFFFF:
+            use_co64 = True
+            moov_size = len(_build_moov(movies, bases(0), use_co64).to_bytes())
+            mdat_start = len(ftyp_box) + moov_size + len(mdat_header)
+
+        moov: bytes = _build_moov(movies, bases(mdat_start), use_co64).to_bytes()
+
+        with open(output_path, "wb") as out:
+            out.write(ftyp_box)
+            out.write(moov)
+            out.write(mdat_header)
+            for movie in movies:
+                view = memoryview(movie.data)
+                try:
+                    for start, end in movie.mdat_ranges:
+                        for block in range(start, end, COPY_BLOCK_SIZE):
+                            out.write(view[block : min(block + COPY_BLOCK_SIZE, end)])
+                finally:
+                    view.release()
+
+    return output_path
@@ -0,0 +1,544 @@
+# -*- coding: utf-8 -*-
+"""
+pipeline.py contains the task graph scheduler used by the `build`
+command.
+
+Every step needed to go from a project directory to a final video is
+modeled as a `Task`. Tasks declare the tasks they depend on and the
+resource class they use. The scheduler starts a task as soon as its
+dependencies are complete and a slot of its resource class is free.
+This means that a clip can be rendered as soon as its own recording
+and audio exist, while other scenes are still being recorded.
+
+Resource classes:
+
+* `terminal`: Recordings. They run in a real terminal and can change
+  the environment seen by the next recordings, so they run one at a
+  time. Recordings of a scene are also kept in the order of the
+  script.
+* `network`: Text to speech requests.
+* `cpu`: Gif conversions, clip renders, the final concatenation and
+  offline text to speech.
+"""
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from functools import partial
+from pathlib import Path
+from rich.console import Console
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from goodbot import (
+    audio,
+    cast_render,
+    editor,
+    journal,
+    render,
+    shell_commands,
+    timing,
+    utils,
+)
+from goodbot.cache import ArtifactCache
+from goodbot.dedup import DedupStore
+from goodbot.tts import TTSBackend, get_backend
+from goodbot.recording import find_to_record, get_content_file_id
+
+DEFAULT_RESOURCE_LIMITS: Dict[str, int] = {
+    "terminal": 1,
+    "network": 4,
+    "cpu": os.cpu_count() or 1,
+}
+
+
+class Task:
+    """A single step of the pipeline.
+
+    Attributes:
+        name (str): A unique name for the task. Other tasks use this
+            name to depend on it.
+        action (Callable[[], Any]): The function that does the work.
+        resource (str): The resource class used by the task. Must be
+            a key of the limits passed to `run_graph()`.
+        dependencies (List[str]): The names of the tasks that must be
+            completed before this one can start.
+        result (Any): The value returned by `action`, once it ran.
+        duration (float): How long `action` took to run, in seconds.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        action: Callable[[], Any],
+        resource: str,
+        dependencies: Optional[List[str]] = None,
+    ) -> None:
+        self.name = name
+        self.action = action
+        self.resource = resource
+        self.dependencies: List[str] = list(dependencies or [])
+        self.result: Any = None
+        self.duration: float = 0.0
+
+    def __repr__(self) -> str:
+        return f"Task({self.name!r}, resource={self.resource!r})"
+
+
+def check_graph(tasks: List[Task], limits: Dict[str, int]) -> List[str]:
+    """Makes sure that a list of tasks forms a valid graph.
+
+    Args:
+        tasks (List[Task]): The tasks to check.
+        limits (Dict[str, int]): The resource limits that will be used
+            to run the tasks.
+
+    Raises:
+        ValueError: If two tasks share a name, if a task depends on a
+            task that does not exist, if a task uses an unknown
+            resource class or if the graph contains a cycle.
+
+    Returns:
+        List[str]: The name of each task, in a valid execution order.
+    """
+    by_name: Dict[str, Task] = {}
+
+    for task in tasks:
+        if task.name in by_name:
+            raise ValueError(f"Task {task.name} is defined twice.")
+        if limits.get(task.resource, 0) < 1:
+            raise ValueError(
+                f"Task {task.name} uses resource {task.resource}, which has no slots."
+            )
+        by_name[task.name] = task
+
+    for task in tasks:
+        for dependency in task.dependencies:
+            if dependency not in by_name:
+                raise ValueError(f"Task {task.name} depends on unknown {dependency}.")
+
+    order: List[str] = []
+    placed: Set[str] = set()
+    remaining: List[Task] = list(tasks)
+
+    while remaining:
+        ready = [
+            task
+            for task in remaining
+            if all(dependency in placed for dependency in task.dependencies)
+        ]
+        if not ready:
+            names = ", ".join(task.name for task in remaining)
+            raise ValueError(f"The task graph contains a cycle between: {names}")
+        for task in ready:
+            order.append(task.name)
+            placed.add(task.name)
+        remaining = [task for task in remaining if task.name not in placed]
+
+    return order
+
+
+def _run_task(task: Task) -> Any:
+    start: float = time.perf_counter()
+    try:
+        task.result = task.action()
+    finally:
+        task.duration = time.perf_counter() - start
+    return task.result
+
+
+def run_graph(
+    tasks: List[Task],
+    limits: Optional[Dict[str, int]] = None,
+    console: Optional[Console] = None,
+) -> Dict[str, Any]:
+    """Runs every task of a graph as soon as it can be run.
+
+    A task can run once all of its dependencies are complete and its
+    resource class has a free slot. When many tasks are ready, they are
+    started in the order of the `tasks` list.
+
+    If a task fails, no new task is started. Tasks that are already
+    running are allowed to finish and the first error is raised again.
+
+    Args:
+        tasks (List[Task]): The tasks to run.
+        limits (Optional[Dict[str, int]]): How many tasks of each
+            resource class can run at the same time. Missing values are
+            taken from `DEFAULT_RESOURCE_LIMITS`.
+        console (Optional[Console]): Where to log finished tasks.
+
+    Returns:
+        Dict[str, Any]: A summary of the run. Contains the amount of
+            `tasks`, the `wall_time` in seconds, the time spent `busy`
+            per resource class and the `utilization` of each resource
+            class (busy time over available time).
+    """
+    all_limits: Dict[str, int] = {**DEFAULT_RESOURCE_LIMITS, **(limits or {})}
+    check_graph(tasks, all_limits)
+
+    pending: Dict[str, Task] = {task.name: task for task in tasks}
+    done: Set[str] = set()
+    running: Dict[Future, Task] = {}
+    in_use: Dict[str, int] = {resource: 0 for resource in all_limits}
+    error: Optional[BaseException] = None
+    start: float = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=sum(all_limits.values())) as executor:
+        while (pending and error is None) or running:
+            if error is None:
+                for name, task in list(pending.items()):
+                    if in_use[task.resource] >= all_limits[task.resource]:
+                        continue
+                    if all(dependency in done for dependency in task.dependencies):
+                        del pending[name]
+                        in_use[task.resource] += 1
+                        running[executor.submit(_run_task, task)] = task
+
+            finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+
+            for future in finished:
+                task = running.pop(future)
+                in_use[task.resource] -= 1
+                try:
+                    future.result()
+                except Exception as err:
+                    if error is None:
+                        error = err
+                    if console:
+                        console.log(f"[bold red]{task.name} failed: {err}")
+                else:
+                    done.add(task.name)
+                    if console:
+                        console.log(f"{task.name} done in {task.duration:.2f}s.")
+
+    if error is not None:
+        raise error
+
+    wall_time: float = time.perf_counter() - start
+    busy: Dict[str, float] = {resource: 0.0 for resource in all_limits}
+    for task in tasks:
+        busy[task.resource] += task.duration
+
+    return {
+        "tasks": len(tasks),
+        "wall_time": wall_time,
+        "busy": busy,
+        "utilization": {
+            resource: (
+                busy[resource] / (wall_time * all_limits[resource])
+                if wall_time
+                else 0.0
+            )
+            for resource in all_limits
+        },
+    }
+
+
+def _scene_order(scene: Path) -> Tuple[int, str]:
+    try:
+        return (get_content_file_id(scene), scene.name)
+    except ValueError:
+        return (sys.maxsize, scene.name)
+
+
+def _record_action(
+    instructions_file: Path,
+    docker: bool,
+    no_docker: bool,
+    debug: bool,
+    store: Optional[DedupStore] = None,
+) -> Callable[[], Path]:
+    if instructions_file.parent.name == "edit":
+        return partial(editor.record_editor, instructions_file, debug)
+    record: Callable[[Path], Path] = partial(
+        shell_commands.record_command, docker=docker, no_docker=no_docker, debug=debug
+    )
+    if store:
+        return lambda: store.record(
+            instructions_file, record, {"docker": docker, "no_docker": no_docker}
+        )[0]
+    return partial(record, instructions_file)
+
+
+def _gif_of(scene: Path, element: Path) -> Path:
+    return (scene / "gifs" / element.stem).with_suffix(".gif")
+
+
+def _scene_rendered(scene: Path) -> bool:
+    """Checks if every clip of a scene is in the project's journal."""
+    elements: List[Path] = find_to_record(scene)
+    for element in elements:
+        gif_path: Path = _gif_of(scene, element)
+        if not gif_path.exists():
+            return False
+        gif_and_audio: Tuple[Path, Union[Path, None]] = render.corresponding_audio(
+            gif_path
+        )
+        if not journal.is_complete(gif_and_audio, render.clip_path(gif_path)):
+            return False
+    return bool(elements)
+
+
+def build_project_graph(
+    project_path: Path,
+    lang: str = "en-US",
+    lang_name: str = "en-US-Standard-C",
+    docker: bool = False,
+    no_docker: bool = False,
+    debug: bool = False,
+    cache: Optional[ArtifactCache] = None,
+    tts_backend: Optional[TTSBackend] = None,
+    fit: bool = False,
+    resume: bool = False,
+    encoder: str = "ffmpeg",
+    threads: Optional[int] = None,
+) -> List[Task]:
+    """Creates the tasks required to build a project's final video.
+
+    For each element of each scene, the graph contains:
+
+    * A `record` task that creates the asciicast. Each recording
+      depends on the previous one in the same scene.
+    * A `gif` task that converts the asciicast to a gif.
+    * A `tts` task for the element's `read` file, if there is one.
+    * A `fit` task that fits the recording to the audio file, if there
+      is one and `fit` is set.
+    * A `clip` task that renders the gif and audio to an mp4 file.
+
+    A single `final` task depends on every clip and concatenates them.
+
+    Args:
+        project_path (Path): The path towards the project to build.
+        lang (str): The language code for the audio recordings.
+            Defaults to "en-US".
+        lang_name (str): The language name for the audio recordings.
+            Defaults to "en-US-Standard-C".
+        docker (bool): Passed to the runner program. Defaults to False.
+        no_docker (bool): Passed to the runner program. Defaults to False.
+        debug (bool): Whether or not to print the output of the external
+            programs. Defaults to False.
+        cache (Optional[ArtifactCache]): If provided, recordings, audio
+            files and clips are reused from this cache when possible.
+        tts_backend (Optional[TTSBackend]): Records the audio files.
+            Defaults to Google TTS. Offline backends use the `cpu`
+            resource class instead of `network`.
+        fit (bool): Whether or not to fit narrated recordings to the
+            length of their audio before converting them to gifs. See
+            the `timing` module.
+        resume (bool): Whether or not to keep the work of a previous
+            run. Scenes whose clips were all rendered (see the `journal`
+            module) are not recorded again, and clips are only rendered
+            if they are missing or out of date.
+        encoder (str): The backend that encodes the clips. See
+            `render.ENCODER_BACKENDS`.
+        threads (Optional[int]): How many threads encode each clip.
+            Every core if `None`.
+
+    Returns:
+        List[Task]: Every task of the project, in script order.
+    """
+    tasks: List[Task] = []
+    clips: List[str] = []
+    store: Optional[DedupStore] = DedupStore(cache) if cache else None
+    backend: TTSBackend = tts_backend or get_backend()
+
+    scenes: List[Path] = [
+        directory for directory in project_path.iterdir() if utils.is_scene(directory)
+    ]
+
+    for scene in sorted(scenes, key=_scene_order):
+
+        if resume and _scene_rendered(scene):
+            # Every clip of the scene was rendered by a previous run.
+            for element in find_to_record(scene):
+                tasks.append(
+                    Task(
+                        f"clip:{scene.name}/{element.stem}",
+                        partial(
+                            render.render,
+                            render.corresponding_audio(_gif_of(scene, element)),
+                            debug,
+                            cache,
+                            True,
+                            encoder=encoder,
+                            threads=threads,
+                        ),
+                        "cpu",
+                    )
+                )
+                clips.append(tasks[-1].name)
+            continue
+
+        audio_tasks: Dict[int, Tuple[str, Path]] = {}
+        previous_recording: Optional[str] = None
+
+        for script in audio.fetch_scene_audio_instructions(scene):
+            name: str = f"tts:{scene.name}/{script.stem}"
+            tasks.append(
+                Task(
+                    name,
+                    partial(
+                        audio.record_audio_file,
+                        script,
+                        project_path,
+                        lang,
+                        lang_name,
+                        cache,
+                        backend=backend,
+                    ),
+                    "cpu" if backend.offline else "network",
+                )
+            )
+            audio_path: Path = (scene / "audio" / script.stem).with_suffix(".mp3")
+            audio_tasks[get_content_file_id(script)] = (name, audio_path)
+
+        for element in find_to_record(scene):
+            element_id: int = get_content_file_id(element)
+            element_name: str = f"{scene.name}/{element.stem}"
+            asciicast_path: Path = (scene / "asciicasts" / element.stem).with_suffix(
+                ".cast"
+            )
+            gif_path: Path = _gif_of(scene, element)
+
+            record_name: str = f"record:{element_name}"
+            tasks.append(
+                Task(
+                    record_name,
+                    _record_action(element, docker, no_docker, debug, store),
+                    "terminal",
+                    [previous_recording] if previous_recording else [],
+                )
+            )
+            previous_recording = record_name
+
+            gif_dependencies: List[str] = [record_name]
+            if fit and element_id in audio_tasks:
+                fit_name: str = f"fit:{element_name}"
+                tasks.append(
+                    Task(
+                        fit_name,
+                        partial(timing.fit_to_narration, asciicast_path),
+                        "cpu",
+                        [record_name, audio_tasks[element_id][0]],
+                    )
+                )
+                gif_dependencies = [fit_name]
+
+            gif_name: str = f"gif:{element_name}"
+            tasks.append(
+                Task(
+                    gif_name,
+                    partial(cast_render.render_cast, asciicast_path, gif_path),
+                    "cpu",
+                    gif_dependencies,
+                )
+            )
+
+            clip_dependencies: List[str] = [gif_name]
+            clip_audio: Union[Path, None] = None
+            if element_id in audio_tasks:
+                clip_dependencies.append(audio_tasks[element_id][0])
+                clip_audio = audio_tasks[element_id][1]
+
+            clip_name: str = f"clip:{element_name}"
+            tasks.append(
+                Task(
+                    clip_name,
+                    partial(
+                        render.render,
+                        (gif_path, clip_audio),
+                        debug,
+                        cache,
+                        resume,
+                        encoder=encoder,
+                        threads=threads,
+                    ),
+                    "cpu",
+                    clip_dependencies,
+                )
+            )
+            clips.append(clip_name)
+
+    tasks.append(
+        Task("final", partial(render.render_final, project_path, debug), "cpu", clips)
+    )
+
+    return tasks
+
+
+def build_project(
+    project_path: Path,
+    lang: str = "en-US",
+    lang_name: str = "en-US-Standard-C",
+    docker: bool = False,
+    no_docker: bool = False,
+    debug: bool = False,
+    limits: Optional[Dict[str, int]] = None,
+    cache: Optional[ArtifactCache] = None,
+    tts_backend: Optional[TTSBackend] = None,
+    fit: bool = False,
+    resume: bool = False,
+    encoder: str = "ffmpeg",
+) -> Path:
+    """Records and renders a whole project using the task graph.
+
+    The graph is created by `build_project_graph()` and run by
+    `run_graph()`. A summary of the run is logged once every task
+    is complete.
+
+    Args:
+        project_path (Path): The path towards the project to build.
+        lang (str): The language code for the audio recordings.
+            Defaults to "en-US".
+        lang_name (str): The language name for the audio recordings.
+            Defaults to "en-US-Standard-C".
+        docker (bool): Passed to the runner program. Defaults to False.
+        no_docker (bool): Passed to the runner program. Defaults to False.
+        debug (bool): Whether or not to print the output of the external
+            programs. Defaults to False.
+        limits (Optional[Dict[str, int]]): How many tasks of each
+            resource class can run at the same time. Each clip is
+            encoded with as many threads as there are cores divided by
+            the `cpu` limit.
+        cache (Optional[ArtifactCache]): See `build_project_graph()`.
+        tts_backend (Optional[TTSBackend]): See `build_project_graph()`.
+        fit (bool): See `build_project_graph()`.
+        resume (bool): See `build_project_graph()`.
+        encoder (str): See `build_project_graph()`.
+
+    Returns:
+        Path: The path towards the final video.
+    """
+    # Clips rendered at the same time share the cores, instead of each
+    # encoder using all of them.
+    cpu_limit: int = {**DEFAULT_RESOURCE_LIMITS, **(limits or {})}["cpu"]
+    threads: int = max(1, (os.cpu_count() or 1) // max(1, cpu_limit))
+    tasks: List[Task] = build_project_graph(
+        project_path,
+        lang,
+        lang_name,
+        docker,
+        no_docker,
+        debug,
+        cache,
+        tts_backend,
+        fit,
+        resume,
+        encoder,
+        threads,
+    )
+    console: Console = Console()
+
+    with console.status("[bold green]Building project..."):
+        summary: Dict[str, Any] = run_graph(tasks, limits, console)
+
+    console.log(f"Ran {summary['tasks']} tasks in {summary['wall_time']:.2f}s.")
+    for resource, busy in summary["busy"].items():
+        console.log(
+            f"{resource}: busy for {busy:.2f}s "
+            f"({summary['utilization'][resource]:.0%} utilization)."
+        )
+    if cache:
+        console.log(cache.report())
+
+    return tasks[-1].result
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+pool_worker.py is the program started inside of each pre-warmed
+Asciinema session of a `shell_pool.RecordingPool`.
+
+The worker imports the runner program, tells the pool that it is ready
+by creating a file and then waits for a line of instructions on a named
+pipe. The line is a JSON list of arguments for the runner program. An
+empty line tells the worker to exit without running anything.
+
+Usage:
+
+    python -m goodbot.pool_worker [FIFO PATH] [READY PATH]
+"""
+import json
+import sys
+from importlib import metadata
+from pathlib import Path
+from typing import Any, Callable, List
+
+
+def load_runner() -> Callable[[], Any]:
+    """Imports the runner program's entry point.
+
+    Raises:
+        ModuleNotFoundError: If the runner program is not installed.
+
+    Returns:
+        Callable[[], Any]: The function called by the `runner` command.
+            It reads its arguments from `sys.argv`.
+    """
+    all_entry_points: Any = metadata.entry_points()
+    if hasattr(all_entry_points, "select"):
+        scripts = all_entry_points.select(group="console_scripts")
+    else:  # Python < 3.10
+        scripts = all_entry_points.get("console_scripts", [])
+
+    for entry_point in scripts:
+        if entry_point.name == "runner":
+            return entry_point.load()
+
+    raise ModuleNotFoundError("The runner program is not installed.")
+
+
+def main(arguments: List[str]) -> int:
+    """Waits for instructions and runs them with the runner program.
+
+    Args:
+        arguments (List[str]): The path towards the named pipe to read
+            from and the path towards the file to create once ready.
+
+    Returns:
+        int: The exit code of the runner program.
+    """
+    fifo_path, ready_path = Path(arguments[0]), Path(arguments[1])
+    runner: Callable[[], Any] = load_runner()
+    ready_path.touch()
+
+    with open(fifo_path, "r") as stream:
+        line: str = stream.readline().strip()
+
+    if not line:
+        return 0
+
+    sys.argv = ["runner"] + json.loads(line)
+    try:
+        runner()
+    except SystemExit as exit:
+        return exit.code if isinstance(exit.code, int) else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
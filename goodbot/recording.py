@@ -1,9 +1,16 @@
+from contextlib import ExitStack
+from functools import partial
 from pathlib import Path
-from typing import List, Dict, Union
+from typing import Callable, List, Dict, Union, Optional
+from rich.console import Console
 
 # Each recording module has to be imported here
-from goodbot import editor, shell_commands, audio
-from goodbot.utils import is_scene
+from goodbot import editor, shell_commands, audio, timing
+from goodbot.cache import ArtifactCache
+from goodbot.dedup import DedupStore
+from goodbot.shell_pool import RecordingPool
+from goodbot.tts import TTSBackend
+from goodbot.utils import get_content_file_id, is_scene
 from goodbot.funcmodule import ALLOWED_CONTENT_TYPES
 
 # Each element in a scene has an id. The id is the order
@@ -11,25 +18,6 @@ from goodbot.funcmodule import ALLOWED_CONTENT_TYPES
 # 1.
 
 
-def get_content_file_id(content_file: Union[Path, str]) -> int:
-
-    if isinstance(content_file, str):
-        content_file = Path(content_file)
-
-    file_name: str = content_file.stem
-
-    try:
-        return int(file_name.split("_")[1])
-    except ValueError:
-        raise ValueError(
-            f"{content_file} does not seem to follow Good-Bot's naming scheme."
-        )
-    except IndexError:
-        raise ValueError(
-            f"{content_file} does not seem to follow Good-Bot's naming scheme."
-        )
-
-
 def sort_content_files(content_file_paths: List[Path]) -> List[Path]:
 
     content_map: Dict[int, Path] = {}
@@ -68,20 +56,86 @@ def find_to_record(scene_path: Path) -> List[Path]:
     return sort_content_files(to_record_in_scene)
 
 
-def record_scene(scene_path: Path, docker: bool = False, no_docker: bool = False):
+def record_scene(
+    scene_path: Path,
+    docker: bool = False,
+    no_docker: bool = False,
+    pool: Optional[RecordingPool] = None,
+    store: Optional[DedupStore] = None,
+    selected: Optional[Callable[[Path], bool]] = None,
+):
     # Things in a scene are already numbered starting at 1
     to_record_sorted: List[Path] = find_to_record(scene_path)
+    if selected:
+        to_record_sorted = [path for path in to_record_sorted if selected(path)]
 
     for file_to_record in to_record_sorted:
         if file_to_record.parent.name == "commands":
-            shell_commands.record_command(file_to_record, docker, no_docker)
+            record: Callable[[Path], Path] = partial(
+                shell_commands.record_command, docker=docker, no_docker=no_docker
+            )
+            if pool:
+                record = pool.record
+            if store:
+                store.record(
+                    file_to_record, record, {"docker": docker, "no_docker": no_docker}
+                )
+            else:
+                record(file_to_record)
         elif file_to_record.parent.name == "edit":
             editor.record_editor(file_to_record)
         # Each type of content to record goes here.
 
 
-def record_project(project_path: Path, docker: bool = False, no_docker: bool = False):
-    for potential_scene in project_path.iterdir():
-        if is_scene(potential_scene):
-            record_scene(potential_scene, docker, no_docker)
-    audio.record_audio(project_path)
+def record_project(
+    project_path: Path,
+    docker: bool = False,
+    no_docker: bool = False,
+    warm_sessions: int = 0,
+    cache: Optional[ArtifactCache] = None,
+    lang: str = "en-US",
+    lang_name: str = "en-US-Standard-C",
+    pause: float = audio.DEFAULT_PAUSE,
+    tts_backend: Optional[TTSBackend] = None,
+    fit: bool = False,
+    selected: Optional[Callable[[Path], bool]] = None,
+):
+    console: Console = Console()
+    pool: Optional[RecordingPool] = None
+    store: Optional[DedupStore] = DedupStore(cache) if cache else None
+
+    with ExitStack() as stack:
+        if warm_sessions:
+            pool = stack.enter_context(
+                RecordingPool(warm_sessions, docker, no_docker)
+            )
+        for potential_scene in project_path.iterdir():
+            if is_scene(potential_scene):
+                record_scene(potential_scene, docker, no_docker, pool, store, selected)
+
+    if pool:
+        for item in pool.stats:
+            console.log(
+                f"{item['element']}: session ready in {item['startup']:.2f}s, "
+                f"waited {item['waited']:.2f}s, saved {item['saved']:.2f}s."
+            )
+        summary: Dict[str, float] = pool.summary()
+        console.log(
+            f"Saved {summary['saved']:.2f}s of startup time over "
+            f"{summary['elements']:.0f} recordings "
+            f"({summary['saved_per_element']:.2f}s per recording)."
+        )
+    if store:
+        console.log(store.report())
+
+    audio.record_audio(
+        project_path, lang, lang_name, cache, pause, tts_backend, selected
+    )
+
+    if fit:
+        for cast_path, result in timing.fit_project(project_path, selected).items():
+            console.log(
+                f"{cast_path.parent.parent.name}/{cast_path.name}: "
+                f"{result['original']:.2f}s fitted to {result['fitted']:.2f}s "
+                f"(narration: {result['target']:.2f}s)."
+            )
@@ -10,20 +10,72 @@ rendering.
 The conversion asciicast -> gif is done using the asciicast2gif
 docker image.
 
-This module requires ffmpeg.
+This module requires ffmpeg, unless clips are encoded with PyAV (see
+`ENCODER_BACKENDS`).
 """
 import os
 import sys
+import math
+import time
+import resource
 import pathlib
 import json
-import tempfile
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from rich.console import Console
 from shutil import which
-from typing import List, Tuple, Union, Dict
+from typing import Any, Callable, List, Tuple, Union, Dict, Optional
+
+from goodbot import audio_index, av_encoder, journal, mp4, workdir
+from goodbot.cache import ArtifactCache, cache_key, tool_version
 
 Path = pathlib.Path
 
+# The first frame of each gif is not part of its clip. This filter drops
+# it while encoding and makes the clip start at the second frame, instead
+# of writing a copy of the gif without its first frame.
+SKIP_FIRST_FRAME: str = "select='gte(n,1)',setpts=PTS-STARTPTS"
+
+# Draft clips (see `render()`) trade quality for encoding speed. They
+# are saved apart from the other clips, and joined in their own final
+# video.
+DRAFT_SCALE: float = 0.5
+DRAFT_FRAME_RATE: int = 10
+DRAFT_PRESET: str = "ultrafast"
+DRAFT_AUDIO_BITRATE: int = 32000
+
+# The clips of a scene are rendered by as few `ffmpeg` processes as
+# possible (see `render_scene()`). Each process decodes all of its
+# inputs at the same time, so the amount of clips per process is capped.
+MAX_CLIPS_PER_PROCESS: int = 32
+
+# How clips are encoded: by `ffmpeg` processes, or in-process with PyAV
+# (see the `av_encoder` module).
+ENCODER_BACKENDS: Tuple[str, ...] = ("ffmpeg", "pyav")
+
+# `render_all()` shares a CPU budget between encoder processes (see
+# `plan_render()`). A batch of clips is given one thread for every
+# `PIXELS_PER_THREAD` pixels it encodes: about 10 seconds of a terminal
+# recording at 25 frames per second, or 2 seconds of 1080p. Smaller
+# batches barely benefit from more threads, and are better rendered
+# side by side.
+PIXELS_PER_THREAD: int = 50_000_000
+
+# Encoding a clip takes as much memory whatever its length: the decoder,
+# the filters and the encoder only keep a few frames at a time. The
+# encoder's lookahead (`DEFAULT_LOOKAHEAD` frames, or none for drafts)
+# and each of its threads keep more. `clip_memory()` estimates the
+# memory used by a clip from the size of its frames, and `fit_memory()`
+# keeps the encoders under a ceiling by shortening the lookahead and by
+# rendering fewer clips at the same time.
+PROCESS_MEMORY: int = 32 * 1024**2
+DECODED_FRAMES: int = 16
+ENCODER_FRAMES: int = 20
+FRAMES_PER_THREAD: int = 4
+DEFAULT_LOOKAHEAD: int = 40
+LOOKAHEADS: Tuple[int, ...] = (40, 20, 10, 0)
+
+
 # Checking ffmpeg installation
 def check_dependencies() -> None:
     """Checks if every dependency is installed.
@@ -128,6 +180,38 @@ def fetch_project_asciicasts(project_path: Path) -> List[Path]:
     return all_paths
 
 
+def render_gif(asciicast_path: Path, debug: bool = False) -> Path:
+    """Converts an asciicast recording to a gif using `asciicast2gif`.
+
+    The gif is saved in the `gifs` directory of the scene that contains
+    the recording, under the same name as the asciicast.
+
+    Args:
+        asciicast_path (Path): The path towards the asciicast to convert.
+        debug (bool): Whether or not to print the output of
+            `asciicast2gif`. Defaults to False.
+
+    Returns:
+        Path: The path towards the new gif. Follows this scheme:
+            [project-path]/[scene-name]/gifs/[asciicast-name].gif
+    """
+    gifs_path: Path = asciicast_path.parent.parent / Path("gifs")
+    output_path: Path = gifs_path / Path(f"{asciicast_path.stem}.gif")
+
+    # `asciicast2gif` renders every frame in a temporary directory.
+    with workdir.scratch("goodbot-gif-") as scratch_path:
+        rendered_path: Path = scratch_path / output_path.name
+        subprocess.run(
+            ["asciicast2gif", f"{asciicast_path}", f"{rendered_path}"],
+            capture_output=not debug,
+            check=True,
+            env=workdir.environment(),
+        )
+        workdir.move_into(rendered_path, output_path)
+
+    return output_path
+
+
 def fetch_scene_gifs(scene_path: Path) -> List[Path]:
     """Fetches each gif that has been rendered for a scene.
 
@@ -221,6 +305,9 @@ def link_audio(scene_path: Path) -> List[Tuple[Path, Union[Path, None]]]:
 def remove_first_frame(gif_path: Path) -> Path:
     """Removes the first frame from a gif file.
 
+    `render()` does not use this function anymore: it drops the first
+    frame while encoding, without writing a new gif.
+
     Args:
         gif_path (Path): The path towards the gif from which the
             first frame will be removed. This is also where the
@@ -298,108 +385,871 @@ def add_video_padding(video_path: Path) -> Path:
     return output_path
 
 
-def render(gif_and_audio: Tuple[Path, Union[Path, None]], debug: bool = False) -> Path:
+def gif_size(gif_path: Path) -> Tuple[int, int]:
+    """Reads the size of a gif from its header.
+
+    Args:
+        gif_path (Path): The path towards the gif.
+
+    Raises:
+        ValueError: If the file is not a gif.
+
+    Returns:
+        Tuple[int, int]: The width and height of the gif, in pixels.
+    """
+    with open(gif_path, "rb") as stream:
+        header: bytes = stream.read(10)
+    if header[:6] not in (b"GIF87a", b"GIF89a"):
+        raise ValueError(f"{gif_path} is not a gif.")
+    return (
+        int.from_bytes(header[6:8], "little"),
+        int.from_bytes(header[8:10], "little"),
+    )
+
+
+def gif_duration(gif_path: Path, skip_frames: int = 0) -> float:
+    """Computes the duration of a gif from its frame delays.
+
+    Like `ffmpeg`, delays shorter than 2 hundredths of a second are
+    replaced by a tenth of a second.
+
+    The gif is read block by block and its image data is skipped, so
+    gifs of long recordings are never loaded in memory.
+
+    Args:
+        gif_path (Path): The path towards the gif.
+        skip_frames (int): How many frames, from the start of the gif,
+            are left out of the duration.
+
+    Raises:
+        ValueError: If the file is not a gif.
+
+    Returns:
+        float: The duration of the gif, in seconds.
+    """
+    with open(gif_path, "rb") as stream:
+        header: bytes = stream.read(13)
+        if header[:6] not in (b"GIF87a", b"GIF89a"):
+            raise ValueError(f"{gif_path} is not a gif.")
+
+        def skip_color_table(flags: int) -> None:
+            if flags & 0x80:
+                stream.seek(3 * 2 ** ((flags & 0x07) + 1), os.SEEK_CUR)
+
+        def skip_sub_blocks() -> None:
+            size: bytes = stream.read(1)
+            while size and size[0]:
+                stream.seek(size[0], os.SEEK_CUR)
+                size = stream.read(1)
+
+        skip_color_table(header[10])
+        delay: int = 10
+        total: int = 0
+        frames: int = 0
+
+        while True:
+            block: bytes = stream.read(1)
+            if block == b"\x21":  # Extension.
+                label: bytes = stream.read(1)
+                if label == b"\xf9":  # Graphic control extension.
+                    control: bytes = stream.read(5)
+                    delay = int.from_bytes(control[2:4], "little")
+                    if delay < 2:
+                        delay = 10
+                skip_sub_blocks()
+            elif block == b"\x2c":  # Image.
+                if frames >= skip_frames:
+                    total += delay
+                frames += 1
+                descriptor: bytes = stream.read(9)
+                if len(descriptor) < 9:
+                    break
+                skip_color_table(descriptor[8])
+                # Skipping the LZW minimum code size and the image data.
+                stream.seek(1, os.SEEK_CUR)
+                skip_sub_blocks()
+            else:  # Trailer.
+                break
+
+    return total / 100
+
+
+def clip_timing(gif_path: Path, audio_path: Path) -> Dict[str, float]:
+    """Computes how a clip should be padded.
+
+    The duration of the audio is read from the project's audio index
+    (see the `audio_index` module), so no file is probed. The first
+    frame of the gif is not part of the clip (see `render()`).
+
+    Args:
+        gif_path (Path): The gif of the clip.
+        audio_path (Path): The narration of the clip.
+
+    Returns:
+        Dict[str, float]: The `video` and `audio` durations, the
+            `duration` of the clip and how long the video and the audio
+            must be extended (`video_padding`, `audio_padding`). Every
+            value is in seconds.
+    """
+    video: float = gif_duration(gif_path, skip_frames=1)
+    audio: float = audio_index.lookup(audio_path)["duration"]
+    duration: float = max(video, audio)
+    return {
+        "video": video,
+        "audio": audio,
+        "duration": duration,
+        "video_padding": duration - video,
+        "audio_padding": duration - audio,
+    }
+
+
+def clip_duration(gif_and_audio: Tuple[Path, Union[Path, None]]) -> float:
+    """Computes the duration of a clip, with or without audio.
+
+    Args:
+        gif_and_audio (Tuple[Path, Union[Path, None]]): The inputs of
+            the clip, as returned by `corresponding_audio()`.
+
+    Returns:
+        float: The duration of the clip, in seconds. See `clip_timing()`.
+    """
+    gif_path, audio_path = gif_and_audio
+    if audio_path:
+        return clip_timing(gif_path, audio_path)["duration"]
+    return gif_duration(gif_path, skip_frames=1)
+
+
+def clip_pixels(
+    gif_and_audio: Tuple[Path, Union[Path, None]], draft: bool = False
+) -> int:
+    """Estimates how much work encoding a clip is.
+
+    The size of the gif is read from its header, so nothing is decoded.
+
+    Args:
+        gif_and_audio (Tuple[Path, Union[Path, None]]): The inputs of
+            the clip, as returned by `corresponding_audio()`.
+        draft (bool): Whether or not the clip is a draft clip.
+
+    Returns:
+        int: How many pixels are encoded: the size of the clip's frames
+            times its frame count.
+    """
+    width, height = gif_size(gif_and_audio[0])
+    frame_rate: int = av_encoder.FRAME_RATE
+    if draft:
+        width, height = int(width * DRAFT_SCALE), int(height * DRAFT_SCALE)
+        frame_rate = DRAFT_FRAME_RATE
+    return round(width * height * frame_rate * clip_duration(gif_and_audio))
+
+
+def clip_memory(
+    gif_and_audio: Tuple[Path, Union[Path, None]],
+    draft: bool = False,
+    threads: int = 1,
+    lookahead: Optional[int] = None,
+) -> int:
+    """Estimates how much memory encoding a clip takes.
+
+    The estimate does not depend on the length of the clip. See
+    `PROCESS_MEMORY` for the memory of the process itself.
+
+    Args:
+        gif_and_audio (Tuple[Path, Union[Path, None]]): The inputs of
+            the clip, as returned by `corresponding_audio()`.
+        draft (bool): Whether or not the clip is a draft clip.
+        threads (int): How many threads encode the clip.
+        lookahead (Optional[int]): How many frames the encoder looks
+            ahead. `DEFAULT_LOOKAHEAD`, or none for drafts, if `None`.
+
+    Returns:
+        int: The memory, in bytes.
+    """
+    width, height = gif_size(gif_and_audio[0])
+    decoded: int = 3 * width * height
+    encoded: int = decoded
+    if draft:
+        encoded = 3 * int(width * DRAFT_SCALE) * int(height * DRAFT_SCALE)
+    if lookahead is None:
+        lookahead = 0 if draft else DEFAULT_LOOKAHEAD
+    return decoded * DECODED_FRAMES + encoded * (
+        ENCODER_FRAMES + lookahead + FRAMES_PER_THREAD * threads
+    )
+
+
+def clip_key(
+    gif_and_audio: Tuple[Path, Union[Path, None]],
+    draft: bool = False,
+    encoder: str = "ffmpeg",
+) -> str:
+    """Computes the cache key of a clip.
+
+    The key depends on the contents of the gif and audio file, and on
+    the versions of the programs used by `render()`.
+
+    Args:
+        gif_and_audio (Tuple[Path, Union[Path, None]]): The inputs of
+            the clip, as returned by `corresponding_audio()`.
+        draft (bool): Whether or not the clip is a draft.
+        encoder (str): The backend that encodes the clip. See
+            `ENCODER_BACKENDS`.
+
+    Returns:
+        str: The key used by `cache.ArtifactCache`.
+    """
+    options: Dict[str, Any] = {
+        "ffmpeg": tool_version("ffmpeg"),
+        "pix_fmt": "yuv420p",
+        "first_frame": "select",
+        "audio_codec": "aac",
+        "padding": "tpad+apad",
+    }
+    if draft:
+        options["draft"] = {
+            "scale": DRAFT_SCALE,
+            "frame_rate": DRAFT_FRAME_RATE,
+            "preset": DRAFT_PRESET,
+            "audio_bitrate": DRAFT_AUDIO_BITRATE,
+        }
+    if encoder == "pyav":
+        options["pyav"] = av_encoder.load_av().__version__
+    return cache_key("clip", list(gif_and_audio), options)
+
+
+def clips_directory(draft: bool = False) -> str:
+    """Finds the name of the directory where a scene's clips are saved."""
+    return "drafts" if draft else "videos"
+
+
+def clip_path(gif_path: Path, draft: bool = False) -> Path:
+    """Finds where the clip rendered from a gif is saved.
+
+    Returns:
+        Path: Follows this scheme:
+            [project-path]/[scene-name]/videos/[gif-name].mp4
+            Draft clips are saved in the `drafts` directory instead.
+    """
+    return (
+        gif_path.parent.parent
+        / Path(clips_directory(draft))
+        / Path(f"{gif_path.stem}.mp4")
+    )
+
+
+def clip_arguments(
+    gif_and_audio: Tuple[Path, Union[Path, None]],
+    label: int,
+    first_input: int = 0,
+    draft: bool = False,
+) -> Tuple[List[str], List[str], List[str]]:
+    """Builds the `ffmpeg` arguments used to render a clip.
+
+    The clip's filters are part of a filter graph shared with the other
+    clips rendered by the same `ffmpeg` process.
+
+    Args:
+        gif_and_audio (Tuple[Path, Union[Path, None]]): The inputs of
+            the clip, as returned by `corresponding_audio()`.
+        label (int): Identifies the clip's outputs in the filter graph.
+        first_input (int): The index of the clip's gif among the inputs
+            of the `ffmpeg` process. The audio file follows it.
+        draft (bool): Whether or not to render a draft clip.
+
+    Returns:
+        Tuple[List[str], List[str], List[str]]: The inputs of the clip,
+            its filter chains and the options of its output.
+    """
+    gif_path: Path = gif_and_audio[0]
+
+    video_filters: str = f"{SKIP_FIRST_FRAME},scale=trunc(iw/2)*2:trunc(ih/2)*2"
+    encoding_options: List[str] = []
+    if draft:
+        video_filters = (
+            f"{SKIP_FIRST_FRAME},fps={DRAFT_FRAME_RATE},"
+            f"scale=trunc(iw*{DRAFT_SCALE}/2)*2:trunc(ih*{DRAFT_SCALE}/2)*2"
+        )
+        encoding_options = ["-preset", DRAFT_PRESET]
+    inputs: List[str] = ["-i", f"{gif_path}"]
+    chains: List[str] = []
+    maps: List[str] = ["-map", f"[v{label}]"]
+    audio_options: List[str] = []
+
+    if gif_and_audio[1]:  # If there is an audio file.
+        timing: Dict[str, float] = clip_timing(gif_path, gif_and_audio[1])
+        if timing["video_padding"]:
+            # Holding the last frame until the narration is over.
+            video_filters += (
+                f",tpad=stop_mode=clone:stop_duration={timing['video_padding']:.3f}"
+            )
+        # Rendering and merging the audio in a single pass. The audio
+        # is padded with silence to last as long as the video, so that
+        # the next clips stay in sync.
+        inputs += ["-i", f"{gif_and_audio[1]}"]
+        chains.append(
+            f"[{first_input + 1}:a]apad=whole_dur={timing['duration']:.3f}[a{label}]"
+        )
+        maps += ["-map", f"[a{label}]"]
+        audio_options = ["-c:a", "aac", "-t", f"{timing['duration']:.3f}"]
+        if draft:
+            audio_options += ["-b:a", f"{DRAFT_AUDIO_BITRATE}", "-ac", "1"]
+
+    chains.insert(0, f"[{first_input}:v]{video_filters}[v{label}]")
+    output_options: List[str] = (
+        maps
+        + ["-movflags", "faststart", "-pix_fmt", "yuv420p"]
+        + encoding_options
+        + audio_options
+    )
+    return inputs, chains, output_options
+
+
+def pyav_clip(
+    gif_and_audio: Tuple[Path, Union[Path, None]],
+    output_path: Path,
+    draft: bool = False,
+    threads: Optional[int] = None,
+    lookahead: Optional[int] = None,
+) -> Path:
+    """Renders a clip in-process with PyAV, like `clip_arguments()` does
+    with `ffmpeg`.
+
+    Args:
+        gif_and_audio (Tuple[Path, Union[Path, None]]): The inputs of
+            the clip, as returned by `corresponding_audio()`.
+        output_path (Path): Where to save the clip.
+        draft (bool): Whether or not to render a draft clip.
+        threads (Optional[int]): How many threads the video encoder
+            uses. The encoder's default (every core) if `None`.
+        lookahead (Optional[int]): How many frames the video encoder
+            looks ahead. The preset's default if `None`.
+
+    Returns:
+        Path: The path towards the clip.
+    """
+    gif_path, audio_path = gif_and_audio
+    duration: float = clip_duration(gif_and_audio)
+    options: Dict[str, Any] = {"threads": threads, "lookahead": lookahead}
+    if draft:
+        options.update(
+            {
+                "frame_rate": DRAFT_FRAME_RATE,
+                "scale": DRAFT_SCALE,
+                "preset": DRAFT_PRESET,
+                "audio_bitrate": DRAFT_AUDIO_BITRATE,
+                "audio_layout": "mono",
+            }
+        )
+    return av_encoder.write_clip(
+        av_encoder.gif_frames(gif_path, skip_frames=1),
+        output_path,
+        duration,
+        audio_path,
+        **options,
+    )
+
+
+def ffmpeg_command(
+    clips: List[Tuple[Tuple[Path, Union[Path, None]], Path]],
+    draft: bool = False,
+    threads: Optional[int] = None,
+    lookahead: Optional[int] = None,
+) -> List[str]:
+    """Builds a single `ffmpeg` command that renders many clips.
+
+    Every gif and audio file is an input of the same process, and each
+    clip is one of its outputs. Starting `ffmpeg` and its codecs only
+    once is faster than rendering each clip with its own process.
+
+    Args:
+        clips (List[Tuple[Tuple[Path, Union[Path, None]], Path]]): The
+            inputs of each clip and where to save it.
+        draft (bool): Whether or not to render draft clips.
+        threads (Optional[int]): How many threads the filter graph and
+            the encoder of each clip use. `ffmpeg` uses every core if
+            `None`.
+        lookahead (Optional[int]): How many frames the encoder of each
+            clip looks ahead. The preset's default if `None`.
+
+    Returns:
+        List[str]: The command.
+    """
+    inputs: List[str] = []
+    chains: List[str] = []
+    outputs: List[str] = []
+    thread_options: List[str] = ["-threads", f"{threads}"] if threads else []
+    if lookahead is not None:
+        thread_options += ["-rc-lookahead", f"{lookahead}"]
+    for label, (gif_and_audio, output_path) in enumerate(clips):
+        clip_inputs, clip_chains, output_options = clip_arguments(
+            gif_and_audio, label, len(inputs) // 2, draft
+        )
+        inputs += clip_inputs
+        chains += clip_chains
+        outputs += output_options + thread_options + [f"{output_path}"]
+
+    graph_options: List[str] = (
+        ["-filter_complex_threads", f"{threads}"] if threads else []
+    )
+    return (
+        ["ffmpeg"]
+        + inputs
+        + graph_options
+        + ["-filter_complex", ";".join(chains)]
+        + outputs
+    )
+
+
+def encode_clips(
+    clips: List[Tuple[Tuple[Path, Union[Path, None]], Path]],
+    debug: bool = False,
+    draft: bool = False,
+    encoder: str = "ffmpeg",
+    threads: Optional[int] = None,
+    lookahead: Optional[int] = None,
+) -> List[Path]:
+    """Renders clips with a single `ffmpeg` process, or with PyAV.
+
+    Args:
+        clips (List[Tuple[Tuple[Path, Union[Path, None]], Path]]): The
+            inputs of each clip and where to save it. Clips must be
+            saved under different names.
+        debug (bool): Whether or not to print the output of `ffmpeg`.
+        draft (bool): Whether or not to render draft clips.
+        encoder (str): The backend that encodes the clips. See
+            `ENCODER_BACKENDS`.
+        threads (Optional[int]): How many threads are used to encode
+            the clips. Every core if `None`.
+        lookahead (Optional[int]): How many frames the encoder looks
+            ahead. The preset's default if `None`.
+
+    Returns:
+        List[Path]: The path towards each clip.
+    """
+    for _, output_path in clips:
+        if output_path.exists():
+            os.remove(output_path)
+        output_path.parent.mkdir(exist_ok=True)
+
+    # `faststart` rewrites the whole clip once it is encoded, so clips
+    # are encoded in the work directory and only moved to the project
+    # once they are complete.
+    required: int = 2 * sum(
+        os.path.getsize(path)
+        for gif_and_audio, _ in clips
+        for path in gif_and_audio
+        if path
+    )
+    with workdir.scratch("goodbot-clip-", required) as scratch_path:
+        encoded: List[Tuple[Tuple[Path, Union[Path, None]], Path]] = [
+            (gif_and_audio, scratch_path / output_path.name)
+            for gif_and_audio, output_path in clips
+        ]
+        if encoder == "pyav":
+            for gif_and_audio, encoded_path in encoded:
+                pyav_clip(gif_and_audio, encoded_path, draft, threads, lookahead)
+        else:
+            subprocess.run(
+                ffmpeg_command(encoded, draft, threads, lookahead),
+                capture_output=not debug,
+                check=True,
+            )
+        for (_, encoded_path), (_, output_path) in zip(encoded, clips):
+            workdir.move_into(encoded_path, output_path)
+
+    return [output_path for _, output_path in clips]
+
+
+def render(
+    gif_and_audio: Tuple[Path, Union[Path, None]],
+    debug: bool = False,
+    cache: Optional[ArtifactCache] = None,
+    resume: bool = False,
+    draft: bool = False,
+    encoder: str = "ffmpeg",
+    threads: Optional[int] = None,
+) -> Path:
     """Renders and mp4 file using `ffmpeg`.
 
     An mp4 file is created at the same location and under the same
     name wheter there is a corresponding audio file or not.
 
-    This function also calls `remove_first_frame()` before doing
-    any conversion.
+    The first frame of the gif is dropped by `ffmpeg` while encoding
+    (see `SKIP_FIRST_FRAME`). The gif itself is left untouched.
+
+    When there is an audio file, the clip lasts as long as the longest
+    of the gif and the audio: the last frame is held until the
+    narration is over, or the audio is padded with silence. This keeps
+    the next clips in sync when rendering the final video. Durations
+    come from `clip_timing()`.
 
-    The older gifs are also removed from the project.
+    If a cache is provided and a clip with the same inputs was already
+    rendered, the cached clip is used and nothing is rendered.
 
-    Finally, audio padding is added to the video to help with
-    synchronization later on when rendering the final video.
+    The clip is only moved to the project once it is complete, then it
+    is added to the project's journal (see the `journal` module).
+
+    Draft clips are scaled down by `DRAFT_SCALE`, have `DRAFT_FRAME_RATE`
+    frames per second, are encoded with the `DRAFT_PRESET` preset and
+    have mono audio at `DRAFT_AUDIO_BITRATE`. They are saved in their
+    own directory (see `clip_path()`) and are not added to the journal.
 
     Args:
         gif_and_audio (Tuple[Path, Union[Path, None]]): A typle
             that contains the gif path at index `0` and the audio
             path at index `0`. The audio path can be `None`.
+        debug (bool): Whether or not to print the output of `ffmpeg`.
+        cache (Optional[ArtifactCache]): Where clips are looked up
+            and saved. See `clip_key()`.
+        resume (bool): Whether or not to skip the clip if the journal
+            shows that it was already rendered from the same files.
+            Draft clips are always rendered, unless they are cached.
+        draft (bool): Whether or not to render a draft clip.
+        encoder (str): The backend that encodes the clip. See
+            `ENCODER_BACKENDS`.
+        threads (Optional[int]): How many threads encode the clip.
+            Every core if `None`.
 
     Returns:
         Path: The path towards the rendered video (with the padding).
             Follows this scheme:
                 [project-path]/[scene-name]/video/[video_name].mp4
     """
-    gif_path: Path = remove_first_frame(gif_and_audio[0])
-    videos_path: Path = gif_path.parent.parent / Path("videos")
-    # Changing extension from `.gif` to `.mp4`
-    video_name: Path = Path(f"{gif_and_audio[0].stem}.mp4")
-    output_path: Path = videos_path / video_name
-
-    if gif_and_audio[1]:  # If there is an audio file.
-        with tempfile.TemporaryDirectory() as tempdir:
-            # Create a temporaty video
-            temp_video_path: Path = Path(tempdir) / video_name
-            subprocess.run(
-                [
-                    "ffmpeg",
-                    "-i",
-                    f"{gif_path}",
-                    "-movflags",
-                    "faststart",
-                    "-pix_fmt",
-                    "yuv420p",
-                    "-vf",
-                    "scale=trunc(iw/2)*2:trunc(ih/2)*2",
-                    f"{temp_video_path}",
-                ],
-                capture_output=not debug,
-                check=True,
-            )
-            # Merge the audio too
-            subprocess.run(
-                [
-                    "ffmpeg",
-                    "-i",
-                    f"{temp_video_path}",
-                    "-i",
-                    f"{gif_and_audio[1]}",
-                    "-c:v",
-                    "copy",
-                    "-c:a",
-                    "aac",
-                    f"{output_path}",
-                ],
-                capture_output=not debug,
-                check=True,
-            )
-    else:
-        # There is no audio to merge.
-        # No need to make a temp dir.
-        subprocess.run(
-            [
-                "ffmpeg",
-                "-i",
-                f"{gif_path}",
-                "-movflags",
-                "faststart",
-                "-pix_fmt",
-                "yuv420p",
-                "-vf",
-                "scale=trunc(iw/2)*2:trunc(ih/2)*2",
-                f"{output_path}",
-            ],
-            capture_output=not debug,
-            check=True,
+    output_path: Path = clip_path(gif_and_audio[0], draft)
+
+    if resume and not draft and journal.is_complete(gif_and_audio, output_path):
+        return output_path
+
+    if cache:
+        output_path.parent.mkdir(exist_ok=True)
+        cache.cached(
+            clip_key(gif_and_audio, draft, encoder),
+            output_path,
+            lambda: render(
+                gif_and_audio, debug, draft=draft, encoder=encoder, threads=threads
+            ),
         )
+        if not draft:
+            journal.record(gif_and_audio, output_path)
+        return output_path
+
+    encode_clips([(gif_and_audio, output_path)], debug, draft, encoder, threads)
 
-    # Removing older gif (the one with too many frames.)
-    os.remove(gif_and_audio[0])
+    if not draft:
+        journal.record(gif_and_audio, output_path)
     # Adding padding
     # padded_path: Path = add_video_padding(output_path)
 
     return output_path
 
 
-def render_all(project_path: Path) -> List[Path]:
-    """Uses the `render()` function on each combination of a project.
+def pending_clips(
+    scene_matches: List[Tuple[Path, Union[Path, None]]],
+    cache: Optional[ArtifactCache] = None,
+    resume: bool = False,
+    draft: bool = False,
+    encoder: str = "ffmpeg",
+) -> Tuple[List[Tuple[Tuple[Path, Union[Path, None]], Path]], int]:
+    """Finds the clips of a scene that must be encoded.
 
-    Combinations a found using the `scene_matches()` function.
+    Clips that are complete (see `resume`) are left out. So are cached
+    clips, which are copied to the project.
+
+    Args:
+        scene_matches (List[Tuple[Path, Union[Path, None]]]): The inputs
+            of each clip, as returned by `link_audio()`.
+        cache (Optional[ArtifactCache]): See `render()`.
+        resume (bool): See `render()`.
+        draft (bool): See `render()`.
+        encoder (str): See `render()`.
+
+    Returns:
+        Tuple[List[Tuple[Tuple[Path, Union[Path, None]], Path]], int]: The
+            inputs of each clip to encode and where to save it, and how
+            many clips a previous run completed.
+    """
+    to_encode: List[Tuple[Tuple[Path, Union[Path, None]], Path]] = []
+    kept: int = 0
+
+    for gif_and_audio in scene_matches:
+        output_path: Path = clip_path(gif_and_audio[0], draft)
+        if resume and not draft and journal.is_complete(gif_and_audio, output_path):
+            kept += 1
+            continue
+        output_path.parent.mkdir(exist_ok=True)
+        if cache and cache.fetch(clip_key(gif_and_audio, draft, encoder), output_path):
+            if not draft:
+                journal.record(gif_and_audio, output_path)
+            continue
+        to_encode.append((gif_and_audio, output_path))
+
+    return to_encode, kept
+
+
+def batches(
+    clips: List[Tuple[Tuple[Path, Union[Path, None]], Path]]
+) -> List[List[Tuple[Tuple[Path, Union[Path, None]], Path]]]:
+    """Splits clips in batches of up to `MAX_CLIPS_PER_PROCESS` clips."""
+    return [
+        clips[start : start + MAX_CLIPS_PER_PROCESS]
+        for start in range(0, len(clips), MAX_CLIPS_PER_PROCESS)
+    ]
+
+
+def encode_batch(
+    batch: List[Tuple[Tuple[Path, Union[Path, None]], Path]],
+    debug: bool = False,
+    cache: Optional[ArtifactCache] = None,
+    draft: bool = False,
+    encoder: str = "ffmpeg",
+    threads: Optional[int] = None,
+    lookahead: Optional[int] = None,
+) -> List[Path]:
+    """Renders a batch of clips with `encode_clips()`.
+
+    If the process fails, the clips are rendered again one at a time.
+    Rendered clips are saved in the cache and added to the journal.
+
+    Args:
+        batch (List[Tuple[Tuple[Path, Union[Path, None]], Path]]): The
+            inputs of each clip and where to save it.
+        debug (bool): See `render()`.
+        cache (Optional[ArtifactCache]): See `render()`.
+        draft (bool): See `render()`.
+        encoder (str): See `render()`.
+        threads (Optional[int]): See `encode_clips()`.
+        lookahead (Optional[int]): See `encode_clips()`.
+
+    Returns:
+        List[Path]: The path towards each clip.
+    """
+    console: Console = Console()
+    try:
+        encode_clips(batch, debug, draft, encoder, threads, lookahead)
+    except subprocess.CalledProcessError:
+        if len(batch) == 1:
+            raise
+        console.log("Could not render the clips together, rendering them apart.")
+        for clip in batch:
+            encode_clips([clip], debug, draft, encoder, threads, lookahead)
+    for gif_and_audio, output_path in batch:
+        if cache:
+            cache.store(clip_key(gif_and_audio, draft, encoder), output_path)
+        if not draft:
+            journal.record(gif_and_audio, output_path)
+
+    return [output_path for _, output_path in batch]
+
+
+def render_scene(
+    scene_matches: List[Tuple[Path, Union[Path, None]]],
+    debug: bool = False,
+    cache: Optional[ArtifactCache] = None,
+    resume: bool = False,
+    draft: bool = False,
+    encoder: str = "ffmpeg",
+    threads: Optional[int] = None,
+) -> List[Path]:
+    """Renders the clips of a scene, like `render()`, sharing `ffmpeg`
+    processes.
+
+    Clips that are complete (see `resume`) or cached are left out (see
+    `pending_clips()`). The others are rendered by `encode_batch()`, up
+    to `MAX_CLIPS_PER_PROCESS` at a time. Each clip is still saved in
+    its own file, so it can be reused on its own.
+
+    Args:
+        scene_matches (List[Tuple[Path, Union[Path, None]]]): The inputs
+            of each clip, as returned by `link_audio()`.
+        debug (bool): See `render()`.
+        cache (Optional[ArtifactCache]): See `render()`.
+        resume (bool): See `render()`.
+        draft (bool): See `render()`.
+        encoder (str): See `render()`.
+        threads (Optional[int]): See `render()`.
+
+    Returns:
+        List[Path]: The path towards each clip.
+    """
+    to_encode, _ = pending_clips(scene_matches, cache, resume, draft, encoder)
+    for batch in batches(to_encode):
+        encode_batch(batch, debug, cache, draft, encoder, threads)
+
+    return [clip_path(match[0], draft) for match in scene_matches]
+
+
+def plan_render(batch_pixels: List[int], cpu_budget: int) -> Dict[str, int]:
+    """Shares a CPU budget between encoder processes.
+
+    Each batch of clips (see `batches()`) wants one thread for every
+    `PIXELS_PER_THREAD` pixels it encodes. Many small batches are
+    rendered side by side with few threads each, while a few large
+    batches are rendered one after the other with many threads. The
+    amount of processes times their threads never exceeds the budget,
+    so that processes do not compete for cores.
+
+    Args:
+        batch_pixels (List[int]): How many pixels each batch encodes.
+            See `clip_pixels()`.
+        cpu_budget (int): How many cores can be used.
+
+    Returns:
+        Dict[str, int]: How many `processes` run at the same time and
+            how many `threads` each of them uses.
+    """
+    cpu_budget = max(1, cpu_budget)
+    if not batch_pixels:
+        return {"processes": 1, "threads": cpu_budget}
+
+    wanted: List[int] = sorted(
+        min(cpu_budget, max(1, math.ceil(pixels / PIXELS_PER_THREAD)))
+        for pixels in batch_pixels
+    )
+    # The median batch decides, so that a single long clip does not
+    # keep the others from running side by side.
+    threads: int = wanted[len(wanted) // 2]
+    processes: int = min(len(batch_pixels), cpu_budget // threads)
+    # Cores left over when there are few batches go to each process.
+    threads = cpu_budget // processes
+    return {"processes": processes, "threads": threads}
+
+
+def fit_memory(
+    to_encode: List[List[Tuple[Tuple[Path, Union[Path, None]], Path]]],
+    plan: Dict[str, int],
+    memory_limit: int,
+    draft: bool = False,
+) -> Tuple[List[List[Tuple[Tuple[Path, Union[Path, None]], Path]]], Dict[str, int]]:
+    """Keeps the encoders of a plan under a memory ceiling.
+
+    The longest lookahead of `LOOKAHEADS` that lets the largest clip
+    fit under the ceiling is used, with the plan's threads or, if it is
+    not enough, with a single thread. If a process needs more than its
+    share of the ceiling, fewer processes run at the same time. Batches
+    are then split in windows of clips that fit in a share, so that the
+    memory of a process does not grow with its amount of clips.
+
+    Args:
+        to_encode (List[List[Tuple[Tuple[Path, Union[Path, None]], Path]]]):
+            The batches of clips to encode. See `batches()`.
+        plan (Dict[str, int]): The plan made by `plan_render()`.
+        memory_limit (int): How much memory the encoders can use, in
+            bytes. See `clip_memory()`.
+        draft (bool): Whether or not the clips are draft clips.
+
+    Returns:
+        Tuple[List[List[Tuple[Tuple[Path, Union[Path, None]], Path]]], Dict[str, int]]:
+            The batches to encode and the plan, with the `lookahead` of
+            the encoders.
+    """
+    clips: List[Tuple[Tuple[Path, Union[Path, None]], Path]] = [
+        clip for batch in to_encode for clip in batch
+    ]
+    if not clips:
+        return to_encode, dict(plan)
+
+    lookaheads: Tuple[int, ...] = (0,) if draft else LOOKAHEADS
+    candidates: List[Tuple[int, int]] = [
+        (threads, lookahead)
+        for threads in (plan["threads"], 1)
+        for lookahead in lookaheads
+    ]
+    # If nothing fits, a single thread without lookahead uses the least.
+    for threads, lookahead in candidates:
+        largest: int = PROCESS_MEMORY + max(
+            clip_memory(gif_and_audio, draft, threads, lookahead)
+            for gif_and_audio, _ in clips
+        )
+        if largest <= memory_limit:
+            break
+
+    processes: int = max(1, min(plan["processes"], memory_limit // largest))
+    share: int = memory_limit // processes
+    windows: List[List[Tuple[Tuple[Path, Union[Path, None]], Path]]] = []
+    for batch in to_encode:
+        window: List[Tuple[Tuple[Path, Union[Path, None]], Path]] = []
+        used: int = PROCESS_MEMORY
+        for clip in batch:
+            memory: int = clip_memory(clip[0], draft, threads, lookahead)
+            if window and used + memory > share:
+                windows.append(window)
+                window, used = [], PROCESS_MEMORY
+            window.append(clip)
+            used += memory
+        windows.append(window)
+
+    return windows, {
+        "processes": min(processes, len(windows)),
+        "threads": threads,
+        "lookahead": lookahead,
+    }
+
+
+def peak_memory() -> Dict[str, int]:
+    """Reads the most memory (resident set size) used so far.
+
+    On Linux, the peak of a process started by a larger one is at least
+    the memory of its parent (`ru_maxrss` is kept by `exec`). The peak of
+    good-bot is read from `/proc` instead, where it only counts good-bot
+    itself.
+
+    Returns:
+        Dict[str, int]: The peak memory of good-bot (`self`) and of the
+            largest process it ran, like `ffmpeg` (`children`), in bytes.
+    """
+    # Linux counts kilobytes, macOS counts bytes.
+    unit: int = 1 if sys.platform == "darwin" else 1024
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+    try:
+        with open("/proc/self/status", "r") as stream:
+            for line in stream:
+                if line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return {
+        "self": peak,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit,
+    }
+
+
+def render_all(
+    project_path: Path,
+    cache: Optional[ArtifactCache] = None,
+    resume: bool = False,
+    selected: Optional[Callable[[Path], bool]] = None,
+    draft: bool = False,
+    encoder: str = "ffmpeg",
+    cpu_budget: Optional[int] = None,
+    memory_limit: Optional[int] = None,
+) -> List[Path]:
+    """Renders the clips of each scene of a project.
+
+    Combinations a found using the `scene_matches()` function. The
+    clips to encode (see `pending_clips()`) are grouped by scene in
+    batches, and `plan_render()` decides how many batches are encoded
+    at the same time and how many threads each one uses. With a memory
+    limit, `fit_memory()` then bounds the memory of the encoders. The
+    decision, the achieved throughput and the peak memory are logged
+    once every clip is rendered.
 
     Args:
         project_path (Path): The path towards the project to render.
+        cache (Optional[ArtifactCache]): If provided, clips whose inputs
+            were already rendered are reused from this cache instead
+            of being rendered again.
+        resume (bool): Whether or not to skip the clips that a previous
+            run already rendered. See `render()`.
+        selected (Optional[Callable[[Path], bool]]): If provided, only
+            the clips whose gif or audio it returns `True` for are
+            rendered. See `utils.selector()`.
+        draft (bool): Whether or not to render draft clips. See
+            `render()`.
+        encoder (str): The backend that encodes the clips. See
+            `ENCODER_BACKENDS`.
+        cpu_budget (Optional[int]): How many cores the encoders can
+            use. Every core if `None`.
+        memory_limit (Optional[int]): How much memory the encoders can
+            use, in bytes. Unbounded if `None`.
 
     Returns:
         List[Path]: A list of paths towards the location of each
@@ -407,6 +1257,7 @@ def render_all(project_path: Path) -> List[Path]:
     """
     scenes: List[Path] = []
     all_renders: List[Path] = []
+    to_encode: List[List[Tuple[Tuple[Path, Union[Path, None]], Path]]] = []
     console: Console = Console()
     # Making sure that we are only adding scenes. Other
     # files could have been added by the user.
@@ -414,18 +1265,83 @@ def render_all(project_path: Path) -> List[Path]:
         if "scene_" in directory.name:
             scenes.append(directory)
 
-    with console.status("[bold green]Merging audio...") as status:
-        while scenes:
-            scene = scenes.pop(0)
-            scene_matches: List[Tuple[Path, Union[Path, None]]] = link_audio(scene)
-            for match in scene_matches:
-                all_renders.append(render(match))
-            console.log(f"Merged audio for scene {scene}")
+    for scene in scenes:
+        scene_matches: List[Tuple[Path, Union[Path, None]]] = link_audio(scene)
+        if selected:
+            scene_matches = [
+                match
+                for match in scene_matches
+                if any(path and selected(path) for path in match)
+            ]
+            if not scene_matches:
+                continue
+        scene_clips, kept = pending_clips(scene_matches, cache, resume, draft, encoder)
+        to_encode += batches(scene_clips)
+        all_renders += [clip_path(match[0], draft) for match in scene_matches]
+        if kept:
+            console.log(f"Kept {kept} clips rendered by a previous run in {scene}.")
+
+    clips: int = sum(len(batch) for batch in to_encode)
+    if not clips:
+        return all_renders
+    batch_pixels: List[int] = [
+        sum(clip_pixels(gif_and_audio, draft) for gif_and_audio, _ in batch)
+        for batch in to_encode
+    ]
+    budget: int = cpu_budget or os.cpu_count() or 1
+    plan: Dict[str, int] = plan_render(batch_pixels, budget)
+    if memory_limit:
+        to_encode, plan = fit_memory(to_encode, plan, memory_limit, draft)
+
+    console.log(
+        f"Rendering {clips} clips in {len(to_encode)} batches: "
+        f"{plan['processes']} at a time with {plan['threads']} threads each "
+        f"(CPU budget of {budget})."
+    )
+    if memory_limit:
+        console.log(
+            f"Encoders look {plan['lookahead']} frames ahead to stay under "
+            f"{memory_limit / 1024**2:.0f} MB."
+        )
+    start: float = time.perf_counter()
+    with console.status("[bold green]Merging audio..."):
+        with ThreadPoolExecutor(max_workers=plan["processes"]) as executor:
+            # Waiting for every batch, so that errors are raised.
+            list(
+                executor.map(
+                    lambda batch: encode_batch(
+                        batch,
+                        cache=cache,
+                        draft=draft,
+                        encoder=encoder,
+                        threads=plan["threads"],
+                        lookahead=plan.get("lookahead"),
+                    ),
+                    to_encode,
+                )
+            )
+    elapsed: float = max(time.perf_counter() - start, 1e-9)
+
+    seconds: float = sum(
+        clip_duration(gif_and_audio)
+        for batch in to_encode
+        for gif_and_audio, _ in batch
+    )
+    console.log(
+        f"Rendered {clips} clips ({seconds:.1f}s of video) in {elapsed:.2f}s: "
+        f"{clips / elapsed:.2f} clips/s, {seconds / elapsed:.2f}s of video per "
+        f"second, {sum(batch_pixels) / elapsed / 1e6:.1f} Mpixels/s."
+    )
+    peak: Dict[str, int] = peak_memory()
+    console.log(
+        f"Peak memory: {peak['self'] / 1024**2:.0f} MB for good-bot, "
+        f"{peak['children'] / 1024**2:.0f} MB for the largest child process."
+    )
 
     return all_renders
 
 
-def sort_videos(project_path: Path) -> List[Path]:
+def sort_videos(project_path: Path, draft: bool = False) -> List[Path]:
     """Sorts each videos in a project.
 
     Videos are sorted by scene and then by videos.
@@ -440,6 +1356,7 @@ def sort_videos(project_path: Path) -> List[Path]:
     Args:
         project_path (Path): The path towards the project
             from which the videos will be found and sorted.
+        draft (bool): Whether or not to sort the draft clips instead.
 
     Returns:
         List[Path]: A sorted list of paths towards the video recordings.
@@ -462,7 +1379,10 @@ def sort_videos(project_path: Path) -> List[Path]:
 
     for scene in all_scenes:
 
-        videos_path: Path = scene / Path("videos")
+        videos_path: Path = scene / Path(clips_directory(draft))
+
+        if not videos_path.is_dir():
+            continue
 
         videos_dict: Dict[int, Path] = {}
 
@@ -476,59 +1396,85 @@ def sort_videos(project_path: Path) -> List[Path]:
     return all_videos
 
 
-def write_ffmpeg_instructions(project_path: Path) -> Path:
+def write_ffmpeg_instructions(
+    project_path: Path, directory: Optional[Path] = None, draft: bool = False
+) -> Path:
     """Writes paths to files to merge in a `.txt` file.
 
     Each path is on its own line. The paths are provided
-    by the `sort_videos()` function.
+    by the `sort_videos()` function. They are absolute, so
+    the file can be saved outside of the project.
 
     Args:
         project_path (Path): The path towards the project
             to write the instructions to. This is also
             where the `sort_videos()` function will look
             for videos.
+        directory (Optional[Path]): Where to write the file
+            instead of the project.
+        draft (bool): Whether or not to join the draft clips.
 
 
         Path: The path towards the newly created `.txt` file.
     """
-    file_path: Path = project_path / Path("instructions.txt")
-    video_paths: List[Path] = sort_videos(project_path)
+    file_path: Path = (directory or project_path) / Path("instructions.txt")
+    video_paths: List[Path] = sort_videos(project_path, draft)
 
     with open(file_path, "w") as stream:
         for video_path in video_paths:
-            stream.write(f"file '{video_path}'\n")
+            stream.write(f"file '{video_path.absolute()}'\n")
 
     return file_path
 
 
-def render_final(project_path: Path, debug: bool = False) -> Path:
-    """Renders the final video using `ffmpeg`.
+def render_final(project_path: Path, debug: bool = False, draft: bool = False) -> Path:
+    """Renders the final video.
 
-    This function uses the `write_ffmpeg_instructions()` function,
-    which in turn uses `sort_videos()` to get a list of rendered
-    videos in order.
+    The videos returned by `sort_videos()` are first joined in-process
+    using `mp4.concatenate()`, which copies the encoded samples without
+    decoding them. If the videos can't be joined that way, the final
+    video is rendered by `ffmpeg` using the `write_ffmpeg_instructions()`
+    function.
 
     Args:
         project_path (Path): The path to the project to merge
             videos from. `mp4` files must be created beforehand
             using the `render_all()` function.
+        draft (bool): Whether or not to join the draft clips. The video
+            is then saved as `final/draft.mp4`.
 
     Returns:
         Path: The path towards the final video.
     """
     final_path: Path = project_path / Path("final/")
+    output_path: Path = final_path / Path("draft.mp4" if draft else "final.mp4")
     console: Console = Console()
-    completed: bool = False
 
     if not final_path.exists():
         os.mkdir(final_path)
 
     with console.status("[bold green]Rendering the final video...") as status:
 
-        while not completed:
-
-            instructions_file: Path = write_ffmpeg_instructions(project_path)
-            output_path: Path = final_path / Path("final.mp4")
+        # The final video replaces the previous one only once complete.
+        partial_path: Path = final_path / Path(f".{output_path.name}.part")
+        try:
+            mp4.concatenate(sort_videos(project_path, draft), partial_path)
+            os.replace(partial_path, output_path)
+            console.log("Render complete!")
+            return output_path
+        except ValueError as err:
+            console.log(f"Could not join the videos directly ({err}), using ffmpeg.")
+        finally:
+            if partial_path.exists():
+                os.remove(partial_path)
+
+        # The instructions and the video being encoded are kept in the
+        # work directory until the video is complete.
+        with workdir.scratch("goodbot-final-") as scratch_path:
+            instructions_file: Path = write_ffmpeg_instructions(
+                project_path, scratch_path, draft
+            )
+            encoded_path: Path = scratch_path / output_path.name
             subprocess.run(
                 [
                     "ffmpeg",
@@ -544,13 +1490,13 @@ def render_final(project_path: Path, debug: bool = False) -> Path:
                     "select=concatdec_select",
                     "-af",
                     "aselect=concatdec_select,aresample=async=1",
-                    f"{output_path}",
+                    f"{encoded_path}",
                 ],
                 capture_output=not debug,
                 check=True,
             )
+            workdir.move_into(encoded_path, output_path)
 
-            console.log(f"Render complete!")
-            completed = True
+        console.log(f"Render complete!")
 
     return output_path
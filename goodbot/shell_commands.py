@@ -11,7 +11,7 @@ import yaml
 from rich.console import Console
 from typing import List, Dict, Union, Any
 
-from goodbot import utils
+from goodbot import cast_index, utils, workdir
 
 
 def is_runner_instructions(instructions_path: Path) -> bool:
@@ -166,18 +166,27 @@ def record_command(
     else:
         docker_flag = ""
 
-    subprocess.run(
-        [
-            "asciinema",
-            "rec",
-            "-c",
-            "runner",
-            docker_flag,
-            instructions_file,
-            str(save_path),
-        ],
-        capture_output=not debug,
-    )
+    # Asciinema writes the recording as it goes. It is moved to the
+    # project once complete. The recorded session keeps the user's
+    # environment, `TMPDIR` included: only the recording is written to
+    # the work directory.
+    with workdir.scratch("goodbot-rec-") as scratch_path:
+        recording_path: Path = scratch_path / save_path.name
+        subprocess.run(
+            [
+                "asciinema",
+                "rec",
+                "-c",
+                "runner",
+                docker_flag,
+                instructions_file,
+                str(recording_path),
+            ],
+            capture_output=not debug,
+        )
+        if recording_path.exists():
+            workdir.move_into(recording_path, save_path)
+    cast_index.index_recording(save_path)
 
     return save_path
 
@@ -208,10 +217,21 @@ def record_commands(project: Path, debug: bool = False) -> List[Path]:
             if save_path.exists():
                 os.remove(save_path)
 
-            subprocess.run(
-                ["asciinema", "rec", "-c", f"runner {command}", str(save_path)],
-                capture_output=not debug,
-            )
+            with workdir.scratch("goodbot-rec-") as scratch_path:
+                recording_path: Path = scratch_path / save_path.name
+                subprocess.run(
+                    [
+                        "asciinema",
+                        "rec",
+                        "-c",
+                        f"runner {command}",
+                        str(recording_path),
+                    ],
+                    capture_output=not debug,
+                )
+                if recording_path.exists():
+                    workdir.move_into(recording_path, save_path)
+            cast_index.index_recording(save_path)
 
             console.log(f"Video contents in file {command} have been recorded.")
             all_recordings.append(save_path)
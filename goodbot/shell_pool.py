@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+shell_pool.py contains a pool of pre-warmed Asciinema sessions used to
+record runner instructions.
+
+`shell_commands.record_command()` starts `asciinema rec -c runner ...`
+for every commands file, so each element pays for the startup of
+Asciinema, of the Python interpreter and the import of the runner
+program. A `RecordingPool` starts those sessions ahead of time. Each
+session runs `goodbot.pool_worker`, which imports the runner program and
+waits for instructions. When a commands file is recorded, it is handed
+to the next idle session and a new session starts warming up in the
+background for the next element.
+
+Sessions record from the moment they start, so the idle time spent
+waiting for instructions is trimmed from the asciicast once the
+recording is complete.
+"""
+import os
+import sys
+import json
+import time
+import shlex
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from goodbot import cast_index, workdir
+
+# How long to wait for a session to be ready, in seconds.
+STARTUP_TIMEOUT: float = 30.0
+POLL_INTERVAL: float = 0.01
+
+
+class Session:
+    """A pre-warmed Asciinema session waiting for instructions.
+
+    Attributes:
+        process (subprocess.Popen): The `asciinema rec` process.
+        directory (Path): Where the session keeps its files.
+        fifo_path (Path): The named pipe used to send instructions.
+        ready_path (Path): The file created by the worker once ready.
+        asciicast_path (Path): Where Asciinema saves the recording.
+        started (float): When the session was started (`time.time()`).
+    """
+
+    def __init__(self, directory: Path, debug: bool = False) -> None:
+        self.directory = directory
+        self.fifo_path = directory / "instructions"
+        self.ready_path = directory / "ready"
+        self.asciicast_path = directory / "recording.cast"
+        os.mkfifo(self.fifo_path)
+
+        worker: str = " ".join(
+            shlex.quote(part)
+            for part in (
+                sys.executable,
+                "-m",
+                "goodbot.pool_worker",
+                str(self.fifo_path),
+                str(self.ready_path),
+            )
+        )
+        self.started: float = time.time()
+        self.process = subprocess.Popen(
+            ["asciinema", "rec", "-q", "-c", worker, str(self.asciicast_path)],
+            stdin=subprocess.DEVNULL,
+            stdout=None if debug else subprocess.DEVNULL,
+            stderr=None if debug else subprocess.DEVNULL,
+        )
+
+    def wait_ready(self, timeout: float = STARTUP_TIMEOUT) -> float:
+        """Waits until the worker is ready to receive instructions.
+
+        Args:
+            timeout (float): How long to wait, in seconds.
+
+        Raises:
+            RuntimeError: If the session exits or is not ready in time.
+
+        Returns:
+            float: How long this call waited, in seconds.
+        """
+        start: float = time.perf_counter()
+        while not self.ready_path.exists():
+            if self.process.poll() is not None:
+                raise RuntimeError(
+                    "A recording session exited before being ready. "
+                    "Is the runner program installed?"
+                )
+            if time.perf_counter() - start > timeout:
+                self.process.kill()
+                raise RuntimeError("A recording session took too long to start.")
+            time.sleep(POLL_INTERVAL)
+        return time.perf_counter() - start
+
+    @property
+    def startup(self) -> float:
+        """How long the session took to be ready, in seconds."""
+        return self.ready_path.stat().st_mtime - self.started
+
+    def send(self, arguments: List[str]) -> None:
+        """Sends arguments for the runner program to the worker."""
+        with open(self.fifo_path, "w") as stream:
+            stream.write(json.dumps(arguments) + "\n")
+
+    def stop(self) -> None:
+        """Tells the worker to exit without running the runner program."""
+        with open(self.fifo_path, "w") as stream:
+            stream.write("\n")
+
+    def close(self) -> None:
+        """Stops the session without recording anything."""
+        try:
+            self.wait_ready()
+            self.stop()
+            self.process.wait(timeout=STARTUP_TIMEOUT)
+        except (RuntimeError, subprocess.TimeoutExpired):
+            self.process.kill()
+            self.process.wait()
+
+
+def trim_asciicast(source: Path, destination: Path, idle_time: float) -> Path:
+    """Copies an asciicast without the idle time at its beginning.
+
+    Every event is moved `idle_time` seconds earlier. The shift is never
+    larger than the time of the first event.
+
+    Args:
+        source (Path): The asciicast recorded by a session.
+        destination (Path): Where to save the trimmed asciicast.
+        idle_time (float): How long the session waited for instructions.
+
+    Returns:
+        Path: The path towards the trimmed asciicast. This is the same
+            value as the `destination` argument.
+    """
+    with open(source, "r") as stream, open(destination, "w") as out:
+        header: Dict[str, Any] = json.loads(stream.readline())
+        shift: Optional[float] = None
+
+        for line in stream:
+            if not line.strip():
+                continue
+            event: List[Any] = json.loads(line)
+            if shift is None:
+                shift = max(0.0, min(idle_time, event[0]))
+                header["timestamp"] = header.get("timestamp", 0) + int(shift)
+                out.write(json.dumps(header) + "\n")
+            event[0] = round(event[0] - shift, 6)
+            out.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+        if shift is None:
+            out.write(json.dumps(header) + "\n")
+
+    return destination
+
+
+class RecordingPool:
+    """A pool of pre-warmed recording sessions.
+
+    Should be used as a context manager so that idle sessions are
+    stopped once the recordings are done.
+
+    Attributes:
+        size (int): How many sessions are kept warm.
+        stats (List[Dict[str, Any]]): Timing information for each
+            recorded element. See `record()`.
+    """
+
+    def __init__(
+        self,
+        size: int = 1,
+        docker: bool = False,
+        no_docker: bool = False,
+        debug: bool = False,
+    ) -> None:
+        if size < 1:
+            raise ValueError("A recording pool needs at least one session.")
+        self.size = size
+        self.docker = docker
+        self.no_docker = no_docker
+        self.debug = debug
+        self.stats: List[Dict[str, Any]] = []
+        self._sessions: List[Session] = []
+        self._directory: Optional[Path] = None
+        self._counter: int = 0
+
+    def __enter__(self) -> "RecordingPool":
+        self._directory = workdir.make_scratch("goodbot-pool-")
+        for _ in range(self.size):
+            self._sessions.append(self._spawn())
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _spawn(self) -> Session:
+        if self._directory is None:
+            raise RuntimeError("The recording pool has not been started.")
+        self._counter += 1
+        directory: Path = self._directory / f"session_{self._counter}"
+        directory.mkdir()
+        return Session(directory, self.debug)
+
+    def record(self, instructions_file: Path) -> Path:
+        """Records a runner instructions file using an idle session.
+
+        The asciicast is saved where `shell_commands.record_command()`
+        would save it. A new session is started to replace the one that
+        is used.
+
+        Each recording adds an item to `stats` with the following keys:
+
+        * `element`: The path towards the instructions file.
+        * `startup`: How long the session took to be ready.
+        * `waited`: How long the recording had to wait for the session.
+        * `saved`: The startup time that was hidden from the recording
+          (`startup - waited`).
+
+        Args:
+            instructions_file (Path): The instructions file to record.
+
+        Returns:
+            Path: The path towards the new asciicast.
+        """
+        session: Session = self._sessions.pop(0)
+        waited: float = session.wait_ready()
+        self._sessions.append(self._spawn())
+
+        arguments: List[str] = []
+        if self.docker:
+            arguments.append("--docker")
+        elif self.no_docker:
+            arguments.append("--no-docker")
+        arguments.append(str(instructions_file))
+
+        handoff: float = time.time()
+        session.send(arguments)
+        session.process.wait()
+        # The ready file is removed with the session's directory.
+        startup: float = session.startup
+
+        save_path: Path = (
+            instructions_file.parent.parent
+            / Path("asciicasts")
+            / instructions_file.name
+        ).with_suffix(".cast")
+        if save_path.exists():
+            os.remove(save_path)
+        trim_asciicast(session.asciicast_path, save_path, handoff - session.started)
+        cast_index.index_recording(save_path)
+        shutil.rmtree(session.directory, ignore_errors=True)
+
+        self.stats.append(
+            {
+                "element": instructions_file,
+                "startup": startup,
+                "waited": waited,
+                "saved": max(0.0, startup - waited),
+            }
+        )
+
+        return save_path
+
+    def close(self) -> None:
+        """Stops every idle session and removes their files."""
+        while self._sessions:
+            self._sessions.pop().close()
+        if self._directory is not None:
+            shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+
+    def summary(self) -> Dict[str, float]:
+        """Sums up the timing information of every recording.
+
+        Returns:
+            Dict[str, float]: The amount of `elements` recorded, the
+                total `startup` time of their sessions, the total time
+                `saved` and the `saved_per_element` on average.
+        """
+        elements: int = len(self.stats)
+        saved: float = sum(item["saved"] for item in self.stats)
+        return {
+            "elements": elements,
+            "startup": sum(item["startup"] for item in self.stats),
+            "saved": saved,
+            "saved_per_element": saved / elements if elements else 0.0,
+        }
@@ -0,0 +1,623 @@
+# -*- coding: utf-8 -*-
+"""
+terminal.py contains a small terminal emulator used to replay asciicast
+recordings.
+
+`Screen` interprets the output of a recording (printable characters,
+control characters and the escape sequences that shells and common
+programs use) and keeps the state of every cell of the screen: its
+character, its colors and its attributes. It covers what recordings
+made by the runner program contain: cursor movements, erasing,
+scrolling regions, the alternate screen and colors. Other sequences are
+parsed and ignored.
+
+Cells are stored in a NumPy array (see `CELL`). A screen takes less
+than half the memory of lists of cells, and the compositor compares
+whole rows at once. Replaying a recording is not faster: small updates
+cost more as array operations than as list operations, and rendering
+time is spent encoding gifs, not in the screen.
+
+Colors are indices in the 256 colors `xterm` palette (see `PALETTE`).
+24 bits colors are converted to the closest color of the palette.
+
+See: https://invisible-island.net/xterm/ctlseqs/ctlseqs.html
+"""
+
+import re
+import zlib
+import base64
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+# Cell attributes.
+BOLD: int = 1
+UNDERLINE: int = 2
+REVERSE: int = 4
+ITALIC: int = 8
+
+DEFAULT_FG: int = 7
+DEFAULT_BG: int = 0
+TAB_WIDTH: int = 8
+
+# A cell: character, foreground, background and attributes.
+Cell = Tuple[str, int, int, int]
+
+# How cells are stored: the character's code point, the foreground and
+# background palette indices and the attributes, as a bit field. Cells
+# are padded to 64 bits, so that moving, filling and comparing cells is
+# done on a `np.uint64` view instead of field by field.
+CELL = np.dtype(
+    [("char", np.uint32), ("fg", np.uint8), ("bg", np.uint8), ("attributes", np.uint8)],
+    align=True,
+)
+
+# Printable characters, printed in runs.
+_PRINTABLE = re.compile("[^\x00-\x1f\x7f]+")
+
+# The first 16 colors, close to asciinema's default theme.
+BASE_COLORS: List[Tuple[int, int, int]] = [
+    (0x12, 0x13, 0x14),
+    (0xDD, 0x3C, 0x69),
+    (0x4E, 0xBF, 0x22),
+    (0xDD, 0xAF, 0x3C),
+    (0x26, 0xB0, 0xD7),
+    (0xB9, 0x54, 0xE1),
+    (0x54, 0xE1, 0xB9),
+    (0xCC, 0xCC, 0xCC),
+    (0x4D, 0x4D, 0x4D),
+    (0xDD, 0x3C, 0x69),
+    (0x4E, 0xBF, 0x22),
+    (0xDD, 0xAF, 0x3C),
+    (0x26, 0xB0, 0xD7),
+    (0xB9, 0x54, 0xE1),
+    (0x54, 0xE1, 0xB9),
+    (0xFF, 0xFF, 0xFF),
+]
+
+CUBE_LEVELS: Tuple[int, ...] = (0, 95, 135, 175, 215, 255)
+
+
+def _palette() -> List[Tuple[int, int, int]]:
+    colors: List[Tuple[int, int, int]] = list(BASE_COLORS)
+    for red in CUBE_LEVELS:
+        for green in CUBE_LEVELS:
+            for blue in CUBE_LEVELS:
+                colors.append((red, green, blue))
+    for level in range(24):
+        gray: int = 8 + level * 10
+        colors.append((gray, gray, gray))
+    return colors
+
+
+# The 256 colors palette shared by every frame of every gif.
+PALETTE: List[Tuple[int, int, int]] = _palette()
+
+
+def closest_color(red: int, green: int, blue: int) -> int:
+    """Finds the palette color closest to a 24 bits color.
+
+    Only the color cube and the grays are considered, since the first
+    16 colors depend on the theme.
+
+    Returns:
+        int: The index of the color in `PALETTE`.
+    """
+
+    def level(value: int) -> int:
+        return min(range(6), key=lambda i: abs(CUBE_LEVELS[i] - value))
+
+    cube: int = 16 + 36 * level(red) + 6 * level(green) + level(blue)
+    average: int = (red + green + blue) // 3
+    gray: int = 232 + min(23, max(0, (average - 3) // 10))
+
+    def distance(index: int) -> int:
+        r, g, b = PALETTE[index]
+        return (r - red) ** 2 + (g - green) ** 2 + (b - blue) ** 2
+
+    return min((cube, gray), key=distance)
+
+
+@lru_cache(maxsize=None)
+def pack(char: int, fg: int, bg: int, attributes: int) -> int:
+    """Packs a cell in the 64 bits word that stores it.
+
+    Args:
+        char (int): The code point of the character.
+        fg (int): The palette index of the foreground.
+        bg (int): The palette index of the background.
+        attributes (int): The cell's attributes.
+
+    Returns:
+        int: The cell, as an element of `Screen.words`.
+    """
+    cell: np.ndarray = np.zeros(1, dtype=CELL)
+    cell[0] = (char, fg, bg, attributes)
+    return int(cell.view(np.uint64)[0])
+
+
+class Screen:
+    """The state of a terminal's screen.
+
+    Attributes:
+        columns (int): The width of the screen, in cells.
+        rows (int): The height of the screen, in cells.
+        words (np.ndarray): The cells of the screen, `rows` by
+            `columns`, one `np.uint64` per cell. See `cells`.
+        cursor (Tuple[int, int]): The row and column of the cursor.
+        cursor_visible (bool): Whether or not the cursor is shown.
+        dirty (Set[int]): The rows that changed since this set was last
+            cleared. Cursor movements are not tracked.
+    """
+
+    def __init__(self, columns: int = 80, rows: int = 24) -> None:
+        self.columns = columns
+        self.rows = rows
+        self.reset()
+
+    def reset(self) -> None:
+        """Goes back to the initial state: empty screen, default colors."""
+        self.fg: int = DEFAULT_FG
+        self.bg: int = DEFAULT_BG
+        self.attributes: int = 0
+        self.words: np.ndarray = self._blank_rows(self.rows)
+        self.dirty: Set[int] = set(range(self.rows))
+        self.row: int = 0
+        self.column: int = 0
+        self.cursor_visible: bool = True
+        self.top: int = 0
+        self.bottom: int = self.rows - 1
+        self._pending_wrap: bool = False
+        self._saved: Tuple[int, int, int, int, int] = (0, 0, DEFAULT_FG, DEFAULT_BG, 0)
+        self._alternate: Optional[np.ndarray] = None
+        # Parser state.
+        self._state: str = "ground"
+        self._sequence: str = ""
+
+    def state(self) -> Dict[str, Any]:
+        """Saves the state of the screen, to restore it with `from_state()`.
+
+        Returns:
+            Dict[str, Any]: The state, which can be saved as JSON. Cells
+                are compressed.
+        """
+
+        def encode(words: Optional[np.ndarray]) -> Optional[str]:
+            if words is None:
+                return None
+            return base64.b64encode(zlib.compress(words.tobytes())).decode("ascii")
+
+        return {
+            "columns": self.columns,
+            "rows": self.rows,
+            "words": encode(self.words),
+            "alternate": encode(self._alternate),
+            "cursor": [self.row, self.column, self.cursor_visible],
+            "pen": [self.fg, self.bg, self.attributes],
+            "margins": [self.top, self.bottom],
+            "pending_wrap": self._pending_wrap,
+            "saved": list(self._saved),
+            "parser": [self._state, self._sequence],
+        }
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "Screen":
+        """Restores a screen saved with `state()`."""
+        screen: Screen = cls(state["columns"], state["rows"])
+
+        def decode(data: str) -> np.ndarray:
+            words: np.ndarray = np.frombuffer(
+                zlib.decompress(base64.b64decode(data)), dtype=np.uint64
+            )
+            return words.reshape(screen.rows, screen.columns).copy()
+
+        screen.words = decode(state["words"])
+        if state["alternate"] is not None:
+            screen._alternate = decode(state["alternate"])
+        screen.row, screen.column, screen.cursor_visible = state["cursor"]
+        screen.fg, screen.bg, screen.attributes = state["pen"]
+        screen.top, screen.bottom = state["margins"]
+        screen._pending_wrap = state["pending_wrap"]
+        row, column, fg, bg, attributes = state["saved"]
+        screen._saved = (row, column, fg, bg, attributes)
+        screen._state, screen._sequence = state["parser"]
+        return screen
+
+    @property
+    def cells(self) -> np.ndarray:
+        """The cells of the screen, with the `CELL` data type."""
+        return self.words.view(CELL)
+
+    @property
+    def cursor(self) -> Tuple[int, int]:
+        return self.row, self.column
+
+    def _blank(self) -> int:
+        # Erased cells keep the current background, like xterm.
+        return pack(ord(" "), self.fg, self.bg, 0)
+
+    def _blank_rows(self, amount: int) -> np.ndarray:
+        return np.full((amount, self.columns), self._blank(), np.uint64)
+
+    def cell(self, row: int, column: int) -> Cell:
+        """Returns the character, colors and attributes of a cell."""
+        char, fg, bg, attributes = self.cells[row, column].item()
+        return chr(char), fg, bg, attributes
+
+    def text(self) -> List[str]:
+        """Returns the characters of each row, without trailing spaces."""
+        chars: bytes = np.ascontiguousarray(self.cells["char"]).tobytes()
+        width: int = 4 * self.columns
+        return [
+            chars[start : start + width].decode("utf-32-le", "replace").rstrip()
+            for start in range(0, len(chars), width)
+        ]
+
+    # Output.
+
+    def feed(self, data: str) -> None:
+        """Interprets the output of a program.
+
+        Escape sequences can be split between calls.
+        """
+        index: int = 0
+        while index < len(data):
+            char: str = data[index]
+            index += 1
+            if self._state == "ground":
+                match = _PRINTABLE.match(data, index - 1)
+                if match:
+                    self._print(match.group())
+                    index = match.end()
+                else:
+                    self._ground(char)
+            elif self._state == "escape":
+                self._escape(char)
+            elif self._state == "csi":
+                self._sequence += char
+                if "\x40" <= char <= "\x7e":
+                    self._state = "ground"
+                    self._csi(self._sequence)
+            elif self._state == "osc":
+                if char == "\x07" or (char == "\\" and self._sequence.endswith("\x1b")):
+                    self._state = "ground"
+                else:
+                    self._sequence += char
+            elif self._state == "charset":
+                self._state = "ground"
+
+    def _ground(self, char: str) -> None:
+        if char == "\x1b":
+            self._state = "escape"
+        elif char == "\r":
+            self.column = 0
+            self._pending_wrap = False
+        elif char in "\n\x0b\x0c":
+            self._linefeed()
+        elif char == "\b":
+            self.column = max(0, self.column - 1)
+            self._pending_wrap = False
+        elif char == "\t":
+            self.column = min(
+                self.columns - 1, (self.column // TAB_WIDTH + 1) * TAB_WIDTH
+            )
+
+    def _print(self, text: str) -> None:
+        """Prints a run of printable characters, wrapping long lines."""
+        codes: Optional[np.ndarray] = None
+        printed: int = 0
+        while printed < len(text):
+            if self._pending_wrap:
+                self.column = 0
+                self._linefeed()
+            start: int = self.column
+            end: int = min(self.columns, start + len(text) - printed)
+            if end - start == 1:
+                # Most runs are a single character typed at the prompt.
+                self.words[self.row, start] = pack(
+                    ord(text[printed]), self.fg, self.bg, self.attributes
+                )
+            else:
+                if codes is None:
+                    codes = np.frombuffer(
+                        text.encode("utf-32-le", "replace"), dtype=np.uint32
+                    )
+                self.words[self.row, start:end] = pack(
+                    0, self.fg, self.bg, self.attributes
+                )
+                self.cells["char"][self.row, start:end] = codes[
+                    printed : printed + end - start
+                ]
+            self.dirty.add(self.row)
+            printed += end - start
+            if end == self.columns:
+                self.column = self.columns - 1
+                self._pending_wrap = True
+            else:
+                self.column = end
+
+    def _escape(self, char: str) -> None:
+        self._state = "ground"
+        if char == "[":
+            self._state = "csi"
+            self._sequence = ""
+        elif char == "]":
+            self._state = "osc"
+            self._sequence = ""
+        elif char in "()*+-./":
+            self._state = "charset"
+        elif char == "7":
+            self._saved = (self.row, self.column, self.fg, self.bg, self.attributes)
+        elif char == "8":
+            self.row, self.column, self.fg, self.bg, self.attributes = self._saved
+            self._pending_wrap = False
+        elif char == "D":
+            self._linefeed()
+        elif char == "E":
+            self.column = 0
+            self._linefeed()
+        elif char == "M":
+            self._reverse_index()
+        elif char == "c":
+            self.reset()
+
+    def _linefeed(self) -> None:
+        self._pending_wrap = False
+        if self.row == self.bottom:
+            self.scroll_up(1)
+        elif self.row < self.rows - 1:
+            self.row += 1
+
+    def _reverse_index(self) -> None:
+        if self.row == self.top:
+            self.scroll_down(1)
+        elif self.row > 0:
+            self.row -= 1
+
+    # Screen operations.
+
+    def scroll_up(self, amount: int) -> None:
+        """Scrolls the scrolling region up, adding blank rows at its bottom."""
+        region: np.ndarray = self.words[self.top : self.bottom + 1]
+        amount = min(amount, len(region))
+        region[: len(region) - amount] = region[amount:].copy()
+        region[len(region) - amount :] = self._blank()
+        self.dirty.update(range(self.top, self.bottom + 1))
+
+    def scroll_down(self, amount: int) -> None:
+        """Scrolls the scrolling region down, adding blank rows at its top."""
+        region: np.ndarray = self.words[self.top : self.bottom + 1]
+        amount = min(amount, len(region))
+        region[amount:] = region[: len(region) - amount].copy()
+        region[:amount] = self._blank()
+        self.dirty.update(range(self.top, self.bottom + 1))
+
+    def erase_display(self, mode: int) -> None:
+        """Erases the screen: after the cursor (0), before it (1) or all (2, 3)."""
+        if mode == 0:
+            self.erase_line(0)
+            rows = range(self.row + 1, self.rows)
+        elif mode == 1:
+            self.erase_line(1)
+            rows = range(0, self.row)
+        else:
+            rows = range(0, self.rows)
+        self.words[rows.start : rows.stop] = self._blank()
+        self.dirty.update(rows)
+
+    def erase_line(self, mode: int) -> None:
+        """Erases the cursor's row: after the cursor (0), before it (1) or all (2)."""
+        start, end = {0: (self.column, self.columns), 1: (0, self.column + 1)}.get(
+            mode, (0, self.columns)
+        )
+        self.words[self.row, start:end] = self._blank()
+        self.dirty.add(self.row)
+
+    def _move(self, row: int, column: int) -> None:
+        self.row = min(max(row, 0), self.rows - 1)
+        self.column = min(max(column, 0), self.columns - 1)
+        self._pending_wrap = False
+
+    def _csi(self, sequence: str) -> None:
+        final: str = sequence[-1]
+        body: str = sequence[:-1]
+        private: bool = body.startswith("?")
+        body = body.lstrip("?<=>").rstrip(" !\"#$%&'()*+,-./")
+        params: List[int] = [
+            int(part) if part.isdigit() else 0 for part in body.split(";")
+        ] or [0]
+
+        def param(index: int = 0, default: int = 1) -> int:
+            value: int = params[index] if index < len(params) else 0
+            return value or default
+
+        if final == "m":
+            self._sgr(params)
+        elif final == "A":
+            # The cursor stops at the scrolling region's margins.
+            upper: int = self.top if self.row >= self.top else 0
+            self._move(max(self.row - param(), upper), self.column)
+        elif final in "Be":
+            lower: int = self.bottom if self.row <= self.bottom else self.rows - 1
+            self._move(min(self.row + param(), lower), self.column)
+        elif final in "Ca":
+            self._move(self.row, self.column + param())
+        elif final == "D":
+            self._move(self.row, self.column - param())
+        elif final == "E":
+            self._move(self.row + param(), 0)
+        elif final == "F":
+            self._move(self.row - param(), 0)
+        elif final in "G`":
+            self._move(self.row, param() - 1)
+        elif final in "Hf":
+            self._move(param(0) - 1, param(1) - 1)
+        elif final == "d":
+            self._move(param() - 1, self.column)
+        elif final == "J":
+            self.erase_display(param(0, 0))
+        elif final == "K":
+            self.erase_line(param(0, 0))
+        elif final in "LM" and self.top <= self.row <= self.bottom:
+            top: int = self.top
+            self.top = self.row
+            if final == "L":
+                self.scroll_down(param())
+            else:
+                self.scroll_up(param())
+            self.top = top
+            self.column = 0
+        elif final == "@":
+            line: np.ndarray = self.words[self.row, self.column :]
+            amount: int = min(param(), len(line))
+            line[amount:] = line[: len(line) - amount].copy()
+            line[:amount] = self._blank()
+            self.dirty.add(self.row)
+        elif final == "P":
+            line = self.words[self.row, self.column :]
+            amount = min(param(), len(line))
+            line[: len(line) - amount] = line[amount:].copy()
+            line[len(line) - amount :] = self._blank()
+            self.dirty.add(self.row)
+        elif final == "X":
+            self.words[self.row, self.column : self.column + param()] = self._blank()
+            self.dirty.add(self.row)
+        elif final == "S":
+            self.scroll_up(param())
+        elif final == "T" and not private:
+            self.scroll_down(param())
+        elif final == "r" and not private:
+            top, bottom = param(0) - 1, param(1, self.rows) - 1
+            if 0 <= top < bottom < self.rows:
+                self.top, self.bottom = top, bottom
+                self._move(0, 0)
+        elif final == "s" and not private:
+            self._saved = (self.row, self.column, self.fg, self.bg, self.attributes)
+        elif final == "u" and not private:
+            self.row, self.column, self.fg, self.bg, self.attributes = self._saved
+        elif final in "hl" and private:
+            self._mode(params, final == "h")
+
+    def _mode(self, params: List[int], enabled: bool) -> None:
+        for mode in params:
+            if mode == 25:
+                self.cursor_visible = enabled
+            elif mode in (47, 1047, 1049):
+                if enabled and self._alternate is None:
+                    if mode == 1049:
+                        self._saved = (
+                            self.row,
+                            self.column,
+                            self.fg,
+                            self.bg,
+                            self.attributes,
+                        )
+                    self._alternate = self.words
+                    self.words = self._blank_rows(self.rows)
+                    self.dirty.update(range(self.rows))
+                elif not enabled and self._alternate is not None:
+                    self.words = self._alternate
+                    self._alternate = None
+                    self.dirty.update(range(self.rows))
+                    if mode == 1049:
+                        self.row, self.column, self.fg, self.bg, self.attributes = (
+                            self._saved
+                        )
+
+    def _sgr(self, params: List[int]) -> None:
+        index: int = 0
+        while index < len(params):
+            code: int = params[index]
+            if code == 0:
+                self.fg, self.bg, self.attributes = DEFAULT_FG, DEFAULT_BG, 0
+            elif code == 1:
+                self.attributes |= BOLD
+            elif code == 3:
+                self.attributes |= ITALIC
+            elif code == 4:
+                self.attributes |= UNDERLINE
+            elif code == 7:
+                self.attributes |= REVERSE
+            elif code == 22:
+                self.attributes &= ~BOLD
+            elif code == 23:
+                self.attributes &= ~ITALIC
+            elif code == 24:
+                self.attributes &= ~UNDERLINE
+            elif code == 27:
+                self.attributes &= ~REVERSE
+            elif 30 <= code <= 37:
+                self.fg = code - 30
+            elif code == 39:
+                self.fg = DEFAULT_FG
+            elif 40 <= code <= 47:
+                self.bg = code - 40
+            elif code == 49:
+                self.bg = DEFAULT_BG
+            elif 90 <= code <= 97:
+                self.fg = code - 90 + 8
+            elif 100 <= code <= 107:
+                self.bg = code - 100 + 8
+            elif code in (38, 48):
+                color: Optional[int] = None
+                if params[index + 1 : index + 2] == [5] and index + 2 < len(params):
+                    color = params[index + 2] % 256
+                    index += 2
+                elif params[index + 1 : index + 2] == [2] and index + 4 < len(params):
+                    red, green, blue = params[index + 2 : index + 5]
+                    color = closest_color(red, green, blue)
+                    index += 4
+                if color is not None:
+                    if code == 38:
+                        self.fg = color
+                    else:
+                        self.bg = color
+            index += 1
+
+    # Rendering helpers.
+
+    def display_cell(self, row: int, column: int) -> Cell:
+        """Resolves how a cell is drawn.
+
+        Reverse video swaps the colors, bold text uses the bright
+        version of the first 8 colors and the cursor is drawn in
+        reverse video.
+
+        Returns:
+            Cell: The character, the foreground and background colors
+                to draw, and the attributes that change the glyph
+                (`BOLD` and `UNDERLINE`).
+        """
+        char, fg, bg, attributes = self.cell(row, column)
+        if attributes & BOLD and fg < 8:
+            fg += 8
+        reverse: bool = bool(attributes & REVERSE)
+        if self.cursor_visible and (row, column) == (self.row, self.column):
+            reverse = not reverse
+        if reverse:
+            fg, bg = bg, fg
+        return char, fg, bg, attributes & (BOLD | UNDERLINE)
+
+    def display_rows(self, rows: Sequence[int]) -> np.ndarray:
+        """Resolves how rows are drawn, like `display_cell()`.
+
+        Args:
+            rows (Sequence[int]): The rows to resolve.
+
+        Returns:
+            np.ndarray: One `CELL` per cell of the rows, with the colors
+                to draw and the attributes that change the glyph.
+        """
+        cells: np.ndarray = self.cells[list(rows)]
+        fg: np.ndarray = cells["fg"]
+        bg: np.ndarray = cells["bg"].copy()
+        attributes: np.ndarray = cells["attributes"]
+        fg[((attributes & BOLD) != 0) & (fg < 8)] += 8
+        reverse: np.ndarray = (attributes & REVERSE) != 0
+        if self.cursor_visible and self.row in rows:
+            reverse[list(rows).index(self.row), self.column] ^= True
+        cells["bg"] = np.where(reverse, fg, bg)
+        cells["fg"] = np.where(reverse, bg, fg)
+        cells["attributes"] = attributes & (BOLD | UNDERLINE)
+        return cells
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+"""
+thumbnails.py contains functions used to make a still image of an
+asciicast without rendering it.
+
+The screen at the chosen time is found with `cast_index.seek()`, which
+only reads and replays the events before it, starting from the closest
+keyframe of the recording's sidecar index when there is one. The screen
+is drawn once by a `compositor.Compositor`. By default, the screen at
+the end of the recording is used.
+
+Images are saved with Pillow, which is only required by the
+`thumbnails` command.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+
+from goodbot import cast_index, cast_render, compositor, glyphs, render, workdir
+from goodbot.terminal import PALETTE, Screen
+
+
+def thumbnail_path_for(cast_path: Path) -> Path:
+    """Finds where the thumbnail of an asciicast is saved.
+
+    Returns:
+        Path: Follows this scheme:
+            [project-path]/[scene-name]/thumbnails/[asciicast-name].png
+    """
+    return cast_path.parent.parent / "thumbnails" / f"{cast_path.stem}.png"
+
+
+def screen_at(
+    cast_path: Path,
+    time: Optional[float] = None,
+    index: Optional[cast_index.CastIndex] = None,
+) -> Screen:
+    """Replays an asciicast up to a given time.
+
+    Args:
+        cast_path (Path): The asciicast.
+        time (Optional[float]): The time, in seconds since the start
+            of the recording. Negative times are counted from the end.
+            Defaults to the end of the recording.
+        index (Optional[cast_index.CastIndex]): The asciicast's index.
+            Defaults to `cast_index.load_index()`.
+
+    Returns:
+        Screen: The screen at that time.
+    """
+    index = index or cast_index.load_index(cast_path)
+    if time is None:
+        time = index.duration
+    elif time < 0:
+        time += index.duration
+
+    return cast_index.seek(cast_path, time, index)
+
+
+def thumbnail(
+    cast_path: Path,
+    time: Optional[float] = None,
+    output_path: Optional[Path] = None,
+    font_path: Optional[str] = None,
+    font_size: int = glyphs.DEFAULT_SIZE,
+) -> Path:
+    """Saves the screen of an asciicast at a given time as a png.
+
+    Args:
+        cast_path (Path): The asciicast.
+        time (Optional[float]): See `screen_at()`.
+        output_path (Optional[Path]): Where to save the image. Defaults
+            to `thumbnail_path_for()`.
+        font_path (Optional[str]): See `cast_render.render_cast()`.
+        font_size (int): See `cast_render.render_cast()`.
+
+    Returns:
+        Path: The path towards the image.
+    """
+    output_path = output_path or thumbnail_path_for(cast_path)
+    screen: Screen = screen_at(cast_path, time)
+    screen.cursor_visible = False
+    canvas: compositor.Compositor = compositor.Compositor(
+        screen, cast_render.glyph_atlas(font_path, font_size)
+    )
+    canvas.update()
+
+    from PIL import Image
+
+    image = Image.frombytes("P", (canvas.width, canvas.height), canvas.frame.tobytes())
+    image.putpalette([channel for color in PALETTE for channel in color])
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with workdir.scratch("goodbot-thumbnail-") as scratch_path:
+        saved_path: Path = scratch_path / output_path.name
+        image.save(saved_path, format="PNG")
+        workdir.move_into(saved_path, output_path)
+
+    return output_path
+
+
+def thumbnail_project(
+    project_path: Path,
+    time: Optional[float] = None,
+    jobs: Optional[int] = None,
+    font_path: Optional[str] = None,
+    font_size: int = glyphs.DEFAULT_SIZE,
+) -> List[Path]:
+    """Saves a thumbnail of every asciicast of a project.
+
+    Asciicasts are processed in parallel, one per process.
+
+    Args:
+        project_path (Path): The path towards the project.
+        time (Optional[float]): See `screen_at()`.
+        jobs (Optional[int]): How many asciicasts are processed at the
+            same time. Defaults to the amount of processors.
+        font_path (Optional[str]): See `cast_render.render_cast()`.
+        font_size (int): See `cast_render.render_cast()`.
+
+    Returns:
+        List[Path]: The path towards each image.
+    """
+    casts: List[Path] = sorted(render.fetch_project_asciicasts(project_path))
+    if not casts:
+        return []
+    # Loading the font before starting the processes, so that a missing
+    # font or dependency is reported once.
+    cast_render.glyph_cache(font_path, font_size)
+
+    with ProcessPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as executor:
+        futures = [
+            executor.submit(thumbnail, cast, time, None, font_path, font_size)
+            for cast in casts
+        ]
+        return [future.result() for future in futures]
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+timing.py contains functions used to fit the length of recordings to
+the length of their narration.
+
+A recording and its narration rarely last as long as each other. Instead
+of freezing the last frame or padding the audio with silence once the
+clip is rendered, `fit_asciicast()` changes the timing of the asciicast
+itself, before it is converted to a gif: idle gaps (the time spent
+waiting for a command to finish, or before typing the next one) are
+stretched or compressed until the recording lasts as long as the audio.
+Typing delays are shorter than `IDLE_THRESHOLD` and are left untouched,
+so typing keeps its natural pace.
+
+If the idle gaps can't be compressed enough, the recording is left
+longer than the audio and `render.render()` pads the audio.
+"""
+import os
+import json
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from goodbot import audio_index, cast_index
+
+# Gaps between events longer than this are considered idle, in seconds.
+IDLE_THRESHOLD: float = 0.3
+# Idle gaps are never compressed below this duration, in seconds.
+MIN_IDLE: float = 0.3
+
+
+def read_asciicast(cast_path: Path) -> Tuple[Dict[str, Any], List[List[Any]]]:
+    """Reads an asciicast (v2) file.
+
+    Returns:
+        Tuple[Dict[str, Any], List[List[Any]]]: The header and the
+            events of the recording.
+    """
+    with open(cast_path, "r") as stream:
+        header: Dict[str, Any] = json.loads(stream.readline())
+        events: List[List[Any]] = [json.loads(line) for line in stream if line.strip()]
+    return header, events
+
+
+def write_asciicast(
+    cast_path: Path, header: Dict[str, Any], events: List[List[Any]]
+) -> Path:
+    """Writes an asciicast (v2) file, replacing it atomically.
+
+    The asciicast's sidecar index is rewritten too, if it has one.
+    """
+    descriptor, temporary = tempfile.mkstemp(
+        dir=cast_path.parent, prefix=f".{cast_path.name}."
+    )
+    with os.fdopen(descriptor, "w") as out:
+        out.write(json.dumps(header) + "\n")
+        for event in events:
+            out.write(json.dumps(event, ensure_ascii=False) + "\n")
+    os.replace(temporary, cast_path)
+    if cast_index.index_path_for(cast_path).exists():
+        cast_index.write_index(cast_path)
+    return cast_path
+
+
+def fit_events(events: List[List[Any]], target: float) -> Tuple[List[List[Any]], float]:
+    """Changes the idle gaps of a recording so it lasts `target` seconds.
+
+    Args:
+        events (List[List[Any]]): The events of an asciicast.
+        target (float): The expected duration, in seconds.
+
+    Returns:
+        Tuple[List[List[Any]], float]: The new events and the duration
+            of the recording once fitted.
+    """
+    if not events:
+        return [[round(target, 6), "o", ""]] if target > 0 else [], max(0.0, target)
+
+    times: List[float] = [0.0] + [event[0] for event in events]
+    gaps: List[float] = [after - before for before, after in zip(times, times[1:])]
+    idle: List[int] = [i for i, gap in enumerate(gaps) if gap > IDLE_THRESHOLD]
+    delta: float = target - times[-1]
+
+    if delta > 0:
+        if idle:
+            # Stretching every idle gap by the same factor.
+            factor: float = 1 + delta / sum(gaps[i] for i in idle)
+            for i in idle:
+                gaps[i] *= factor
+        else:
+            gaps.append(delta)
+    elif delta < 0 and idle:
+        compressible: float = sum(max(0.0, gaps[i] - MIN_IDLE) for i in idle)
+        if compressible > 0:
+            ratio: float = min(1.0, -delta / compressible)
+            for i in idle:
+                gaps[i] -= max(0.0, gaps[i] - MIN_IDLE) * ratio
+
+    fitted: List[List[Any]] = []
+    time: float = 0.0
+    for event, gap in zip(events, gaps):
+        time += gap
+        fitted.append([round(time, 6)] + list(event[1:]))
+    if len(gaps) > len(events):
+        # Holding the last frame with an event that prints nothing.
+        time += gaps[-1]
+        fitted.append([round(time, 6), "o", ""])
+
+    return fitted, time
+
+
+def fit_asciicast(cast_path: Path, target: float) -> Dict[str, float]:
+    """Fits an asciicast to a duration, in place.
+
+    Args:
+        cast_path (Path): The asciicast to change.
+        target (float): The expected duration, in seconds.
+
+    Returns:
+        Dict[str, float]: The `original` and `fitted` durations of the
+            recording and the `target`.
+    """
+    header, events = read_asciicast(cast_path)
+    original: float = events[-1][0] if events else 0.0
+    fitted_events, fitted = fit_events(events, target)
+    if fitted_events != events:
+        write_asciicast(cast_path, header, fitted_events)
+    return {"original": original, "fitted": fitted, "target": target}
+
+
+def narration_for(cast_path: Path) -> Optional[Path]:
+    """Finds the narration of an asciicast.
+
+    `[scene]/asciicasts/commands_[id].cast` is narrated by
+    `[scene]/audio/read_[id].mp3`.
+
+    Returns:
+        Optional[Path]: The audio file, or `None` if the recording is
+            not narrated.
+    """
+    identifier: str = cast_path.stem.split("_")[-1]
+    audio_path: Path = cast_path.parent.parent / "audio" / f"read_{identifier}.mp3"
+    return audio_path if audio_path.exists() else None
+
+
+def fit_to_narration(cast_path: Path) -> Optional[Dict[str, float]]:
+    """Fits an asciicast to the duration of its narration.
+
+    The duration of the narration is read from the project's audio
+    index.
+
+    Returns:
+        Optional[Dict[str, float]]: See `fit_asciicast()`. `None` if the
+            recording is not narrated.
+    """
+    audio_path: Optional[Path] = narration_for(cast_path)
+    if audio_path is None:
+        return None
+    return fit_asciicast(cast_path, audio_index.lookup(audio_path)["duration"])
+
+
+def fit_project(
+    project_path: Path, selected: Optional[Callable[[Path], bool]] = None
+) -> Dict[Path, Dict[str, float]]:
+    """Fits every narrated asciicast of a project.
+
+    Args:
+        project_path (Path): The path towards the project.
+        selected (Optional[Callable[[Path], bool]]): If provided, only
+            the asciicasts for which it returns `True`, or whose
+            narration it returns `True` for, are fitted. See
+            `utils.selector()`.
+
+    Returns:
+        Dict[Path, Dict[str, float]]: The result of `fit_asciicast()`
+            for each narrated recording.
+    """
+    results: Dict[Path, Dict[str, float]] = {}
+    for cast_path in sorted(project_path.glob("scene_*/asciicasts/*.cast")):
+        if selected and not selected(cast_path):
+            narration: Optional[Path] = narration_for(cast_path)
+            if narration is None or not selected(narration):
+                continue
+        result: Optional[Dict[str, float]] = fit_to_narration(cast_path)
+        if result is not None:
+            results[cast_path] = result
+    return results
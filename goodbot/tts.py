@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+tts.py contains the text to speech backends used to record narration.
+
+Every backend implements `TTSBackend`: it turns a piece of text (or
+SSML) into the contents of an mp3 file. The `audio` module splits the
+`read` files, sends the chunks to a backend and joins the results.
+
+Available backends:
+
+* `google`: Google Cloud Text to Speech. Requires network access and
+  the `GOOGLE_APPLICATION_CREDENTIALS` environment variable.
+* `espeak`: `espeak-ng`, a local engine. It is fast and free, which
+  makes it useful to iterate on a project and in CI. Requires the
+  `espeak-ng` and `ffmpeg` programs.
+"""
+import os
+import abc
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from importlib import metadata
+from typing import Any, Dict, List, Optional, Type
+from google.cloud import texttospeech
+from goodbot.cache import tool_version
+
+
+class TTSBackend(abc.ABC):
+    """A text to speech engine.
+
+    Attributes:
+        name (str): The name used to select the backend.
+        offline (bool): Whether or not the backend works without
+            network access.
+        max_workers (int): How many chunks `batch_synthesize()` sends
+            at the same time.
+    """
+
+    name: str = ""
+    offline: bool = False
+    max_workers: int = 1
+
+    @abc.abstractmethod
+    def synthesize(self, text: str, lang: str, lang_name: str) -> bytes:
+        """Reads a piece of text.
+
+        Args:
+            text (str): The text to read. SSML if it starts with
+                `<speak>`.
+            lang (str): The language code, like `en-US`.
+            lang_name (str): The name of the voice.
+
+        Returns:
+            bytes: The contents of an mp3 file.
+        """
+
+    def batch_synthesize(
+        self, texts: List[str], lang: str, lang_name: str
+    ) -> List[bytes]:
+        """Reads many pieces of text at the same time.
+
+        Returns:
+            List[bytes]: The contents of an mp3 file for each text, in
+                the same order.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(
+                executor.map(lambda text: self.synthesize(text, lang, lang_name), texts)
+            )
+
+    @abc.abstractmethod
+    def voices(self, lang: Optional[str] = None) -> List[str]:
+        """Lists the voices of the backend.
+
+        Args:
+            lang (Optional[str]): Only list voices for this language.
+
+        Returns:
+            List[str]: The names of the voices.
+        """
+
+    @abc.abstractmethod
+    def estimate_cost(self, texts: List[str], lang_name: str) -> float:
+        """Estimates the price of reading texts, in US dollars."""
+
+    @abc.abstractmethod
+    def version(self) -> str:
+        """Describes the engine's version. Used in cache keys."""
+
+
+class GoogleBackend(TTSBackend):
+    """Google Cloud Text to Speech.
+
+    See: https://cloud.google.com/text-to-speech
+    """
+
+    name = "google"
+    max_workers = 8
+
+    # Price per million characters, in US dollars.
+    PRICES: Dict[str, float] = {"Standard": 4.0, "Wavenet": 16.0, "Neural2": 16.0}
+
+    def __init__(self) -> None:
+        self._client: Any = None
+
+    @property
+    def client(self) -> Any:
+        """The API client, created on first use."""
+        if self._client is None:
+            self._client = texttospeech.TextToSpeechClient()
+        return self._client
+
+    def synthesize(self, text: str, lang: str, lang_name: str) -> bytes:
+        if text.startswith("<speak"):
+            synthesis_input = texttospeech.SynthesisInput(ssml=text)
+        else:
+            synthesis_input = texttospeech.SynthesisInput(text=text)
+
+        voice = texttospeech.VoiceSelectionParams(
+            language_code=lang,
+            name=lang_name,
+            ssml_gender=texttospeech.SsmlVoiceGender.NEUTRAL,
+        )
+
+        audio_config = texttospeech.AudioConfig(
+            audio_encoding=texttospeech.AudioEncoding.MP3
+        )
+
+        response = self.client.synthesize_speech(
+            input=synthesis_input, voice=voice, audio_config=audio_config
+        )
+        return response.audio_content
+
+    def voices(self, lang: Optional[str] = None) -> List[str]:
+        response = self.client.list_voices(language_code=lang or "")
+        return [voice.name for voice in response.voices]
+
+    def estimate_cost(self, texts: List[str], lang_name: str) -> float:
+        price: float = self.PRICES["Standard"]
+        for kind, kind_price in self.PRICES.items():
+            if kind in lang_name:
+                price = kind_price
+        return sum(len(text) for text in texts) * price / 1_000_000
+
+    def version(self) -> str:
+        try:
+            return metadata.version("google-cloud-texttospeech")
+        except metadata.PackageNotFoundError:
+            return ""
+
+
+@lru_cache(maxsize=None)
+def _espeak_voices() -> Dict[str, str]:
+    """Maps each `espeak-ng` language to the name of its voice file."""
+    output = subprocess.run(
+        ["espeak-ng", "--voices"], capture_output=True, text=True, check=True
+    )
+    voices: Dict[str, str] = {}
+    # Columns: Pty Language Age/Gender VoiceName File Other Languages
+    for line in output.stdout.splitlines()[1:]:
+        columns: List[str] = line.split()
+        if len(columns) >= 5:
+            voices[columns[1]] = columns[4]
+    return voices
+
+
+class EspeakBackend(TTSBackend):
+    """`espeak-ng`, converted to mp3 with `ffmpeg`.
+
+    Voices are selected by language: `en-US` uses the `en-us` voice.
+    `lang_name` is used instead when it is the name of an `espeak-ng`
+    language, so Google voice names can be left in a project.
+
+    See: https://github.com/espeak-ng/espeak-ng
+    """
+
+    name = "espeak"
+    offline = True
+    max_workers = os.cpu_count() or 1
+
+    def _voice(self, lang: str, lang_name: str) -> str:
+        voices: Dict[str, str] = _espeak_voices()
+        for candidate in (lang_name, lang_name.lower(), lang.lower()):
+            if candidate in voices:
+                return candidate
+        # The base language: `fr-CA` becomes `fr`.
+        return lang.split("-")[0].lower()
+
+    def synthesize(self, text: str, lang: str, lang_name: str) -> bytes:
+        command: List[str] = ["espeak-ng", "-v", self._voice(lang, lang_name)]
+        if text.startswith("<speak"):
+            command.append("-m")
+        # The text goes on stdin so that lines starting with `-` are not
+        # read as options.
+        wav = subprocess.run(
+            command + ["--stdout", "--stdin"],
+            input=text.encode(),
+            capture_output=True,
+            check=True,
+        )
+        encoded = subprocess.run(
+            [
+                "ffmpeg",
+                "-loglevel",
+                "error",
+                "-i",
+                "pipe:0",
+                "-codec:a",
+                "libmp3lame",
+                "-f",
+                "mp3",
+                "pipe:1",
+            ],
+            input=wav.stdout,
+            capture_output=True,
+            check=True,
+        )
+        return encoded.stdout
+
+    def voices(self, lang: Optional[str] = None) -> List[str]:
+        return [
+            name
+            for name in _espeak_voices()
+            if lang is None or name.startswith(lang.lower().split("-")[0])
+        ]
+
+    def estimate_cost(self, texts: List[str], lang_name: str) -> float:
+        return 0.0
+
+    def version(self) -> str:
+        return f"{tool_version('espeak-ng', '--version')} {tool_version('ffmpeg')}"
+
+
+BACKENDS: Dict[str, Type[TTSBackend]] = {
+    GoogleBackend.name: GoogleBackend,
+    EspeakBackend.name: EspeakBackend,
+}
+
+
+def get_backend(name: str = "google") -> TTSBackend:
+    """Creates a backend from its name.
+
+    Args:
+        name (str): One of the keys of `BACKENDS`.
+
+    Raises:
+        ValueError: If there is no backend with that name.
+
+    Returns:
+        TTSBackend: The backend.
+    """
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown TTS backend {name}. Choose one of: {', '.join(BACKENDS)}."
+        )
+    return BACKENDS[name]()
@@ -5,7 +5,7 @@ utils.py module. Contains utility functions.
 import os
 
 from pathlib import Path
-from typing import List
+from typing import Callable, Iterable, List, Optional, Set, Tuple, Union
 
 ALLOWED_INSTRUCTIONS_SUFFIX = (".yaml", ".txt", "")
 
@@ -52,6 +52,25 @@ def is_scene(directory: Path) -> bool:
     return dir_name[0:5] == "scene" and contains_something
 
 
+def get_content_file_id(content_file: Union[Path, str]) -> int:
+
+    if isinstance(content_file, str):
+        content_file = Path(content_file)
+
+    file_name: str = content_file.stem
+
+    try:
+        return int(file_name.split("_")[1])
+    except ValueError:
+        raise ValueError(
+            f"{content_file} does not seem to follow Good-Bot's naming scheme."
+        )
+    except IndexError:
+        raise ValueError(
+            f"{content_file} does not seem to follow Good-Bot's naming scheme."
+        )
+
+
 def list_scenes(project_dir: Path) -> List[Path]:
     """Lists every scene contained in the `project_dir` path.
 
@@ -90,3 +109,52 @@ def list_scenes(project_dir: Path) -> List[Path]:
             print(f"The directory {directory} was ignored.")
 
     return all_scenes
+
+
+def selector(
+    scenes: Iterable[str] = (), elements: Iterable[str] = ()
+) -> Optional[Callable[[Path], bool]]:
+    """Builds a function that tells if a file of a project was selected.
+
+    Files are selected by scene or by element. Any file of an element
+    can be checked: its instructions, its recording, its gif or its
+    audio, as long as it is saved in a directory of its scene, like
+    `scene_3/asciicasts/commands_2.cast`.
+
+    Elements are identified by their scene and their id (see
+    `get_content_file_id()`), whatever their type: selecting
+    `scene_3/commands_2` also selects its narration, like
+    `scene_3/audio/read_2.mp3`.
+
+    Args:
+        scenes (Iterable[str]): The selected scenes, like `3` or
+            `scene_3`.
+        elements (Iterable[str]): The selected elements, like
+            `scene_3/commands_2`.
+
+    Returns:
+        Optional[Callable[[Path], bool]]: Whether or not a file is part
+            of the selection. `None` if nothing was selected, in which
+            case every file should be used.
+    """
+    selected_scenes = {
+        scene if scene.startswith("scene_") else f"scene_{scene}" for scene in scenes
+    }
+    selected_elements: Set[Tuple[str, int]] = set()
+    for element in elements:
+        scene, name = element.strip("/").split("/")
+        selected_elements.add((scene, get_content_file_id(name)))
+    if not selected_scenes and not selected_elements:
+        return None
+
+    def is_selected(path: Path) -> bool:
+        scene: str = path.parent.parent.name
+        if scene in selected_scenes:
+            return True
+        try:
+            return (scene, get_content_file_id(path)) in selected_elements
+        # Files that are not part of an element.
+        except ValueError:
+            return False
+
+    return is_selected
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+watch.py contains functions used to keep a project up to date with its
+configuration file while it is being edited.
+
+Each time the configuration file is saved, it is parsed again and the
+project is updated with `funcmodule.update_project()`, which only
+writes the instruction files of the elements that changed. Those
+elements can then be recorded and rendered on their own, using
+`utils.selector()`.
+
+`rebuild()` then records the elements that changed, converts their
+recordings to gifs, renders their clips and makes the final video.
+
+Changes are detected with Linux's `inotify`, through `ctypes`. The
+directory of the configuration file is watched, since many editors
+save a file by replacing it. When `inotify` is not available, the file
+is polled instead.
+"""
+import os
+import select
+import struct
+import time
+import ctypes
+import ctypes.util
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import yaml
+from rich.console import Console
+
+from goodbot import cast_render, funcmodule, render
+from goodbot.cache import ArtifactCache
+
+# How often the configuration file is checked when it is polled, in seconds.
+POLL_INTERVAL: float = 0.5
+# How long to wait for an editor to finish saving, in seconds.
+SETTLE_TIME: float = 0.2
+
+# See `inotify(7)`.
+IN_MODIFY: int = 0x00000002
+IN_CLOSE_WRITE: int = 0x00000008
+IN_MOVED_TO: int = 0x00000080
+IN_CREATE: int = 0x00000100
+_EVENT = struct.Struct("iIII")
+
+
+def stamp(path: Path) -> Optional[Tuple[int, int]]:
+    """Identifies the version of a file.
+
+    Returns:
+        Optional[Tuple[int, int]]: The time of the last modification of
+            the file and its size. `None` if the file does not exist.
+    """
+    try:
+        stat: os.stat_result = os.stat(path)
+    except FileNotFoundError:
+        # Some editors remove the file before writing it again.
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _inotify(directory: Path) -> Optional[int]:
+    """Starts watching a directory with `inotify`.
+
+    Returns:
+        Optional[int]: The `inotify` file descriptor. `None` if
+            `inotify` is not available.
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        descriptor: int = libc.inotify_init1(os.O_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if descriptor < 0:
+        return None
+    mask: int = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    if libc.inotify_add_watch(descriptor, os.fsencode(directory), mask) < 0:
+        os.close(descriptor)
+        return None
+    return descriptor
+
+
+def _event_names(data: bytes) -> Iterator[str]:
+    offset: int = 0
+    while offset < len(data):
+        _, _, _, length = _EVENT.unpack_from(data, offset)
+        offset += _EVENT.size
+        yield os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+        offset += length
+
+
+def _wait(descriptor: int, name: str) -> None:
+    """Waits for `inotify` to report an event on a file, then for the
+    events to stop."""
+    while True:
+        select.select([descriptor], [], [])
+        if name in _event_names(os.read(descriptor, 4096)):
+            break
+    while select.select([descriptor], [], [], SETTLE_TIME)[0]:
+        os.read(descriptor, 4096)
+
+
+def changes(
+    config_path: Path,
+    interval: float = POLL_INTERVAL,
+    use_inotify: bool = True,
+    since: Optional[Tuple[int, int]] = None,
+) -> Iterator[Path]:
+    """Waits for a file to change.
+
+    Args:
+        config_path (Path): The file to watch.
+        interval (float): How often the file is checked, in seconds,
+            when it is polled.
+        use_inotify (bool): Whether or not to use `inotify`. The file
+            is polled if it is `False` or if `inotify` is not available.
+        since (Optional[Tuple[int, int]]): The version of the file that
+            was last seen, as returned by `stamp()`. Defaults to the
+            current version.
+
+    Yields:
+        Path: `config_path`, each time it changes.
+    """
+    config_path = config_path.absolute()
+    descriptor: Optional[int] = _inotify(config_path.parent) if use_inotify else None
+    last: Optional[Tuple[int, int]] = since or stamp(config_path)
+    try:
+        while True:
+            current: Optional[Tuple[int, int]] = stamp(config_path)
+            if current is not None and current != last:
+                last = current
+                yield config_path
+            elif descriptor is None:
+                time.sleep(interval)
+            else:
+                _wait(descriptor, config_path.name)
+    finally:
+        if descriptor is not None:
+            os.close(descriptor)
+
+
+def watch_config(
+    config_path: Path, use_inotify: bool = True
+) -> Iterator[Dict[int, List[dict]]]:
+    """Parses a configuration file now and each time it changes.
+
+    Versions of the file that can't be parsed are reported and skipped,
+    since they are often saved while the file is being edited.
+
+    Yields:
+        Dict[int, List[dict]]: The parsed configuration file.
+    """
+    console: Console = Console()
+    versions: Optional[Iterator[Path]] = None
+    while True:
+        # Changes made while the last version is used are not missed.
+        version: Optional[Tuple[int, int]] = stamp(config_path)
+        try:
+            parsed: Dict[int, List[dict]] = funcmodule.config_parser(config_path)
+            funcmodule.config_info(parsed)
+        # `config_info()` exits when a keyword is not supported.
+        except (yaml.YAMLError, TypeError, ValueError, KeyError, SystemExit) as error:
+            console.log(f"Could not parse {config_path}: {error}")
+        else:
+            yield parsed
+        console.log(f"Watching {config_path} for changes...")
+        versions = versions or changes(
+            config_path, use_inotify=use_inotify, since=version
+        )
+        next(versions)
+
+
+def rebuild(
+    project_path: Path,
+    selected: Optional[Callable[[Path], bool]],
+    record: Callable[[Callable[[Path], bool]], None],
+    cache: Optional[ArtifactCache] = None,
+    draft: bool = False,
+    encoder: str = "ffmpeg",
+    debug: bool = False,
+) -> Path:
+    """Brings a project up to date after `funcmodule.update_project()`.
+
+    `update_project()` removes every file of the elements that changed,
+    their gifs included. They are recorded again, their recordings are
+    converted to gifs (see `cast_render.render_project()`) and their
+    clips are rendered. The final video is then made again, with the
+    clips of every other element.
+
+    Args:
+        project_path (Path): The path towards the project.
+        selected (Optional[Callable[[Path], bool]]): The elements that
+            changed, as returned by `utils.selector()`. If `None`, only
+            elements were removed, and only the final video is made.
+        record (Callable[[Callable[[Path], bool]], None]): Records the
+            selected elements, like `recording.record_project()`.
+        cache (Optional[ArtifactCache]): See `render.render_all()`.
+        draft (bool): See `render.render_all()`.
+        encoder (str): See `render.render_all()`.
+        debug (bool): See `render.render_final()`.
+
+    Returns:
+        Path: The path towards the final video.
+    """
+    if selected:
+        record(selected)
+        cast_render.render_project(project_path, selected=selected)
+        render.render_all(project_path, cache, False, selected, draft, encoder)
+    return render.render_final(project_path, debug, draft)
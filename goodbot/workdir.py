@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+workdir.py contains functions used to manage the work directory, where
+intermediate files are written while recording and rendering.
+
+Projects are often saved on slow or network-mounted volumes. Files that
+are written many times before being complete (asciicasts, clips being
+encoded, `ffmpeg` instructions...) are written to a scratch directory
+under the work directory first. Only finished files are moved to the
+project, using `move_into()`.
+
+The work directory is, in order of precedence:
+
+* The directory given to `set_work_dir()` (the `--work-dir` option).
+* The `GOODBOT_WORK_DIR` environment variable.
+* `/dev/shm`, when it has at least `MIN_FREE_SPACE` bytes available, so
+  intermediate files stay in memory.
+* The system's temporary directory.
+"""
+import os
+import errno
+import shutil
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+ENV_VARIABLE: str = "GOODBOT_WORK_DIR"
+SHARED_MEMORY: Path = Path("/dev/shm")
+# `/dev/shm` is only used by default if it has this much space available.
+MIN_FREE_SPACE: int = 1024**3
+
+_work_dir: Optional[Path] = None
+
+
+def free_space(path: Path) -> int:
+    """Computes how many bytes can be written under `path`."""
+    return shutil.disk_usage(path).free
+
+
+def default_work_dir() -> Path:
+    """Finds the work directory used when none is configured.
+
+    Returns:
+        Path: `/dev/shm` if it is writable and has at least
+            `MIN_FREE_SPACE` bytes available, the system's temporary
+            directory otherwise.
+    """
+    if (
+        SHARED_MEMORY.is_dir()
+        and os.access(SHARED_MEMORY, os.W_OK | os.X_OK)
+        and free_space(SHARED_MEMORY) >= MIN_FREE_SPACE
+    ):
+        return SHARED_MEMORY
+    return Path(tempfile.gettempdir())
+
+
+def set_work_dir(path: Optional[Path]) -> None:
+    """Configures the work directory of the current process.
+
+    Args:
+        path (Optional[Path]): The new work directory. `None` goes back
+            to the `GOODBOT_WORK_DIR` variable or the default.
+    """
+    global _work_dir
+    _work_dir = path
+
+
+def work_dir() -> Path:
+    """Finds the current work directory. See the module's description."""
+    if _work_dir is not None:
+        return _work_dir
+    if os.environ.get(ENV_VARIABLE):
+        return Path(os.environ[ENV_VARIABLE])
+    return default_work_dir()
+
+
+def make_scratch(prefix: str = "goodbot-", required: int = 0) -> Path:
+    """Creates a new directory under the work directory.
+
+    The caller is responsible for removing the directory. See `scratch()`
+    for a directory that is removed automatically.
+
+    Args:
+        prefix (str): The start of the directory's name.
+        required (int): How many bytes are expected to be written in
+            the directory. If the work directory does not have that
+            much space available, the system's temporary directory is
+            used instead.
+
+    Raises:
+        OSError: If neither directory has enough space available.
+
+    Returns:
+        Path: The path towards the new directory.
+    """
+    base: Path = work_dir()
+    base.mkdir(parents=True, exist_ok=True)
+
+    if required and free_space(base) < required:
+        fallback: Path = Path(tempfile.gettempdir())
+        if fallback == base or free_space(fallback) < required:
+            raise OSError(
+                errno.ENOSPC,
+                f"Not enough space to write {required} bytes of intermediate files",
+                str(base),
+            )
+        base = fallback
+
+    return Path(tempfile.mkdtemp(prefix=prefix, dir=base))
+
+
+@contextmanager
+def scratch(prefix: str = "goodbot-", required: int = 0) -> Iterator[Path]:
+    """Creates a directory that is removed once the context exits.
+
+    See `make_scratch()` for the arguments.
+    """
+    path: Path = make_scratch(prefix, required)
+    try:
+        yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def move_into(source: Path, destination: Path) -> Path:
+    """Moves a finished file from the work directory to its destination.
+
+    When both paths are on the same filesystem, the file is renamed.
+    Otherwise it is copied next to the destination first, then renamed,
+    so the destination is never left half written.
+
+    Returns:
+        Path: The destination.
+    """
+    try:
+        os.replace(source, destination)
+        return destination
+    except OSError as err:
+        if err.errno != errno.EXDEV:
+            raise
+
+    temporary: Path = destination.with_name(f".{destination.name}.part")
+    try:
+        shutil.copyfile(source, temporary)
+        os.replace(temporary, destination)
+    finally:
+        if temporary.exists():
+            os.remove(temporary)
+    os.remove(source)
+    return destination
+
+
+def environment() -> Dict[str, str]:
+    """Creates the environment of programs that write temporary files.
+
+    Returns:
+        Dict[str, str]: A copy of the current environment where
+            `TMPDIR` points towards the work directory.
+    """
+    path: Path = work_dir()
+    path.mkdir(parents=True, exist_ok=True)
+    variables: Dict[str, str] = dict(os.environ)
+    variables["TMPDIR"] = str(path)
+    return variables
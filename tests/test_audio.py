@@ -3,6 +3,7 @@ import tempfile
 import shutil
 import os
 import goodbot.audio as audio
+import goodbot.tts as tts
 
 from pathlib import Path
 from distutils.dir_util import copy_tree
@@ -61,3 +62,85 @@ def test_record_audio():
         audio_scripts = audio.fetch_project_audio_instructions(project_path)
         recorded = audio.record_audio(project_path)
         assert len(recorded) == len(audio_scripts)
+
+
+def test_split_narration():
+    """
+    Making sure that narration is split at the end of sentences,
+    between paragraphs and that SSML chunks stay valid.
+    """
+    text = "First sentence. Second one?\nStill the first paragraph!\n\nSecond paragraph."
+    assert audio.split_narration(text) == [
+        ["First sentence. Second one? Still the first paragraph!"],
+        ["Second paragraph."],
+    ]
+    assert audio.split_narration(text, 30) == [
+        ["First sentence. Second one?", "Still the first paragraph!"],
+        ["Second paragraph."],
+    ]
+
+    ssml = '<speak><p>One. Two.</p> Three. <break time="1s"/> <emphasis>Four. Five.</emphasis></speak>'
+    assert audio.split_narration(ssml, 40) == [
+        [
+            "<speak><p>One. Two.</p></speak>",
+            '<speak>Three.<break time="1s"/></speak>',
+            "<speak><emphasis>Four. Five.</emphasis></speak>",
+        ]
+    ]
+
+    long_sentence = " ".join(["word"] * 100)
+    chunks = audio.split_narration(long_sentence, 50)[0]
+    assert all(len(chunk) <= 50 for chunk in chunks)
+    assert " ".join(chunks) == long_sentence
+
+
+def test_record_audio_file(monkeypatch):
+    """
+    Testing that chunks are synthesized separately and joined in order,
+    with a pause between paragraphs.
+    """
+    sample = Path("./tests/examples/render-sample/scene_1/audio/read_1.mp3")
+    with open(sample, "rb") as stream:
+        sample_audio = stream.read()
+    requested = []
+
+    class FakeBackend(tts.TTSBackend):
+        name = "fake"
+        max_workers = 4
+
+        def synthesize(self, text, lang, lang_name):
+            requested.append(text)
+            return sample_audio
+
+        def voices(self, lang=None):
+            return []
+
+        def estimate_cost(self, texts, lang_name):
+            return 0.0
+
+        def version(self):
+            return "1"
+
+    monkeypatch.setattr(audio, "CHUNK_BYTES", 20)
+
+    with tempfile.TemporaryDirectory() as temp:
+        project_path = Path(temp)
+        script = project_path / "scene_1/read/read_1.txt"
+        script.parent.mkdir(parents=True)
+        (project_path / "scene_1/audio").mkdir()
+        with open(script, "w") as stream:
+            stream.write("A first sentence. A second sentence.\n\nAnother paragraph.")
+
+        recorded = audio.record_audio_file(
+            script, project_path, pause=0.48, backend=FakeBackend()
+        )
+
+        assert recorded == project_path / "scene_1/audio/read_1.mp3"
+        assert sorted(requested) == sorted(
+            ["A first sentence.", "A second sentence.", "Another paragraph."]
+        )
+        with open(recorded, "rb") as stream:
+            duration = audio.mp3.duration(stream.read())
+        assert duration == pytest.approx(3 * audio.mp3.duration(sample_audio) + 0.48)
+        index = audio.audio_index.read_index(project_path)
+        assert index["scene_1/audio/read_1.mp3"]["duration"] == pytest.approx(duration)
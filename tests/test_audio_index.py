@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Testing functions from the `audio_index` module."""
+import os
+import shutil
+import tempfile
+import pytest
+from pathlib import Path
+from goodbot import audio_index
+
+SAMPLE_AUDIO = Path("./tests/examples/render-sample/scene_1/audio/read_1.mp3")
+
+
+def test_audio_info():
+    with open(SAMPLE_AUDIO, "rb") as stream:
+        info = audio_index.audio_info(stream.read())
+    assert info == {
+        "duration": pytest.approx(1.272),
+        "sample_rate": 24000,
+        "channels": 1,
+        "codec": "mp3",
+        "frames": 53,
+    }
+    with pytest.raises(ValueError):
+        audio_index.audio_info(b"not audio")
+
+
+def test_add_and_lookup():
+    """
+    Making sure that entries are keyed by their path in the project
+    and computed again when their file changes.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        project = Path(temp)
+        audio_path = project / "scene_1/audio/read_1.mp3"
+        audio_path.parent.mkdir(parents=True)
+        shutil.copy(SAMPLE_AUDIO, audio_path)
+
+        entry = audio_index.add(audio_path)
+        assert audio_index.read_index(project) == {"scene_1/audio/read_1.mp3": entry}
+        assert audio_index.lookup(audio_path) == entry
+
+        # Replacing the file with a longer one.
+        with open(SAMPLE_AUDIO, "rb") as stream:
+            data = stream.read()
+        with open(audio_path, "wb") as out:
+            out.write(data * 2)
+        os.utime(audio_path, ns=(0, 0))
+
+        assert audio_index.lookup(audio_path)["duration"] == pytest.approx(2.544)
+        assert (
+            audio_index.read_index(project)["scene_1/audio/read_1.mp3"]["frames"] == 106
+        )
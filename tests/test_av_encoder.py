@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Testing functions from the `av_encoder` module."""
+import shutil
+import tempfile
+import numpy as np
+import pytest
+from pathlib import Path
+from distutils.dir_util import copy_tree
+from goodbot import av_encoder, render
+
+SAMPLE_PROJECT = Path("./tests/examples/render-sample")
+
+
+def decode(video_path):
+    """Decodes the frames of a clip, with the time they are shown."""
+    av = pytest.importorskip("av")
+    with av.open(str(video_path)) as container:
+        return [
+            (frame.time, frame.to_ndarray(format="rgb24").astype(int))
+            for frame in container.decode(video=0)
+        ]
+
+
+def shown_at(frames, time):
+    """Finds the frame shown at a given time."""
+    shown = frames[0][1]
+    for frame_time, frame in frames:
+        if frame_time > time + 1e-6:
+            break
+        shown = frame
+    return shown
+
+
+def test_sample():
+    """
+    Making sure that frames are shown until the next one, and that the
+    last one is held until the end.
+    """
+    frames = [(0.0, "a"), (0.15, "b"), (0.3, "c")]
+    assert list(av_encoder.sample(frames, 10, 0.6)) == list("aabccc")
+    assert list(av_encoder.sample([], 10, 1.0)) == []
+
+
+def test_write_clip_from_arrays():
+    """
+    Testing that palette indices, like the frames of a compositor, are
+    encoded without converting them to an image first.
+    """
+    pytest.importorskip("av")
+    palette = np.array([[0, 0, 0], [255, 255, 255]], dtype=np.uint8)
+    black = np.zeros((20, 30), dtype=np.uint8)
+    white = np.ones((20, 30), dtype=np.uint8)
+    with tempfile.TemporaryDirectory() as temp:
+        output_path = Path(temp) / "clip.mp4"
+        av_encoder.write_clip(
+            [(0.0, black), (0.5, white)], output_path, 1.0, palette=palette
+        )
+        frames = decode(output_path)
+
+    assert len(frames) == av_encoder.FRAME_RATE
+    assert frames[0][1].shape == (20, 30, 3)
+    assert shown_at(frames, 0.2).mean() < 10
+    assert shown_at(frames, 0.8).mean() > 245
+
+
+@pytest.mark.skipif(not shutil.which("ffmpeg"), reason="Requires ffmpeg.")
+def test_backend_parity():
+    """
+    Testing that clips encoded with PyAV show the same frames, at the
+    same times, and last as long as the clips encoded by `ffmpeg`.
+    """
+    av = pytest.importorskip("av")
+    with tempfile.TemporaryDirectory() as temp:
+        copy_tree(SAMPLE_PROJECT, temp)
+        gif_path = Path(temp) / "scene_1" / "gifs" / "commands_2.gif"
+        gif_and_audio = render.corresponding_audio(gif_path)
+        clips = {}
+        durations = {}
+        for encoder in render.ENCODER_BACKENDS:
+            output_path = Path(temp) / f"{encoder}.mp4"
+            render.encode_clips([(gif_and_audio, output_path)], encoder=encoder)
+            clips[encoder] = decode(output_path)
+            with av.open(str(output_path)) as container:
+                durations[encoder] = container.duration / av.time_base
+
+    reference = clips["ffmpeg"]
+    differences = [
+        np.abs(frame - shown_at(reference, time)).mean()
+        for time, frame in clips["pyav"]
+    ]
+    assert np.mean(differences) < 1
+    assert durations["pyav"] == pytest.approx(durations["ffmpeg"], abs=0.05)
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""Testing functions from the `cache` module."""
+import os
+import time
+import socket
+import hashlib
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from goodbot import cache
+
+
+def write(path, contents):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as stream:
+        stream.write(contents)
+    return path
+
+
+def read(path):
+    with open(path, "r") as stream:
+        return stream.read()
+
+
+class FakeS3(BaseHTTPRequestHandler):
+    """A minimal stand-in for an S3-compatible server."""
+
+    objects = {}
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def _authorized(self, body):
+        self.requests.append((self.command, self.path, dict(self.headers)))
+        return (
+            self.headers.get("authorization", "").startswith(
+                "AWS4-HMAC-SHA256 Credential=key/"
+            )
+            and self.headers.get("x-amz-date")
+            and self.headers.get("x-amz-content-sha256")
+            == hashlib.sha256(body).hexdigest()
+        )
+
+    def do_GET(self):
+        if not self._authorized(b""):
+            self.send_response(403)
+            self.end_headers()
+        elif self.path not in self.objects:
+            self.send_response(404)
+            self.end_headers()
+        else:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(self.objects[self.path])))
+            self.end_headers()
+            self.wfile.write(self.objects[self.path])
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if not self._authorized(body):
+            self.send_response(403)
+        else:
+            self.objects[self.path] = body
+            self.send_response(200)
+        self.end_headers()
+
+
+def test_cache_key():
+    """
+    Making sure that keys depend on file contents and options, not on
+    file names.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        temp = Path(temp)
+        first = write(temp / "first.gif", "gif")
+        second = write(temp / "second.gif", "gif")
+        other = write(temp / "other.gif", "other gif")
+
+        key = cache.cache_key("clip", [first, None], {"ffmpeg": "4.4"})
+        assert key == cache.cache_key("clip", [second, None], {"ffmpeg": "4.4"})
+        assert key != cache.cache_key("clip", [other, None], {"ffmpeg": "4.4"})
+        assert key != cache.cache_key("clip", [first, None], {"ffmpeg": "5.0"})
+        assert key != cache.cache_key("audio", [first, None], {"ffmpeg": "4.4"})
+
+
+def test_parse_size():
+    assert cache.parse_size("512") == 512
+    assert cache.parse_size("2K") == 2048
+    assert cache.parse_size("1.5gb") == int(1.5 * 1024**3)
+    assert cache.parse_size(None) is None
+
+
+def test_link_artifact():
+    """
+    Testing that link_artifact creates a copy with the same contents and
+    replaces an existing destination.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        temp = Path(temp)
+        source = write(temp / "source.cast", "recording")
+        destination = write(temp / "project/scene_1/asciicasts/commands_1.cast", "old")
+
+        cache.link_artifact(source, destination)
+
+        assert read(destination) == "recording"
+        assert not [
+            name for name in os.listdir(destination.parent) if name.startswith(".")
+        ]
+
+
+def test_local_backend():
+    """
+    Making sure that artifacts are sharded, read-only and copied back
+    to their destination.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        temp = Path(temp)
+        backend = cache.LocalBackend(temp / "cache")
+        key = "abcdef" + "0" * 58
+
+        assert not backend.get(key, temp / "project/out.mp4")
+
+        stored = backend.put(key, write(temp / "clip.mp4", "clip"))
+        assert stored == temp / "cache/ab/cd" / key
+        assert not os.access(stored, os.W_OK) or os.getuid() == 0
+
+        assert backend.get(key, temp / "project/out.mp4")
+        assert read(temp / "project/out.mp4") == "clip"
+
+
+def test_local_backend_copies():
+    """
+    Making sure that a project's file from the cache is writable and
+    that changing it leaves the cache untouched.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        temp = Path(temp)
+        backend = cache.LocalBackend(temp / "cache")
+        key = "abcdef" + "1" * 58
+        stored = backend.put(key, write(temp / "clip.mp4", "clip"))
+
+        destination = temp / "project/out.mp4"
+        assert backend.get(key, destination)
+        assert os.stat(destination).st_ino != os.stat(stored).st_ino
+        assert os.stat(destination).st_mode & 0o200
+
+        write(destination, "another clip")
+        os.chmod(destination, 0o600)
+        assert read(stored) == "clip"
+        assert os.stat(stored).st_mode & 0o777 == 0o444
+
+
+def test_local_backend_shares_no_times():
+    """
+    Testing that saving an artifact leaves the project's file writable,
+    and that using it does not change the times of the project's files.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        temp = Path(temp)
+        backend = cache.LocalBackend(temp / "cache")
+        key = "fedcba" + "0" * 58
+        source = write(temp / "project_1/clip.mp4", "clip")
+
+        stored = backend.put(key, source)
+        assert os.stat(source).st_ino != os.stat(stored).st_ino
+        assert os.stat(source).st_mode & 0o200
+
+        destination = temp / "project_2/clip.mp4"
+        assert backend.get(key, destination)
+        before = os.stat(destination).st_mtime_ns
+        time.sleep(0.01)
+        assert backend.get(key, temp / "project_3/clip.mp4")
+        assert os.stat(destination).st_mtime_ns == before
+        assert backend.marker_for(key).exists()
+
+
+def test_local_backend_concurrent_writers():
+    """
+    Testing that many writers of the same key never leave a partial
+    artifact or temporary files behind.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        temp = Path(temp)
+        backend = cache.LocalBackend(temp / "cache")
+        key = "1234" + "0" * 60
+        sources = [write(temp / f"source_{i}", "x" * 100000) for i in range(8)]
+
+        threads = [
+            threading.Thread(target=backend.put, args=(key, source))
+            for source in sources
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert read(backend.path_for(key)) == "x" * 100000
+        assert os.listdir(backend.path_for(key).parent) == [key]
+
+
+def test_local_backend_evict():
+    """
+    Making sure that old artifacts are removed first, then the least
+    recently used ones until the cache is small enough.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        temp = Path(temp)
+        backend = cache.LocalBackend(temp / "cache")
+        now = time.time()
+        keys = [f"{i:02d}" * 32 for i in range(4)]
+        for age, key in zip((100, 30, 20, 10), keys):
+            stored = backend.put(key, write(temp / f"source_{key}", "x" * 10))
+            os.utime(stored, (now - age * 3600, now - age * 3600))
+
+        backend.max_age = 50 * 3600
+        assert backend.evict() == [backend.path_for(keys[0])]
+
+        backend.max_size = 15
+        assert backend.evict() == [
+            backend.path_for(keys[1]),
+            backend.path_for(keys[2]),
+        ]
+        assert backend.path_for(keys[3]).exists()
+
+        # Using an artifact marks it as recently used.
+        backend.max_size = None
+        backend.max_age = 5 * 3600
+        assert backend.get(keys[3], temp / "project/clip.mp4")
+        assert backend.evict() == []
+        assert backend.path_for(keys[3]).exists()
+
+
+def test_s3_backend():
+    """
+    Testing the remote backend against a local stand-in server, through
+    an ArtifactCache.
+    """
+    FakeS3.objects = {}
+    FakeS3.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeS3)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        endpoint = f"http://127.0.0.1:{server.server_address[1]}"
+        remote = cache.S3Backend(endpoint, "bucket", "key", "secret", prefix="ci/")
+
+        with tempfile.TemporaryDirectory() as temp:
+            temp = Path(temp)
+            created = []
+
+            def create():
+                created.append(True)
+                return write(temp / "first/videos/commands_1.mp4", "clip")
+
+            first = cache.ArtifactCache(
+                cache.LocalBackend(temp / "first-cache"), remote
+            )
+            first.cached("ab" * 32, temp / "first/videos/commands_1.mp4", create)
+            assert f"/bucket/ci/{'ab' * 32}" in FakeS3.objects
+
+            # Another machine, with an empty local cache.
+            second = cache.ArtifactCache(
+                cache.LocalBackend(temp / "second-cache"), remote
+            )
+            destination = temp / "second/videos/commands_1.mp4"
+            assert second.cached("ab" * 32, destination, create) == destination
+            assert read(destination) == "clip"
+            assert len(created) == 1
+            assert second.stats == {"local": 0, "remote": 1, "misses": 0}
+
+            # The remote hit was saved locally.
+            assert second.fetch("ab" * 32, temp / "third.mp4")
+            assert second.stats["local"] == 1
+
+            assert not second.fetch("cd" * 32, temp / "missing.mp4")
+            assert not (temp / "missing.mp4").exists()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_s3_backend_unavailable():
+    """
+    Making sure that a remote cache that can't be reached or doesn't
+    answer does not stop a render.
+    """
+    silent = socket.socket()
+    silent.bind(("127.0.0.1", 0))
+    silent.listen()
+    closed = socket.socket()
+    closed.bind(("127.0.0.1", 0))
+    closed_port = closed.getsockname()[1]
+    closed.close()
+
+    try:
+        for port in (silent.getsockname()[1], closed_port):
+            remote = cache.S3Backend(
+                f"http://127.0.0.1:{port}", "bucket", "key", "secret", timeout=0.2
+            )
+            with tempfile.TemporaryDirectory() as temp:
+                temp = Path(temp)
+                artifacts = cache.ArtifactCache(
+                    cache.LocalBackend(temp / "cache"), remote
+                )
+                destination = temp / "videos/commands_1.mp4"
+
+                created = artifacts.cached(
+                    "ef" * 32, destination, lambda: write(destination, "clip")
+                )
+                assert created == destination
+                assert artifacts.stats == {"local": 0, "remote": 0, "misses": 1}
+                assert artifacts.local.path_for("ef" * 32).exists()
+                assert not remote.get("ef" * 32, temp / "missing.mp4")
+    finally:
+        silent.close()
+
+
+def test_s3_backend_from_env(monkeypatch):
+    monkeypatch.setenv("GOODBOT_CACHE_S3_URL", "s3://artifacts/goodbot")
+    monkeypatch.setenv("GOODBOT_CACHE_S3_ENDPOINT", "http://localhost:9000/")
+    backend = cache.S3Backend.from_env()
+    assert backend.bucket == "artifacts"
+    assert backend.prefix == "goodbot/"
+    assert backend.endpoint == "http://localhost:9000"
+
+    monkeypatch.delenv("GOODBOT_CACHE_S3_URL")
+    assert cache.S3Backend.from_env() is None
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Testing functions from the `cast_index` module."""
+import shutil
+from pathlib import Path
+from goodbot import cast_index, terminal, timing
+
+SAMPLE_CAST = Path("./tests/examples/render-sample/scene_1/asciicasts/commands_2.cast")
+
+
+def test_build_index():
+    """
+    Testing that each event's line starts at its offset and that the
+    times match the events.
+    """
+    header, events = timing.read_asciicast(SAMPLE_CAST)
+    index = cast_index.build_index(SAMPLE_CAST)
+    assert index.header == header
+    assert index.times == [event[0] for event in events]
+    assert index.duration == events[-1][0]
+    data = SAMPLE_CAST.read_bytes()
+    assert index.size == len(data)
+    for offset in index.offsets:
+        assert data[offset : offset + 1] == b"["
+
+
+def test_events_until():
+    """
+    Making sure that only the events up to the given time are read.
+    """
+    _, events = timing.read_asciicast(SAMPLE_CAST)
+    index = cast_index.build_index(SAMPLE_CAST)
+    assert cast_index.events_until(SAMPLE_CAST, -1, index) == []
+    assert cast_index.events_until(SAMPLE_CAST, events[2][0], index) == events[:3]
+    assert cast_index.events_until(SAMPLE_CAST, index.duration + 1) == events
+
+
+def test_seek_from_keyframes(tmp_path):
+    """
+    Testing that seeking from the keyframes of a sidecar index gives
+    the same screen as replaying the recording from the start.
+    """
+    cast_path = tmp_path / SAMPLE_CAST.name
+    shutil.copy(SAMPLE_CAST, cast_path)
+    index_path = cast_index.write_index(cast_path, interval=0.5)
+    assert index_path == cast_index.index_path_for(cast_path)
+
+    index = cast_index.load_index(cast_path)
+    assert len(index.keyframes) >= 2
+    assert index.times == cast_index.build_index(cast_path).times
+    header, events = timing.read_asciicast(cast_path)
+    for time in [0, index.keyframes[1].time, index.keyframes[1].time + 0.1, 99]:
+        screen = terminal.Screen(header["width"], header["height"])
+        for event in cast_index.events_until(cast_path, time):
+            screen.feed(event[2])
+        seeked = cast_index.seek(cast_path, time, index)
+        assert seeked.text() == screen.text()
+        assert seeked.cursor == screen.cursor
+
+
+def test_load_outdated_index(tmp_path):
+    """
+    Making sure that a sidecar index is ignored once its asciicast
+    changed.
+    """
+    cast_path = tmp_path / SAMPLE_CAST.name
+    shutil.copy(SAMPLE_CAST, cast_path)
+    cast_index.write_index(cast_path, interval=0.5)
+    with open(cast_path, "a") as stream:
+        stream.write('[99.0, "o", "x"]\n')
+    index = cast_index.load_index(cast_path)
+    assert index.keyframes == ()
+    assert index.duration == 99.0
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""Testing functions from the `cast_render` module."""
+import tempfile
+import pytest
+from pathlib import Path
+from distutils.dir_util import copy_tree
+from goodbot import cast_render, render, timing
+
+SAMPLE_PROJECT = Path("./tests/examples/render-sample")
+
+
+def test_frame_events():
+    """
+    Testing that close events share a frame and that the first frame
+    is the empty screen.
+    """
+    events = [[0.5, "o", "a"], [0.51, "o", "b"], [0.7, "i", "x"], [3.0, "o", "c"]]
+    assert cast_render.frame_events(events) == [(0, []), (50, ["a", "b"]), (300, ["c"])]
+    assert cast_render.frame_events(events, idle_time_limit=1) == [
+        (0, []),
+        (50, ["a", "b"]),
+        (151, ["c"]),
+    ]
+    assert cast_render.frame_events([[0.01, "o", "a"], [0.02, "o", "b"]]) == [
+        (0, []),
+        (1, ["a", "b"]),
+    ]
+
+
+def test_render_project():
+    """
+    Making sure that a gif is created for each asciicast and that it
+    lasts as long as the recording.
+    """
+    pytest.importorskip("PIL")
+    with tempfile.TemporaryDirectory() as temp:
+        copy_tree(SAMPLE_PROJECT, temp)
+        casts = render.fetch_project_asciicasts(Path(temp))
+        gifs = cast_render.render_project(Path(temp), jobs=2)
+        assert len(gifs) == len(casts)
+        for gif_path in gifs:
+            cast_path = gif_path.parent.parent / "asciicasts" / f"{gif_path.stem}.cast"
+            _, events = timing.read_asciicast(cast_path)
+            last_frame = cast_render.frame_events(events)[-1][0]
+            assert render.gif_duration(gif_path) * 100 == pytest.approx(
+                last_frame + cast_render.MIN_DELAY
+            )
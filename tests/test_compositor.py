@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Testing functions from the `compositor` module."""
+import copy
+import numpy as np
+from goodbot import compositor, terminal
+
+
+class FakeGlyphs:
+    """Two by two glyphs: the top left pixel is set for every character."""
+
+    width = 2
+    height = 2
+
+    def mask(self, char, attributes=0):
+        if char == " ":
+            return (b"\x00\x00", b"\x00\x00")
+        return (b"\x01\x00", b"\x00\x00")
+
+
+def make_compositor(columns=4, rows=3):
+    screen = terminal.Screen(columns, rows)
+    atlas = compositor.GlyphAtlas(FakeGlyphs())
+    return screen, compositor.Compositor(screen, atlas)
+
+
+def test_update_changed_cells():
+    """
+    Testing that only the cells that changed are part of the region
+    returned after an update.
+    """
+    screen, canvas = make_compositor()
+    assert canvas.update() == (0, 0, 8, 6)
+    assert canvas.update() is None
+
+    # The character and the cursor's old and new positions.
+    screen.feed("a")
+    assert canvas.update() == (0, 0, 4, 2)
+    screen.feed("\x1b[3;3H")
+    assert canvas.update() == (2, 0, 4, 6)
+    assert canvas.region((0, 0, 2, 2)) == bytes(
+        [terminal.DEFAULT_FG, terminal.DEFAULT_BG] + [terminal.DEFAULT_BG] * 2
+    )
+
+
+def test_update_matches_full_redraw():
+    """
+    Making sure that a frame updated after scrolling, erasing and
+    switching screens is the same as a frame drawn from scratch.
+    """
+    screen, canvas = make_compositor(5, 3)
+    canvas.update()
+    for data in ["ab\r\ncd\r\n", "\x1b[31mef\r\ngh", "\x1b[2;1H\x1b[K", "\x1b[?1049h"]:
+        screen.feed(data)
+        canvas.update()
+        fresh = compositor.Compositor(copy.deepcopy(screen), canvas.atlas)
+        fresh.update()
+        assert np.array_equal(canvas.frame, fresh.frame)
+    screen.feed("\x1b[?1049l\x1b[1;1Hx")
+    canvas.update()
+    assert screen.text() == ["xd", "", "gh"]
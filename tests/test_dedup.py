@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Testing functions from the `dedup` module."""
+import tempfile
+from pathlib import Path
+from goodbot import dedup
+from goodbot.cache import ArtifactCache, LocalBackend
+
+
+def write(path, contents):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as stream:
+        stream.write(contents)
+    return path
+
+
+def test_instructions_key():
+    """
+    Making sure that the key only depends on the parsed instructions
+    and the environment, not on the formatting of the file.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        temp = Path(temp)
+        first = write(temp / "a.yaml", "commands:\n- ls\nexpect:\n- prompt\n")
+        second = write(temp / "b.yaml", "expect: [prompt]\ncommands: [ls]\n")
+        other = write(temp / "c.yaml", "commands:\n- ls -a\nexpect:\n- prompt\n")
+
+        assert dedup.instructions_key(first) == dedup.instructions_key(second)
+        assert dedup.instructions_key(first) != dedup.instructions_key(other)
+        assert dedup.instructions_key(first) != dedup.instructions_key(
+            first, {"docker": True}
+        )
+
+
+def test_store_records_once():
+    """
+    Making sure that identical blocks from two projects are recorded
+    once and that the report counts the reused recording.
+    """
+    recorded = []
+
+    def record(instructions_file):
+        recorded.append(instructions_file)
+        save_path = instructions_file.parent.parent / "asciicasts" / "commands_1.cast"
+        return write(save_path, f"recording of {instructions_file}")
+
+    with tempfile.TemporaryDirectory() as temp:
+        temp = Path(temp)
+        store = dedup.DedupStore(ArtifactCache(LocalBackend(temp / "store")))
+        instructions = "commands:\n- pip install goodbot\nexpect:\n- prompt\n"
+        first = write(temp / "first/scene_1/commands/commands_1.yaml", instructions)
+        second = write(temp / "second/scene_4/commands/commands_1.yaml", instructions)
+
+        first_cast, first_reused = store.record(first, record)
+        second_cast, second_reused = store.record(second, record)
+
+        assert recorded == [first]
+        assert (first_reused, second_reused) == (False, True)
+        assert second_cast == temp / "second/scene_4/asciicasts/commands_1.cast"
+        with open(second_cast, "r") as stream:
+            assert stream.read() == f"recording of {first}"
+        assert store.stats["recordings"] == {"created": 1, "reused": 1}
+        assert "Deduplicated 1 of 2 recordings." in store.report()
@@ -1,4 +1,5 @@
 import os
+import copy
 import sys
 import unittest
 import tempfile
@@ -413,3 +414,39 @@ def test_getting_same_result(commands, file_index):
         with open(new_file) as stream:
             read_file = stream.read()
         assert yaml.safe_load(read_file) == commands
+
+
+def test_update_project():
+    """
+    Making sure that only the elements that changed are written, that
+    their recordings are removed with the elements that were removed,
+    and that every other recording is kept.
+    """
+    parsed = funcmodule.config_parser(CONFIGPATH / "test_conf.yaml")
+    project_path = Path(tempfile.mkdtemp()) / "project"
+
+    changed, removed = funcmodule.update_project(parsed, project_path)
+    assert changed == set(funcmodule.expected_files(parsed))
+    assert not removed
+    assert (project_path / "scene_1" / "commands" / "commands_2.yaml").exists()
+    assert funcmodule.update_project(parsed, project_path) == (set(), set())
+
+    edited = copy.deepcopy(parsed)
+    edited[1][1]["commands"] = ["ls -l"]
+    edited[2][0]["read"] = "Here is another scene!"
+    edited[1].pop(0)
+    asciicasts = project_path / "scene_1" / "asciicasts"
+    for name in ("commands_1.cast", "commands_2.cast"):
+        (asciicasts / name).write_text("")
+    kept = project_path / "scene_3" / "asciicasts" / "commands_1.cast"
+    kept.write_text("")
+
+    assert funcmodule.update_project(edited, project_path) == (
+        {"scene_1/commands_1", "scene_1/read_1", "scene_2/read_1"},
+        {"scene_1/commands_2", "scene_1/read_2"},
+    )
+    assert not (project_path / "scene_1" / "commands" / "commands_2.yaml").exists()
+    assert not any(asciicasts.iterdir())
+    assert kept.exists()
+    written = project_path / "scene_1" / "commands" / "commands_1.yaml"
+    assert "ls -l" in written.read_text()
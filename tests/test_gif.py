@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""Testing functions from the `gif` module."""
+import random
+import pytest
+from goodbot import gif, render, terminal
+
+
+def test_changed_rectangle():
+    """
+    Testing that only the changed pixels are part of the rectangle.
+    """
+    before = bytes(20)
+    after = bytearray(before)
+    after[6] = after[13] = 1
+    assert gif.changed_rectangle(before, bytes(after), 5, 4) == (1, 1, 3, 2)
+    assert gif.changed_rectangle(before, before, 5, 4) is None
+    assert gif.changed_rectangle(None, before, 5, 4) == (0, 0, 5, 4)
+
+
+def test_gif_writer(tmp_path):
+    """
+    Making sure that decoders read the frames and delays that were
+    written, even when the LZW table is reset.
+    """
+    Image = pytest.importorskip("PIL.Image")
+    random.seed(0)
+    width, height = 120, 90
+    frames = [bytes(random.randrange(256) for _ in range(width * height))]
+    changed = bytearray(frames[0])
+    changed[500:520] = bytes(20)
+    frames.append(bytes(changed))
+    frames.append(bytes(changed))
+
+    gif_path = tmp_path / "test.gif"
+    with open(gif_path, "wb") as stream:
+        writer = gif.GifWriter(stream, width, height, terminal.PALETTE)
+        for frame in frames:
+            writer.add_frame(frame, 5)
+        writer.close()
+
+    # Identical frames are merged.
+    assert writer.frames == 2
+    assert render.gif_duration(gif_path) == 0.15
+    image = Image.open(gif_path)
+    for index, frame in enumerate(frames[:2]):
+        image.seek(index)
+        want = bytes(channel for pixel in frame for channel in terminal.PALETTE[pixel])
+        assert image.convert("RGB").tobytes() == want
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Testing functions from the `journal` module."""
+import os
+import tempfile
+from pathlib import Path
+from distutils.dir_util import copy_tree
+from goodbot import journal, render
+
+SAMPLE_PROJECT = Path("./tests/examples/render-sample")
+
+
+def test_record_and_is_complete():
+    """
+    Testing that a recorded clip is complete until one of its files
+    changes.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        copy_tree(SAMPLE_PROJECT, temp)
+        gif_and_audio = render.corresponding_audio(
+            Path(temp) / "scene_1/gifs/commands_1.gif"
+        )
+        video_path = render.clip_path(gif_and_audio[0])
+        video_path.parent.mkdir(exist_ok=True)
+
+        assert not journal.is_complete(gif_and_audio, video_path)
+        video_path.write_bytes(b"video")
+        assert not journal.is_complete(gif_and_audio, video_path)
+
+        journal.record(gif_and_audio, video_path)
+        assert journal.journal_path(Path(temp)).exists()
+        assert journal.is_complete(gif_and_audio, video_path)
+
+        with open(gif_and_audio[1], "ab") as stream:
+            stream.write(b"\0")
+        assert not journal.is_complete(gif_and_audio, video_path)
+
+        journal.record(gif_and_audio, video_path)
+        os.remove(video_path)
+        assert not journal.is_complete(gif_and_audio, video_path)
+
+
+def test_audio_times_ignored():
+    """
+    Testing that touching an audio file, like the artifact cache does
+    to the files it links, keeps its clip complete.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        copy_tree(SAMPLE_PROJECT, temp)
+        gif_and_audio = render.corresponding_audio(
+            Path(temp) / "scene_1/gifs/commands_1.gif"
+        )
+        video_path = render.clip_path(gif_and_audio[0])
+        video_path.parent.mkdir(exist_ok=True)
+        video_path.write_bytes(b"video")
+        journal.record(gif_and_audio, video_path)
+
+        os.utime(gif_and_audio[1], (0, 0))
+        assert journal.is_complete(gif_and_audio, video_path)
+
+
+def test_read_journal_missing():
+    """
+    Making sure that a project without a journal has no complete clips.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        assert journal.read_journal(Path(temp)) == {}
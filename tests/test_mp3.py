@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Testing functions from the `mp3` module."""
+import pytest
+from pathlib import Path
+from goodbot import mp3
+
+SAMPLE_AUDIO = Path("./tests/examples/render-sample/scene_1/audio/read_1.mp3")
+OTHER_AUDIO = Path("./tests/examples/render-sample/scene_1/audio/read_2.mp3")
+
+
+def read(path):
+    with open(path, "rb") as stream:
+        return stream.read()
+
+
+def id3v2_tag(size):
+    syncsafe = bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+    return b"ID3\x04\x00\x00" + syncsafe + bytes(size)
+
+
+def test_iter_frames():
+    """
+    Making sure that every frame of a Google TTS file is found and that
+    tags are skipped.
+    """
+    data = read(SAMPLE_AUDIO)
+    frames = list(mp3.iter_frames(data))
+
+    assert frames[0][0] == 0
+    assert sum(header.length for _, header in frames) == len(data)
+    assert frames[0][1].sample_rate == 24000
+
+    tagged = id3v2_tag(100) + data + b"TAG" + bytes(125)
+    assert mp3.audio_bounds(tagged) == (110, 110 + len(data))
+    assert mp3.duration(tagged) == pytest.approx(mp3.duration(data))
+
+
+def test_silence():
+    """
+    Testing that silent frames are valid frames of the same stream.
+    """
+    template = next(mp3.iter_frames(read(SAMPLE_AUDIO)))[1]
+    silent = mp3.silence(template, 0.48)
+    frames = list(mp3.iter_frames(silent))
+
+    assert len(frames) == 20
+    assert mp3.duration(silent) == pytest.approx(0.48)
+    assert all(header.sample_rate == template.sample_rate for _, header in frames)
+    assert mp3.silence(template, 0) == b""
+
+
+def test_concatenate():
+    """
+    Making sure that joined files last as long as their parts and their
+    pauses.
+    """
+    first, second = read(SAMPLE_AUDIO), read(OTHER_AUDIO)
+    joined = mp3.concatenate([id3v2_tag(20) + first, second], [0.24, 0.0])
+
+    assert joined.startswith(first)
+    assert joined.endswith(second)
+    assert mp3.duration(joined) == pytest.approx(
+        mp3.duration(first) + 0.24 + mp3.duration(second)
+    )
+
+    with pytest.raises(ValueError):
+        mp3.concatenate([first, b"not audio"])
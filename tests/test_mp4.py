@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Testing functions from the `mp4` module.
+
+The clips used by these tests are created from scratch with the
+`make_mp4()` helper, so that no encoder is required.
+"""
+import struct
+import tempfile
+import pytest
+from pathlib import Path
+from goodbot import mp4
+
+
+def box(box_type, *children):
+    payload = b"".join(children)
+    return struct.pack(">I4s", len(payload) + 8, box_type) + payload
+
+
+def full(version=0):
+    return struct.pack(">I", version << 24)
+
+
+def make_track(track_id, handler, timescale, samples, delta, offsets, stsd, edits=None):
+    count = len(samples)
+    duration = count * delta
+    tkhd = box(b"tkhd", full(), struct.pack(">IIIII", 0, 0, track_id, 0, duration * 1000 // timescale), bytes(60))
+    mdhd = box(b"mdhd", full(), struct.pack(">IIII", 0, 0, timescale, duration), bytes(4))
+    hdlr = box(b"hdlr", full(), bytes(4), handler, bytes(13))
+    stbl = box(
+        b"stbl",
+        box(b"stsd", stsd),
+        box(b"stts", full(), struct.pack(">III", 1, count, delta)),
+        box(b"stsc", full(), struct.pack(">IIII", 1, 1, 1, 1)),
+        box(b"stsz", full(), struct.pack(">II", 0, count), struct.pack(f">{count}I", *map(len, samples))),
+        box(b"stco", full(), struct.pack(">I", count), struct.pack(f">{count}I", *offsets)),
+    )
+    children = [tkhd]
+    if edits:
+        entries = b"".join(struct.pack(">Iihh", segment, media_time, 1, 0) for segment, media_time in edits)
+        children.append(box(b"edts", box(b"elst", full(), struct.pack(">I", len(edits)), entries)))
+    children.append(box(b"mdia", mdhd, hdlr, box(b"minf", stbl)))
+    return box(b"trak", *children)
+
+
+def make_mp4(path, tracks, movie_duration=None):
+    """Writes an mp4 file with one sample per chunk.
+
+    `tracks` is a list of `(handler, timescale, samples, delta, stsd)`.
+    The sample data is written to the `mdat` box after the `moov` box.
+    """
+    ftyp = box(b"ftyp", b"isom", bytes(4), b"isomiso2")
+
+    def build(mdat_start):
+        traks = []
+        position = mdat_start
+        longest = 0
+        for index, (handler, timescale, samples, delta, stsd) in enumerate(tracks):
+            offsets = []
+            for sample in samples:
+                offsets.append(position)
+                position += len(sample)
+            traks.append(make_track(index + 1, handler, timescale, samples, delta, offsets, stsd))
+            longest = max(longest, len(samples) * delta * 1000 // timescale)
+        mvhd = box(b"mvhd", full(), struct.pack(">IIII", 0, 0, 1000, movie_duration or longest), bytes(80))
+        return box(b"moov", mvhd, *traks)
+
+    moov_size = len(build(0))
+    moov = build(len(ftyp) + moov_size + 8)
+    data = b"".join(sample for track in tracks for sample in track[2])
+    with open(path, "wb") as stream:
+        stream.write(ftyp + moov + box(b"mdat", data))
+    return path
+
+
+def read_samples(path, handler):
+    """Reads every sample of a track using its sample tables."""
+    with open(path, "rb") as stream:
+        data = stream.read()
+    for box_type, start, end in mp4.iter_boxes(data, 0, len(data)):
+        if box_type == b"moov":
+            moov = mp4.parse_box(box_type, data, start, end)
+    for trak in moov.find_all(b"trak"):
+        track = mp4._Track(trak)
+        if track.handler == handler:
+            samples = [
+                data[offset : offset + size]
+                for offset, size in zip(track.chunk_offsets, track.sample_sizes)
+            ]
+            return track, samples
+
+
+VIDEO_STSD = full() + struct.pack(">I", 1) + box(b"avc1", bytes(8))
+AUDIO_STSD = full() + struct.pack(">I", 1) + box(b"mp4a", bytes(8))
+
+
+def test_concatenate_samples():
+    """
+    Making sure that every sample of every clip ends up in the output,
+    in order, with rewritten offsets.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        temp = Path(temp)
+        first = make_mp4(temp / "commands_1.mp4", [
+            (b"vide", 25, [b"v1a", b"v1bb", b"v1ccc"], 1, VIDEO_STSD),
+            (b"soun", 100, [b"a1a", b"a1b"], 6, AUDIO_STSD),
+        ])
+        second = make_mp4(temp / "commands_2.mp4", [
+            (b"vide", 25, [b"v2a", b"v2b"], 1, VIDEO_STSD),
+            (b"soun", 100, [b"a2a"], 8, AUDIO_STSD),
+        ])
+        output = mp4.concatenate([first, second], temp / "final.mp4")
+
+        video, video_samples = read_samples(output, b"vide")
+        audio, audio_samples = read_samples(output, b"soun")
+
+        assert video_samples == [b"v1a", b"v1bb", b"v1ccc", b"v2a", b"v2b"]
+        assert audio_samples == [b"a1a", b"a1b", b"a2a"]
+        assert video.media_duration == 5
+        assert audio.media_duration == 20
+
+
+def test_concatenate_keeps_sync():
+    """
+    Testing that a clip with a shorter audio track, or no audio track at
+    all, is padded with an empty edit so that the next clip starts in
+    sync.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        temp = Path(temp)
+        # 200ms of video, 120ms of audio.
+        first = make_mp4(temp / "commands_1.mp4", [
+            (b"vide", 25, [b"a", b"b", b"c", b"d", b"e"], 1, VIDEO_STSD),
+            (b"soun", 100, [b"x", b"y"], 6, AUDIO_STSD),
+        ])
+        # No audio at all, 80ms of video.
+        second = make_mp4(temp / "commands_2.mp4", [
+            (b"vide", 25, [b"f", b"g"], 1, VIDEO_STSD),
+        ])
+        third = make_mp4(temp / "commands_3.mp4", [
+            (b"vide", 25, [b"h"], 1, VIDEO_STSD),
+            (b"soun", 100, [b"z"], 4, AUDIO_STSD),
+        ])
+        output = mp4.concatenate([first, second, third], temp / "final.mp4")
+        audio, samples = read_samples(output, b"soun")
+
+        assert samples == [b"x", b"y", b"z"]
+        # 120ms of audio, 80 + 80ms of silence then the third clip.
+        assert [(segment, media_time) for segment, media_time, _ in audio.edits] == [
+            (120, 0),
+            (160, -1),
+            (40, 12),
+        ]
+        video, _ = read_samples(output, b"vide")
+        assert [(segment, media_time) for segment, media_time, _ in video.edits] == [(320, 0)]
+
+
+def test_concatenate_incompatible():
+    """
+    Making sure that clips encoded with different settings are refused
+    with a `ValueError`.
+    """
+    other_stsd = full() + struct.pack(">I", 1) + box(b"hev1", bytes(8))
+    with tempfile.TemporaryDirectory() as temp:
+        temp = Path(temp)
+        first = make_mp4(temp / "commands_1.mp4", [(b"vide", 25, [b"a"], 1, VIDEO_STSD)])
+        second = make_mp4(temp / "commands_2.mp4", [(b"vide", 25, [b"b"], 1, other_stsd)])
+
+        with pytest.raises(ValueError):
+            mp4.concatenate([first, second], temp / "final.mp4")
+
+        with open(temp / "broken.mp4", "wb") as stream:
+            stream.write(b"not an mp4 file")
+
+        with pytest.raises(ValueError):
+            mp4.concatenate([first, temp / "broken.mp4"], temp / "final.mp4")
+
+        with open(temp / "truncated.mp4", "wb") as stream:
+            stream.write(box(b"moov", box(b"mvhd", full(), bytes(4))))
+
+        with pytest.raises(ValueError):
+            mp4.concatenate([first, temp / "truncated.mp4"], temp / "final.mp4")
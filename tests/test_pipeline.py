@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""Testing functions from the `pipeline` module."""
+import shutil
+import tempfile
+import threading
+import time
+import pytest
+from pathlib import Path
+from goodbot import journal, pipeline
+
+SAMPLE_ASCIICAST = Path("./tests/examples/video/scene_1/asciicasts/commands_1.cast")
+
+
+def make_project(root: Path) -> Path:
+    """Creates a small project with two scenes.
+
+    Scene 1 contains two commands with narration. Scene 2 contains
+    one command without narration.
+    """
+    project = root / "project"
+    for scene, elements, reads in (("scene_1", 2, 2), ("scene_2", 1, 0)):
+        for directory in ("commands", "read", "asciicasts", "gifs", "audio", "videos"):
+            (project / scene / directory).mkdir(parents=True)
+        for index in range(elements):
+            with open(project / scene / f"commands/commands_{index + 1}.yaml", "w") as stream:
+                stream.write("commands:\n- ls\nexpect:\n- prompt\n")
+        for index in range(reads):
+            with open(project / scene / f"read/read_{index + 1}.txt", "w") as stream:
+                stream.write("Hello, world.")
+    return project
+
+
+def test_run_graph_respects_dependencies():
+    """
+    Making sure that a task only starts once each of its dependencies
+    is complete.
+    """
+    finished = []
+
+    def action(name):
+        def run():
+            time.sleep(0.01)
+            finished.append(name)
+            return name
+
+        return run
+
+    tasks = [
+        pipeline.Task("c", action("c"), "cpu", ["a", "b"]),
+        pipeline.Task("a", action("a"), "cpu"),
+        pipeline.Task("b", action("b"), "network", ["a"]),
+    ]
+    summary = pipeline.run_graph(tasks)
+
+    assert finished == ["a", "b", "c"]
+    assert [task.result for task in tasks] == ["c", "a", "b"]
+    assert summary["tasks"] == 3
+
+
+def test_run_graph_respects_limits():
+    """
+    Testing that no more than the allowed amount of tasks of a resource
+    class run at the same time.
+    """
+    lock = threading.Lock()
+    running = {"now": 0, "max": 0}
+
+    def action():
+        with lock:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+        time.sleep(0.02)
+        with lock:
+            running["now"] -= 1
+
+    tasks = [pipeline.Task(f"task_{i}", action, "cpu") for i in range(8)]
+    pipeline.run_graph(tasks, {"cpu": 3})
+
+    assert running["max"] == 3
+
+
+def test_run_graph_raises():
+    """
+    Making sure that a failing task stops the graph and that its error
+    is raised again.
+    """
+    ran = []
+
+    def fail():
+        raise RuntimeError("boom")
+
+    tasks = [
+        pipeline.Task("fail", fail, "cpu"),
+        pipeline.Task("after", lambda: ran.append("after"), "cpu", ["fail"]),
+    ]
+
+    with pytest.raises(RuntimeError):
+        pipeline.run_graph(tasks)
+
+    assert not ran
+
+
+def test_check_graph_errors():
+    """
+    Testing that invalid graphs are refused before anything runs.
+    """
+    limits = dict(pipeline.DEFAULT_RESOURCE_LIMITS)
+    test_cases = [
+        [pipeline.Task("a", print, "cpu", ["b"]), pipeline.Task("b", print, "cpu", ["a"])],
+        [pipeline.Task("a", print, "cpu", ["missing"])],
+        [pipeline.Task("a", print, "cpu"), pipeline.Task("a", print, "cpu")],
+        [pipeline.Task("a", print, "gpu")],
+    ]
+
+    for tasks in test_cases:
+        with pytest.raises(ValueError):
+            pipeline.check_graph(tasks, limits)
+
+
+def test_build_project_graph():
+    """
+    Making sure that each clip depends on its own recording and audio
+    and that the final video depends on every clip.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        project = make_project(Path(temp))
+        tasks = {task.name: task for task in pipeline.build_project_graph(project)}
+
+        assert tasks["clip:scene_1/commands_1"].dependencies == [
+            "gif:scene_1/commands_1",
+            "tts:scene_1/read_1",
+        ]
+        assert tasks["clip:scene_2/commands_1"].dependencies == ["gif:scene_2/commands_1"]
+        assert tasks["gif:scene_1/commands_2"].dependencies == ["record:scene_1/commands_2"]
+        # Recordings are chained in script order inside a scene.
+        assert tasks["record:scene_1/commands_2"].dependencies == ["record:scene_1/commands_1"]
+        assert tasks["record:scene_2/commands_1"].dependencies == []
+        assert sorted(tasks["final"].dependencies) == [
+            "clip:scene_1/commands_1",
+            "clip:scene_1/commands_2",
+            "clip:scene_2/commands_1",
+        ]
+        pipeline.check_graph(list(tasks.values()), pipeline.DEFAULT_RESOURCE_LIMITS)
+
+
+def test_gif_task():
+    """
+    Making sure that gifs are rendered in-process, without
+    `asciicast2gif`.
+    """
+    pytest.importorskip("PIL")
+    with tempfile.TemporaryDirectory() as temp:
+        project = make_project(Path(temp))
+        shutil.copy(SAMPLE_ASCIICAST, project / "scene_2/asciicasts/commands_1.cast")
+        tasks = {task.name: task for task in pipeline.build_project_graph(project)}
+
+        gif_path = tasks["gif:scene_2/commands_1"].action()
+        assert gif_path == project / "scene_2/gifs/commands_1.gif"
+        assert gif_path.read_bytes().startswith(b"GIF89a")
+
+
+def test_build_project_graph_fit():
+    """
+    Testing that narrated recordings are fitted to their audio before
+    being converted to gifs.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        project = make_project(Path(temp))
+        tasks = {
+            task.name: task
+            for task in pipeline.build_project_graph(project, fit=True)
+        }
+
+        assert tasks["fit:scene_1/commands_1"].dependencies == [
+            "record:scene_1/commands_1",
+            "tts:scene_1/read_1",
+        ]
+        assert tasks["gif:scene_1/commands_1"].dependencies == ["fit:scene_1/commands_1"]
+        assert "fit:scene_2/commands_1" not in tasks
+        assert tasks["gif:scene_2/commands_1"].dependencies == ["record:scene_2/commands_1"]
+
+
+def test_build_project_graph_resume():
+    """
+    Testing that scenes whose clips were all rendered are not recorded
+    again when resuming.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        project = make_project(Path(temp))
+        gif_and_audio = (project / "scene_2/gifs/commands_1.gif", None)
+        gif_and_audio[0].write_bytes(b"GIF89a")
+        video_path = project / "scene_2/videos/commands_1.mp4"
+        video_path.write_bytes(b"video")
+        journal.record(gif_and_audio, video_path)
+
+        tasks = {
+            task.name: task
+            for task in pipeline.build_project_graph(project, resume=True)
+        }
+
+        assert "record:scene_2/commands_1" not in tasks
+        assert "gif:scene_2/commands_1" not in tasks
+        assert tasks["clip:scene_2/commands_1"].dependencies == []
+        assert "record:scene_1/commands_1" in tasks
+        assert "clip:scene_2/commands_1" in tasks["final"].dependencies
+        # The clip is not rendered again.
+        assert tasks["clip:scene_2/commands_1"].action() == video_path
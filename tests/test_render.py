@@ -5,9 +5,11 @@ import tempfile
 import subprocess
 import pytest
 import os
+import sys
+import json
 import shutil
 from distutils.dir_util import copy_tree
-from goodbot import render
+from goodbot import gif, render
 
 Path = pathlib.Path
 
@@ -208,6 +210,79 @@ def test_remove_first_frame():
     assert want == got
 
 
+@pytest.mark.skipif(
+    not (shutil.which("ffmpeg") and shutil.which("gifsicle")),
+    reason="Requires ffmpeg and gifsicle.",
+)
+def test_skip_first_frame():
+    """
+    Testing that dropping the first frame while encoding gives the same
+    frames, at the same times, as removing it from the gif first.
+    """
+
+    def frame_hashes(gif_path, video_filters):
+        output = subprocess.run(
+            [
+                "ffmpeg",
+                "-loglevel",
+                "error",
+                "-i",
+                str(gif_path),
+                "-vf",
+                video_filters,
+                "-pix_fmt",
+                "rgb24",
+                "-f",
+                "framemd5",
+                "-",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        return [line for line in output.splitlines() if not line.startswith("#")]
+
+    with tempfile.TemporaryDirectory() as temp:
+        gif_path = Path(temp) / "commands_1.gif"
+        shutil.copy(SAMPLE_PROJECT / "test-rm-frame/commands_1.gif", gif_path)
+        edited = render.remove_first_frame(gif_path)
+        want = frame_hashes(edited, "null")
+        got = frame_hashes(gif_path, render.SKIP_FIRST_FRAME)
+    assert want
+    assert want == got
+
+
+def test_gif_duration():
+    """
+    Making sure that gif_duration sums the delay of each frame.
+    """
+    assert render.gif_duration(SAMPLE_PROJECT / "scene_1/gifs/commands_1.gif") == 5.11
+    assert render.gif_duration(SAMPLE_PROJECT / "scene_1/gifs/commands_2.gif") == 2.3
+    assert (
+        render.gif_duration(SAMPLE_PROJECT / "scene_1/gifs/commands_2.gif", 1) == 2.1
+    )
+    with pytest.raises(ValueError):
+        render.gif_duration(SAMPLE_PROJECT / "scene_1/audio/read_1.mp3")
+
+
+def test_clip_timing():
+    """
+    Testing that the shortest of the gif and the audio is padded.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        copy_tree(SAMPLE_PROJECT, temp)
+        gif_path, audio_path = render.corresponding_audio(
+            Path(temp) / "scene_1/gifs/commands_2.gif"
+        )
+        timing = render.clip_timing(gif_path, audio_path)
+        # The first frame is not part of the clip.
+        assert timing["video"] == 2.1
+        assert timing["duration"] == max(timing["video"], timing["audio"])
+        assert timing["video_padding"] + timing["video"] == timing["duration"]
+        assert timing["audio_padding"] + timing["audio"] == timing["duration"]
+        assert (Path(temp) / "audio_index.json").exists()
+
+
 def test_render_function():
     """
     Testing that the function render properly creates a new video.
@@ -221,6 +296,146 @@ def test_render_function():
         assert created
 
 
+def test_ffmpeg_command():
+    """
+    Making sure that a single `ffmpeg` command renders every clip of a
+    scene, each from its own inputs and to its own file.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        copy_tree(SAMPLE_PROJECT, temp)
+        matches = render.link_audio(Path(temp) / "scene_1")
+        clips = [(match, render.clip_path(match[0])) for match in matches]
+        command = render.ffmpeg_command(clips)
+
+        inputs = [command[i + 1] for i, arg in enumerate(command) if arg == "-i"]
+        assert inputs == [str(path) for match in matches for path in match]
+        graph = command[command.index("-filter_complex") + 1]
+        for label in range(len(clips)):
+            assert f"[{2 * label}:v]" in graph and f"[{2 * label + 1}:a]" in graph
+            assert command.count(f"[v{label}]") == command.count(f"[a{label}]") == 1
+        assert command[-1] == str(clips[-1][1])
+        assert [arg for arg in command if arg.endswith(".mp4")] == [
+            str(output_path) for _, output_path in clips
+        ]
+
+        threaded = render.ffmpeg_command(clips, threads=2)
+        assert threaded.count("-threads") == len(clips)
+        assert threaded[threaded.index("-filter_complex_threads") + 1] == "2"
+
+
+def test_plan_render():
+    """
+    Testing that many small batches run side by side with a thread each,
+    that a few large batches get every core, and that the budget is
+    never exceeded.
+    """
+    small = render.PIXELS_PER_THREAD // 2
+    large = render.PIXELS_PER_THREAD * 16
+    assert render.plan_render([small] * 20, 8) == {"processes": 8, "threads": 1}
+    assert render.plan_render([large], 8) == {"processes": 1, "threads": 8}
+    assert render.plan_render([large] * 2, 8) == {"processes": 1, "threads": 8}
+    assert render.plan_render([small] * 3, 8) == {"processes": 3, "threads": 2}
+    assert render.plan_render([], 4) == {"processes": 1, "threads": 4}
+    for batches in ([small] * 5 + [large] * 2, [large * 4] * 7, [1] * 100):
+        plan = render.plan_render(batches, 6)
+        assert plan["processes"] * plan["threads"] <= 6
+
+
+def test_fit_memory():
+    """
+    Testing that the lookahead, the threads and the amount of clips per
+    process are lowered until the encoders fit under the ceiling.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        copy_tree(SAMPLE_PROJECT, temp)
+        matches = render.link_audio(Path(temp) / "scene_1")
+        clips = [(match, render.clip_path(match[0])) for match in matches]
+        plan = {"processes": 4, "threads": 2}
+
+        batches, fitted = render.fit_memory([clips], plan, 1024**4)
+        assert batches == [clips]
+        assert fitted == {**plan, "processes": 1, "lookahead": 40}
+
+        limit = render.PROCESS_MEMORY + max(
+            render.clip_memory(match, threads=1, lookahead=0) for match in matches
+        )
+        batches, fitted = render.fit_memory([clips], plan, limit)
+        assert fitted == {"processes": 1, "threads": 1, "lookahead": 0}
+        assert len(batches) == len(clips)
+        assert [clip for batch in batches for clip in batch] == clips
+
+
+@pytest.mark.parametrize("encoder", render.ENCODER_BACKENDS)
+def test_memory_ceiling(encoder):
+    """
+    Rendering a recording whose frames take more than 2 GB once decoded,
+    and making sure that the encoder stays under the memory limit.
+    """
+    if encoder == "ffmpeg" and not shutil.which("ffmpeg"):
+        pytest.skip("Requires ffmpeg.")
+    if encoder == "pyav":
+        pytest.importorskip("av")
+    width, height, frames = 1920, 1080, 360
+    assert 3 * width * height * frames > 2 * 1024**3
+    limit = 300 * 1024**2
+
+    with tempfile.TemporaryDirectory() as temp:
+        gifs = Path(temp) / "scene_1" / "gifs"
+        gifs.mkdir(parents=True)
+        with open(gifs / "commands_1.gif", "wb") as stream:
+            writer = gif.GifWriter(
+                stream, width, height, [(value,) * 3 for value in range(256)]
+            )
+            writer.add_region((0, 0, width, height), bytes(width * height), 2)
+            for index in range(frames):
+                corner = (index * 16) % (height - 16)
+                writer.add_region(
+                    (corner, corner, 16, 16), bytes([index % 256]) * 256, 2
+                )
+            writer.close()
+
+        # In a new process, so that the memory used by other tests is
+        # not counted.
+        script = (
+            "import json, pathlib\n"
+            "from goodbot import render\n"
+            f"render.render_all(pathlib.Path({temp!r}), encoder={encoder!r}, "
+            f"memory_limit={limit})\n"
+            "print(json.dumps(render.peak_memory()))\n"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", script], capture_output=True, text=True, check=True
+        ).stdout
+        peak = json.loads(output.splitlines()[-1])
+
+        assert (Path(temp) / "scene_1" / "videos" / "commands_1.mp4").exists()
+    assert peak["children" if encoder == "ffmpeg" else "self"] < limit
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Linux only.")
+def test_peak_memory():
+    """
+    Making sure that a process started by a larger one only counts its
+    own memory.
+    """
+    ballast = bytearray(256 * 1024**2)
+    ballast[::4096] = b"x" * len(ballast[::4096])
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import json\n"
+            "from goodbot import render\n"
+            "print(json.dumps(render.peak_memory()))\n",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    del ballast
+    assert json.loads(output)["self"] < 128 * 1024**2
+
+
 def test_render_all():
     """
     Testing that render_all creates every video required.
@@ -318,3 +533,25 @@ def test_render_final():
         render.render_all(Path(temp))
         render.render_final(Path(temp))
         assert (Path(temp) / "final/final.mp4").exists()
+
+
+def test_draft_clips():
+    """
+    Making sure that draft clips are saved and sorted apart from the
+    other clips, and cached under their own key.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        copy_tree(SAMPLE_PROJECT, temp)
+        temp = Path(temp)
+        gif_path = temp / "scene_1" / "gifs" / "commands_1.gif"
+        draft_path = render.clip_path(gif_path, draft=True)
+        assert draft_path == temp / "scene_1" / "drafts" / "commands_1.mp4"
+        assert draft_path != render.clip_path(gif_path)
+
+        gif_and_audio = render.corresponding_audio(gif_path)
+        assert render.clip_key(gif_and_audio) == render.clip_key(gif_and_audio)
+        assert render.clip_key(gif_and_audio, True) != render.clip_key(gif_and_audio)
+
+        draft_path.parent.mkdir()
+        draft_path.write_bytes(b"")
+        assert render.sort_videos(temp, draft=True) == [draft_path]
@@ -3,7 +3,7 @@ import os
 import shutil
 from distutils.dir_util import copy_tree
 from pathlib import Path
-from goodbot import shell_commands, render
+from goodbot import shell_commands, render, workdir
 from tests.test_funcs import PROJECT_PATH, PARSED
 
 VIDEO_TEST_DIR = Path("./tests/examples/video")
@@ -69,3 +69,31 @@ def test_record_commands():
         # recordings
         for asciicast in all_asciicasts:
             assert asciicast in rerecorded
+
+
+def test_record_command_environment(monkeypatch):
+    """
+    Testing that the recording is written to the work directory, while
+    the recorded session keeps the user's environment.
+    """
+    calls = []
+
+    def run(command, **kwargs):
+        calls.append(kwargs)
+        recording_path = Path(command[-1])
+        assert recording_path.parent.parent == workdir.work_dir()
+        recording_path.write_text("recording")
+
+    monkeypatch.setattr(shell_commands.subprocess, "run", run)
+    with tempfile.TemporaryDirectory() as temp:
+        workdir.set_work_dir(Path(temp) / "work")
+        instructions = Path(temp) / "scene_1" / "commands" / "commands_1.yaml"
+        instructions.parent.mkdir(parents=True)
+        (Path(temp) / "scene_1" / "asciicasts").mkdir()
+        instructions.write_text("- echo Hello\n")
+
+        save_path = shell_commands.record_command(instructions)
+        workdir.set_work_dir(None)
+
+        assert save_path.read_text() == "recording"
+    assert "env" not in calls[0]
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""Testing functions from the `shell_pool` and `pool_worker` modules."""
+import os
+import json
+import time
+import shlex
+import tempfile
+import threading
+import pytest
+from pathlib import Path
+from goodbot import shell_pool, pool_worker
+
+SAMPLE_ASCIICAST = Path("./tests/examples/video/scene_1/asciicasts/commands_1.cast")
+
+
+def read_events(path):
+    with open(path, "r") as stream:
+        header = json.loads(stream.readline())
+        return header, [json.loads(line) for line in stream if line.strip()]
+
+
+class FakeAsciinema:
+    """Runs the worker of a session in a thread instead of `asciinema rec`."""
+
+    def __init__(self, command, **kwargs):
+        fifo_path, ready_path = shlex.split(command[4])[-2:]
+        self.asciicast_path = Path(command[5])
+        self.code = None
+        self.thread = threading.Thread(
+            target=self.run, args=(fifo_path, ready_path), daemon=True
+        )
+        self.thread.start()
+
+    def run(self, fifo_path, ready_path):
+        # Importing the runner program takes a while.
+        time.sleep(0.05)
+        self.code = pool_worker.main([fifo_path, ready_path])
+        with open(self.asciicast_path, "w") as stream:
+            stream.write(json.dumps({"version": 2, "width": 80, "height": 24}) + "\n")
+            stream.write(json.dumps([0.1, "o", "$ "]) + "\n")
+
+    def poll(self):
+        return None if self.thread.is_alive() else self.code
+
+    def wait(self, timeout=None):
+        self.thread.join(timeout)
+        return self.code
+
+    def kill(self):
+        pass
+
+
+@pytest.fixture
+def fake_sessions(monkeypatch):
+    """Replaces Asciinema and the runner program. Yields the runner calls."""
+    received = []
+
+    def fake_runner():
+        import sys
+
+        received.append(list(sys.argv))
+
+    monkeypatch.setattr(pool_worker, "load_runner", lambda: fake_runner)
+    monkeypatch.setattr(shell_pool.subprocess, "Popen", FakeAsciinema)
+    yield received
+
+
+def test_trim_asciicast():
+    """
+    Making sure that trim_asciicast moves every event earlier by the
+    idle time, without going below zero.
+    """
+    original_header, original = read_events(SAMPLE_ASCIICAST)
+
+    with tempfile.TemporaryDirectory() as temp:
+        trimmed_path = Path(temp) / "commands_1.cast"
+
+        shell_pool.trim_asciicast(SAMPLE_ASCIICAST, trimmed_path, 0.2)
+        header, trimmed = read_events(trimmed_path)
+        assert header["width"] == original_header["width"]
+        assert len(trimmed) == len(original)
+        for before, after in zip(original, trimmed):
+            assert after[0] == pytest.approx(before[0] - 0.2)
+            assert after[1:] == before[1:]
+
+        # The idle time is longer than the time before the first event.
+        shell_pool.trim_asciicast(SAMPLE_ASCIICAST, trimmed_path, 60)
+        _, trimmed = read_events(trimmed_path)
+        assert trimmed[0][0] == 0
+        assert trimmed[-1][0] == pytest.approx(original[-1][0] - original[0][0])
+
+
+def test_recording_pool_size():
+    """
+    Testing that a pool can't be created without sessions.
+    """
+    with pytest.raises(ValueError):
+        shell_pool.RecordingPool(0)
+
+
+def test_close_pool(fake_sessions):
+    """
+    Making sure that idle sessions exit without running the runner
+    program when the pool is closed.
+    """
+    with shell_pool.RecordingPool(2) as pool:
+        for session in pool._sessions:
+            session.wait_ready()
+        processes = [session.process for session in pool._sessions]
+
+    assert fake_sessions == []
+    assert all(process.code == 0 for process in processes)
+
+
+def test_pool_summary(fake_sessions):
+    """
+    Testing that the startup time of each session is part of the
+    summary.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        commands_path = Path(temp) / "scene_1" / "commands"
+        commands_path.mkdir(parents=True)
+        (commands_path.parent / "asciicasts").mkdir()
+        instructions = commands_path / "commands_1.yaml"
+        instructions.touch()
+
+        with shell_pool.RecordingPool(1) as pool:
+            # The session is ready before the element is recorded.
+            time.sleep(0.2)
+            saved_path = pool.record(instructions)
+            summary = pool.summary()
+
+        assert saved_path == commands_path.parent / "asciicasts" / "commands_1.cast"
+        assert saved_path.exists()
+        assert fake_sessions == [["runner", str(instructions)]]
+        assert summary["elements"] == 1
+        assert summary["startup"] > 0
+        assert summary["saved"] > 0
+        assert summary["saved"] == pytest.approx(
+            summary["startup"] - pool.stats[0]["waited"]
+        )
+        assert summary["saved_per_element"] == summary["saved"]
+
+
+def test_pool_worker(monkeypatch):
+    """
+    Making sure that the worker signals that it is ready and then runs
+    the runner program with the arguments sent through the pipe.
+    """
+    received = []
+
+    def fake_runner():
+        import sys
+
+        received.append(list(sys.argv))
+
+    monkeypatch.setattr(pool_worker, "load_runner", lambda: fake_runner)
+
+    with tempfile.TemporaryDirectory() as temp:
+        fifo_path = Path(temp) / "instructions"
+        ready_path = Path(temp) / "ready"
+        os.mkfifo(fifo_path)
+        result = {}
+        worker = threading.Thread(
+            target=lambda: result.update(code=pool_worker.main([str(fifo_path), str(ready_path)]))
+        )
+        worker.start()
+        with open(fifo_path, "w") as stream:
+            stream.write(json.dumps(["--no-docker", "commands_1.yaml"]) + "\n")
+        worker.join(timeout=5)
+
+        assert ready_path.exists()
+        assert result["code"] == 0
+        assert received == [["runner", "--no-docker", "commands_1.yaml"]]
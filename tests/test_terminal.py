@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""Testing functions from the `terminal` module."""
+from goodbot import terminal
+
+
+def test_feed_text():
+    """
+    Testing that text, carriage returns and line feeds move the cursor
+    like a terminal.
+    """
+    screen = terminal.Screen(10, 3)
+    screen.feed("hello\r\nworld")
+    assert screen.text() == ["hello", "world", ""]
+    assert screen.cursor == (1, 5)
+
+
+def test_wrap_and_scroll():
+    """
+    Making sure that long lines wrap and that the screen scrolls once
+    the cursor reaches the last row.
+    """
+    screen = terminal.Screen(4, 2)
+    screen.feed("abcdefgh")
+    assert screen.text() == ["abcd", "efgh"]
+    screen.feed("i")
+    assert screen.text() == ["efgh", "i"]
+
+
+def test_split_escape_sequences():
+    """
+    Testing that escape sequences split between events are still
+    interpreted.
+    """
+    screen = terminal.Screen(10, 3)
+    screen.feed("abc\x1b[")
+    screen.feed("2;2Hx\x1b]0;title\x07")
+    assert screen.text() == ["abc", " x", ""]
+
+
+def test_erase():
+    """
+    Testing the erase in line and erase in display sequences.
+    """
+    screen = terminal.Screen(6, 3)
+    screen.feed("aaaaaa\r\nbbbbbb\r\ncccccc\x1b[2;3H")
+    screen.feed("\x1b[K")
+    assert screen.text() == ["aaaaaa", "bb", "cccccc"]
+    screen.feed("\x1b[1J")
+    assert screen.text() == ["", "", "cccccc"]
+    screen.feed("\x1b[2J")
+    assert screen.text() == ["", "", ""]
+
+
+def test_scrolling_region():
+    """
+    Making sure that only the scrolling region moves.
+    """
+    screen = terminal.Screen(3, 4)
+    screen.feed("1\r\n2\r\n3\r\n4\x1b[2;3r\x1b[3;1H\n")
+    assert screen.text() == ["1", "3", "", "4"]
+
+
+def test_alternate_screen():
+    """
+    Testing that the main screen is restored after a program uses the
+    alternate screen.
+    """
+    screen = terminal.Screen(5, 2)
+    screen.feed("main\x1b[?1049h")
+    assert screen.text() == ["", ""]
+    screen.feed("alt\x1b[?1049l")
+    assert screen.text() == ["main", ""]
+
+
+def test_colors():
+    """
+    Testing that colors are saved per cell and that bold text uses
+    bright colors.
+    """
+    screen = terminal.Screen(5, 1)
+    screen.feed("\x1b[1;31ma\x1b[0;38;5;200;48;2;255;255;255mb\x1b[0mc\x1b[?25l")
+    assert screen.display_cell(0, 0) == ("a", 9, terminal.DEFAULT_BG, terminal.BOLD)
+    assert screen.display_cell(0, 1) == ("b", 200, 231, 0)
+    assert screen.cell(0, 2) == ("c", terminal.DEFAULT_FG, terminal.DEFAULT_BG, 0)
+
+
+def test_cursor_reverse():
+    """
+    Making sure that the cursor is drawn in reverse video.
+    """
+    screen = terminal.Screen(5, 1)
+    assert screen.display_cell(0, 0)[1:3] == (terminal.DEFAULT_BG, terminal.DEFAULT_FG)
+    screen.feed("\x1b[?25l")
+    assert screen.display_cell(0, 0)[1:3] == (terminal.DEFAULT_FG, terminal.DEFAULT_BG)
+
+
+def test_insert_and_delete_characters():
+    """
+    Testing that inserting, deleting and erasing characters shifts the
+    rest of the row.
+    """
+    screen = terminal.Screen(6, 1)
+    screen.feed("abcdef\x1b[1;3H\x1b[2@")
+    assert screen.text() == ["ab  cd"]
+    screen.feed("\x1b[3P")
+    assert screen.text() == ["abd"]
+    screen.feed("\x1b[1;1H\x1b[2X")
+    assert screen.text() == ["  d"]
+
+
+def test_display_rows():
+    """
+    Making sure that resolving whole rows gives the same cells as
+    resolving them one by one.
+    """
+    screen = terminal.Screen(8, 3)
+    screen.feed("\x1b[1;33mab\x1b[7mcd\x1b[0m\r\n\x1b[4;44mef\x1b[2;4H")
+    cells = screen.display_rows([0, 1, 2])
+    for row in range(3):
+        for column in range(8):
+            char, fg, bg, attributes = cells[row, column].item()
+            want = screen.display_cell(row, column)
+            assert (chr(char), fg, bg, attributes) == want
+
+
+def test_state():
+    """
+    Testing that a restored screen interprets the rest of the output
+    like the screen it was saved from.
+    """
+    screen = terminal.Screen(6, 3)
+    screen.feed("main\x1b[?1049h\x1b[1;31malt\x1b[2;3r\x1b[")
+    restored = terminal.Screen.from_state(screen.state())
+    for current in (screen, restored):
+        current.feed("3;1Hx\r\ny\x1b[?1049l")
+    assert restored.text() == screen.text() == ["main", "", ""]
+    assert restored.cursor == screen.cursor
+    assert restored.cell(0, 0) == screen.cell(0, 0)
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""Testing functions from the `thumbnails` module."""
+import tempfile
+import pytest
+from pathlib import Path
+from distutils.dir_util import copy_tree
+from goodbot import render, terminal, thumbnails, timing
+
+SAMPLE_PROJECT = Path("./tests/examples/render-sample")
+SAMPLE_CAST = SAMPLE_PROJECT / "scene_1" / "asciicasts" / "commands_2.cast"
+
+
+def test_screen_at():
+    """
+    Testing that the screen at a given time is the same as replaying
+    every event before it.
+    """
+    header, events = timing.read_asciicast(SAMPLE_CAST)
+    for time, count in [(None, len(events)), (events[3][0], 4), (-100, 0)]:
+        screen = terminal.Screen(header["width"], header["height"])
+        for event in events[:count]:
+            screen.feed(event[2])
+        assert thumbnails.screen_at(SAMPLE_CAST, time).text() == screen.text()
+
+
+def test_thumbnail_project():
+    """
+    Making sure that a png the size of the terminal is saved for each
+    asciicast.
+    """
+    Image = pytest.importorskip("PIL.Image")
+    with tempfile.TemporaryDirectory() as temp:
+        copy_tree(SAMPLE_PROJECT, temp)
+        casts = render.fetch_project_asciicasts(Path(temp))
+        images = thumbnails.thumbnail_project(Path(temp), jobs=2)
+        assert len(images) == len(casts)
+        for image_path in images:
+            assert image_path.parent.name == "thumbnails"
+            image = Image.open(image_path)
+            assert image.format == "PNG"
+            assert image.size[0] % 80 == 0 and image.size[1] % 24 == 0
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+"""Testing functions from the `timing` module."""
+import shutil
+import tempfile
+import pytest
+from pathlib import Path
+from goodbot import timing, utils
+
+SAMPLE_ASCIICAST = Path(
+    "./tests/examples/render-sample/scene_1/asciicasts/commands_1.cast"
+)
+SAMPLE_AUDIO = Path("./tests/examples/render-sample/scene_1/audio/read_1.mp3")
+
+
+def gaps(events):
+    times = [0.0] + [event[0] for event in events]
+    return [after - before for before, after in zip(times, times[1:])]
+
+
+def test_fit_events_stretch():
+    """
+    Making sure that only idle gaps are stretched and that the
+    recording lasts as long as the target.
+    """
+    _, events = timing.read_asciicast(SAMPLE_ASCIICAST)
+    target = events[-1][0] + 3
+
+    fitted, duration = timing.fit_events(events, target)
+
+    assert duration == pytest.approx(target)
+    assert fitted[-1][0] == pytest.approx(target)
+    assert [event[1:] for event in fitted] == [event[1:] for event in events]
+    for before, after in zip(gaps(events), gaps(fitted)):
+        if before <= timing.IDLE_THRESHOLD:
+            assert after == pytest.approx(before, abs=1e-5)
+        else:
+            assert after > before
+
+
+def test_fit_events_compress():
+    """
+    Testing that idle gaps are compressed down to MIN_IDLE at most and
+    that typing delays are kept.
+    """
+    events = [[0.1, "o", "$ "], [0.2, "o", "l"], [0.3, "o", "s"], [5.3, "o", "out"]]
+
+    fitted, duration = timing.fit_events(events, 3.3)
+    assert duration == pytest.approx(3.3)
+    assert [event[0] for event in fitted] == pytest.approx([0.1, 0.2, 0.3, 3.3])
+
+    # The idle gap can't be shorter than MIN_IDLE.
+    fitted, duration = timing.fit_events(events, 0.1)
+    assert duration == pytest.approx(0.3 + timing.MIN_IDLE)
+
+
+def test_fit_events_without_idle_gaps():
+    events = [[0.1, "o", "a"], [0.2, "o", "b"]]
+    fitted, duration = timing.fit_events(events, 1.0)
+    assert fitted == events + [[1.0, "o", ""]]
+    assert duration == pytest.approx(1.0)
+
+
+def test_fit_project():
+    """
+    Making sure that narrated recordings are fitted to the duration of
+    their audio file and that other recordings are left untouched.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        project = Path(temp)
+        for name in ("commands_1.cast", "commands_2.cast"):
+            destination = project / "scene_1/asciicasts" / name
+            destination.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy(SAMPLE_ASCIICAST, destination)
+        (project / "scene_1/audio").mkdir()
+        shutil.copy(SAMPLE_AUDIO, project / "scene_1/audio/read_1.mp3")
+
+        results = timing.fit_project(project)
+
+        fitted_cast = project / "scene_1/asciicasts/commands_1.cast"
+        assert list(results) == [fitted_cast]
+        assert results[fitted_cast]["target"] == pytest.approx(1.272)
+        _, events = timing.read_asciicast(fitted_cast)
+        assert events[-1][0] == pytest.approx(results[fitted_cast]["fitted"])
+        with open(project / "scene_1/asciicasts/commands_2.cast") as stream:
+            with open(SAMPLE_ASCIICAST) as original:
+                assert stream.read() == original.read()
+
+
+def test_fit_project_selection():
+    """
+    Making sure that only the selected recordings, or the recordings
+    whose narration is selected, are fitted.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        project = Path(temp)
+        for scene in ("scene_1", "scene_2"):
+            destination = project / scene / "asciicasts/commands_1.cast"
+            destination.parent.mkdir(parents=True)
+            shutil.copy(SAMPLE_ASCIICAST, destination)
+            (project / scene / "audio").mkdir()
+            shutil.copy(SAMPLE_AUDIO, project / scene / "audio/read_1.mp3")
+
+        results = timing.fit_project(project, utils.selector([], ["scene_2/read_1"]))
+
+        assert list(results) == [project / "scene_2/asciicasts/commands_1.cast"]
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Testing functions from the `tts` module."""
+import subprocess
+import pytest
+from goodbot import tts
+
+
+class EchoBackend(tts.TTSBackend):
+    name = "echo"
+    max_workers = 4
+
+    def synthesize(self, text, lang, lang_name):
+        return text.encode("utf-8")
+
+    def voices(self, lang=None):
+        return ["echo"]
+
+    def estimate_cost(self, texts, lang_name):
+        return 0.0
+
+    def version(self):
+        return "1"
+
+
+def test_batch_synthesize():
+    """
+    Making sure that batch results are returned in the order of the
+    texts.
+    """
+    texts = [f"chunk {i}" for i in range(20)]
+    assert EchoBackend().batch_synthesize(texts, "en-US", "echo") == [
+        text.encode("utf-8") for text in texts
+    ]
+
+
+def test_get_backend():
+    assert isinstance(tts.get_backend("google"), tts.GoogleBackend)
+    assert isinstance(tts.get_backend("espeak"), tts.EspeakBackend)
+    assert tts.EspeakBackend.offline and not tts.GoogleBackend.offline
+    with pytest.raises(ValueError):
+        tts.get_backend("nope")
+
+
+def test_google_estimate_cost():
+    backend = tts.GoogleBackend()
+    texts = ["a" * 500_000, "b" * 500_000]
+    assert backend.estimate_cost(texts, "en-US-Standard-C") == pytest.approx(4.0)
+    assert backend.estimate_cost(texts, "en-US-Wavenet-D") == pytest.approx(16.0)
+
+
+def test_espeak_backend(monkeypatch):
+    """
+    Testing that the espeak backend picks a voice from the language and
+    pipes its output through ffmpeg.
+    """
+    calls = []
+
+    def run(command, input=None, **kwargs):
+        calls.append((command, input))
+        if command[0] == "espeak-ng" and command[1] == "--voices":
+            stdout = (
+                "Pty Language       Age/Gender VoiceName          File          Other Languages\n"
+                " 5  en-us           --/M      English_(America)  gmw/en-US\n"
+                " 5  fr-fr           --/M      French_(France)    roa/fr\n"
+            )
+        elif command[0] == "espeak-ng":
+            stdout = b"RIFF wav"
+        else:
+            stdout = b"mp3 of " + input
+        return subprocess.CompletedProcess(command, 0, stdout, b"")
+
+    monkeypatch.setattr(tts.subprocess, "run", run)
+    tts._espeak_voices.cache_clear()
+
+    backend = tts.EspeakBackend()
+    try:
+        assert backend.voices("fr-CA") == ["fr-fr"]
+        assert backend.synthesize("Hello.", "en-US", "en-US-Standard-C") == (
+            b"mp3 of RIFF wav"
+        )
+        assert calls[-2] == (
+            ["espeak-ng", "-v", "en-us", "--stdout", "--stdin"],
+            b"Hello.",
+        )
+        assert calls[-1][0][0] == "ffmpeg"
+
+        backend.synthesize("<speak>Salut.</speak>", "fr-CA", "fr-CA-Standard-A")
+        assert calls[-2][0][:4] == ["espeak-ng", "-v", "fr", "-m"]
+
+        backend.synthesize("-v is read as text.", "en-US", "en-US-Standard-C")
+        assert "-v is read as text." not in calls[-2][0]
+        assert calls[-2][1] == b"-v is read as text."
+        assert backend.estimate_cost(["Hello."], "en-us") == 0.0
+    finally:
+        tts._espeak_voices.cache_clear()
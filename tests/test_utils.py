@@ -39,3 +39,21 @@ def test_list_scenes():
     listed_scenes = utils.list_scenes(PROJECT_PATH)
     all_scenes = [PROJECT_PATH / f"scene_{i+1}" for i in range(scene_amount)]
     assert len(all_scenes) == len(listed_scenes) and sorted(all_scenes) == sorted(listed_scenes)
+
+
+def test_selector():
+    """
+    Testing that files are selected by scene or by element, and that
+    nothing is filtered without a selection.
+    """
+    assert utils.selector() is None
+    selected = utils.selector(["3"], ["scene_1/commands_2"])
+    assert selected(Path("project/scene_3/read/read_1.txt"))
+    assert selected(Path("project/scene_1/asciicasts/commands_2.cast"))
+    assert selected(Path("project/scene_1/commands/commands_2"))
+    assert selected(Path("project/scene_1/read/read_2.txt"))
+    assert selected(Path("project/scene_1/audio/read_2.mp3"))
+    assert not selected(Path("project/scene_1/audio/read_1.mp3"))
+    assert not selected(Path("project/scene_1/embeds/notes.txt"))
+    assert not selected(Path("project/scene_1/gifs/commands_1.gif"))
+    assert not selected(Path("project/scene_13/gifs/commands_2.gif"))
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""Testing functions from the `watch` module."""
+import shutil
+import tempfile
+import threading
+import time
+import pytest
+from pathlib import Path
+from distutils.dir_util import copy_tree
+from goodbot import funcmodule, render, utils, watch
+
+SAMPLE_PROJECT = Path("./tests/examples/render-sample")
+
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_changes(use_inotify):
+    """
+    Testing that a change is reported when a file is replaced, like
+    editors do when saving.
+    """
+    config_path = Path(tempfile.mkdtemp()) / "config.yaml"
+    config_path.write_text("1: []\n")
+
+    def replace():
+        time.sleep(0.3)
+        temporary = config_path.with_name("config.yaml.swp")
+        temporary.write_text("1: [{read: Hello}]\n")
+        temporary.replace(config_path)
+
+    writer = threading.Thread(target=replace)
+    writer.start()
+    versions = watch.changes(config_path, 0.05, use_inotify)
+    assert next(versions) == config_path.absolute()
+    writer.join()
+    versions.close()
+
+
+@pytest.mark.skipif(not shutil.which("ffmpeg"), reason="Requires ffmpeg.")
+def test_rebuild_changed_commands():
+    """
+    Testing that a commands element whose instructions changed is
+    recorded, converted to a gif and rendered again, so that its clip
+    is still part of the final video.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        copy_tree(SAMPLE_PROJECT, temp)
+        project_path = Path(temp)
+        cast_path = project_path / "scene_1" / "asciicasts" / "commands_1.cast"
+        recording = cast_path.read_bytes()
+        render.render_all(project_path)
+        # Like `funcmodule.update_project()` does for changed elements.
+        funcmodule.remove_element(project_path, "scene_1/commands_1")
+
+        def record(selected):
+            assert selected(cast_path)
+            cast_path.write_bytes(recording)
+
+        final_path = watch.rebuild(
+            project_path, utils.selector(elements={"scene_1/commands_1"}), record
+        )
+
+        clip_path = project_path / "scene_1" / "videos" / "commands_1.mp4"
+        assert (project_path / "scene_1" / "gifs" / "commands_1.gif").exists()
+        assert clip_path in render.sort_videos(project_path)
+        assert final_path.exists()
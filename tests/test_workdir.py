@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Testing functions from the `workdir` module."""
+import os
+import errno
+import tempfile
+import pytest
+from pathlib import Path
+from goodbot import workdir
+
+
+@pytest.fixture(autouse=True)
+def reset_work_dir(monkeypatch):
+    monkeypatch.delenv(workdir.ENV_VARIABLE, raising=False)
+    yield
+    workdir.set_work_dir(None)
+
+
+def test_work_dir_precedence(monkeypatch):
+    """
+    Testing that the configured directory wins over the environment
+    variable, which wins over the default.
+    """
+    assert workdir.work_dir() == workdir.default_work_dir()
+    monkeypatch.setenv(workdir.ENV_VARIABLE, "/from/env")
+    assert workdir.work_dir() == Path("/from/env")
+    workdir.set_work_dir(Path("/from/option"))
+    assert workdir.work_dir() == Path("/from/option")
+
+
+def test_default_work_dir_space(monkeypatch):
+    """
+    Making sure that `/dev/shm` is not used when it is too small.
+    """
+    monkeypatch.setattr(workdir, "MIN_FREE_SPACE", 2**62)
+    assert workdir.default_work_dir() == Path(tempfile.gettempdir())
+
+
+def test_scratch():
+    """
+    Testing that scratch directories are created under the work
+    directory and removed once done.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        workdir.set_work_dir(Path(temp) / "work")
+        with workdir.scratch("test-") as scratch_path:
+            assert scratch_path.parent == Path(temp) / "work"
+            (scratch_path / "file").write_text("Hello")
+        assert not scratch_path.exists()
+        assert workdir.environment()["TMPDIR"] == str(Path(temp) / "work")
+
+
+def test_make_scratch_no_space():
+    """
+    Making sure that an error is raised when no directory has enough
+    space available.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        workdir.set_work_dir(Path(temp))
+        with pytest.raises(OSError) as error:
+            workdir.make_scratch(required=2**62)
+        assert error.value.errno == errno.ENOSPC
+        assert os.listdir(temp) == []
+
+
+def test_move_into(monkeypatch):
+    """
+    Testing that files are moved, whether or not the destination is
+    on another filesystem.
+    """
+    with tempfile.TemporaryDirectory() as temp:
+        source = Path(temp) / "source"
+        destination = Path(temp) / "destination"
+        source.write_text("Hello")
+        assert workdir.move_into(source, destination) == destination
+        assert destination.read_text() == "Hello"
+        assert not source.exists()
+
+        replace = os.replace
+
+        def cross_device(source_path, destination_path):
+            if Path(source_path).name == "source":
+                raise OSError(errno.EXDEV, "Invalid cross-device link")
+            replace(source_path, destination_path)
+
+        monkeypatch.setattr(os, "replace", cross_device)
+        source.write_text("World")
+        workdir.move_into(source, destination)
+        assert destination.read_text() == "World"
+        assert not source.exists()
+        assert sorted(os.listdir(temp)) == ["destination"]